@@ -0,0 +1,337 @@
+"""End-to-end pipeline benchmark on recorded footage.
+
+Replays a video file, image folder or raw dump (see ``frame_sources.py``)
+through the station of one of the three scripts, with the PLC / robot replaced
+by local stand-ins. The station is built by the script's own
+``build_station()`` and run by ``pipeline.MultiCameraPipeline``, so the bench
+measures the code the line runs, with the script's settings:
+
+* ``food``: detector -> tracker + recipe -> ``PlcHandshakeWorker`` writing to
+  the ``plc_simulator.TagServer``.
+* ``presence``: motion gate -> detector -> Modbus coil write on state changes
+  to the ``plc_simulator.ModbusSimulator``.
+* ``udp``: detector -> ``udp_protocol.DetectionSender`` to a local socket
+  (``--udp-protocol binary`` or the legacy ``json``).
+
+Every frame is timed per stage: capture, preprocess, inference, postprocess,
+logic (the script's ``process`` hook), overlay, sink (the blocking PLC / UDP
+call, on the sink's own thread) and frame (capture to decision). The report
+gives p50/p95/p99 per stage, FPS, CPU usage and RSS, and is written as JSON
+for regression tracking. The overlay is drawn inline (``--no-overlay`` to skip
+it) so its cost shows up even though the scripts draw on the viewer thread.
+
+Usage:
+    python bench.py --pipeline food --source production.raw --weights yolov8s.pt --json bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import psutil
+
+from frame_sources import open_source
+from inference_backend import InferenceBackend, create_backend
+from metrics import PipelineMetrics
+from overlay import draw_detections
+from pipeline import FrameResult, MultiCameraPipeline
+from plc_simulator import LatencyModel, summarize
+
+PIPELINES = ("food", "presence", "udp")
+STAGES = ("capture", "preprocess", "inference", "postprocess", "logic", "overlay", "sink", "frame")
+
+
+class StageTimer:
+    """Collect per-stage durations (seconds) for the frames after the warm-up."""
+
+    def __init__(self, warmup: int = 0) -> None:
+        self.warmup = warmup
+        self.frames = 0
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+
+    @property
+    def recording(self) -> bool:
+        return self.frames >= self.warmup
+
+    def add(self, stage: str, seconds: float) -> None:
+        if self.recording:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def add_model(self, model: InferenceBackend) -> None:
+        """Record the preprocess / inference / postprocess split of the last call."""
+        for stage, seconds in model.timings.items():
+            self.add(stage, seconds)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(samples) for stage, samples in self.samples.items() if samples}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _configure(script: Any, **settings: Any) -> None:
+    """Override the script's config constants; ``None`` keeps the script's own value."""
+    for name, value in settings.items():
+        if value is not None:
+            setattr(script, name, value)
+
+
+# --------------------------------------------------------------------------
+# Stations: each builds the script's own CameraStream via its build_station()
+# and returns (stream, close() -> sink stats)
+# --------------------------------------------------------------------------
+def _food_station(model: InferenceBackend, source: Any, args: argparse.Namespace):
+    import food_detection as script
+    from plc_simulator import TagServer
+
+    server = TagServer(port=0, latency=LatencyModel(args.plc_latency_ms / 1e3, args.plc_jitter_ms / 1e3)).start()
+    _configure(
+        script, HEADLESS=True, CAMERAS=None, REPLAY_SOURCE=args.source, PLC_SIMULATOR=f"{server.host}:{server.port}",
+        ITEM_DATA_FILE=args.item_data, DETECT_ONLY_ITEMS=args.only_items or None,
+        DETECT_EVERY_N=args.detect_every_n, TRACK_MIN_HITS=args.track_min_hits, TRACK_MAX_AGE=args.track_max_age,
+        NEWDATA_PULSE_S=None if args.pulse_ms is None else args.pulse_ms / 1e3, PLC_QUEUE_SIZE=args.plc_queue_size,
+    )
+    _, recipe = script.load_recipe(model)
+    detected_items: Dict[str, int] = {}
+    stream, plc, plc_writer = script.build_station(
+        script.camera_configs()[0], source, model, recipe, PipelineMetrics(), detected_items, False
+    )
+
+    def close() -> Dict[str, Any]:
+        plc_writer.close()
+        plc.Close()
+        server.stop()
+        return {"items": sum(detected_items.values()), "plc": plc_writer.stats()}
+
+    return stream, close
+
+
+def _presence_station(model: InferenceBackend, source: Any, args: argparse.Namespace):
+    import presence_detection_modbus as script
+    from plc_simulator import ModbusSimulator
+
+    latency = LatencyModel(args.plc_latency_ms / 1e3, args.plc_jitter_ms / 1e3)
+    server = ModbusSimulator(port=_free_port(), latency=latency).start()
+    _configure(
+        script, HEADLESS=True, CAMERAS=None, REPLAY_SOURCE=args.source, SEND_TO_PLC=True,
+        PLC_IP=server.host, PLC_PORT=server.port, MOTION_GATE=False if args.no_motion_gate else None,
+    )
+    plc = script.initialize_plc()
+    plc_thread = ThreadPoolExecutor(1, thread_name_prefix="modbus")
+    metrics = PipelineMetrics()
+    stream, gate = script.build_station(script.camera_configs()[0], source, plc, metrics, plc_thread, False)
+
+    def close() -> Dict[str, Any]:
+        plc_thread.shutdown(wait=True)
+        plc.close()
+        server.stop()
+        return {"coil_writes": metrics.plc_writes.value, "motion_gate": gate.stats() if gate else None}
+
+    return stream, close
+
+
+def _udp_station(model: InferenceBackend, source: Any, args: argparse.Namespace):
+    import test1 as script
+    from udp_protocol import DetectionSender
+
+    _configure(script, HEADLESS=True, ROBOT_PROTOCOL=args.udp_protocol)
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    sender = DetectionSender(*receiver.getsockname(), model.names, script.ROBOT_PROTOCOL)
+    stream = script.build_station(source, model, sender, PipelineMetrics())
+
+    def close() -> Dict[str, Any]:
+        stats = sender.stats()
+        sender.close()
+        receiver.close()
+        return stats
+
+    return stream, close
+
+
+STATION_BUILDERS: Dict[str, Callable] = {
+    "food": _food_station,
+    "presence": _presence_station,
+    "udp": _udp_station,
+}
+
+
+class _TimedSource:
+    """Source wrapper that records how long each ``read()`` took as the capture stage."""
+
+    def __init__(self, source: Any, timer: StageTimer) -> None:
+        self.source = source
+        self.timer = timer
+
+    def read(self):
+        start = time.perf_counter()
+        frame = self.source.read()
+        self.timer.add("capture", time.perf_counter() - start)
+        return frame
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.source, name)
+
+
+def _timed(fn: Callable, timer: StageTimer, stage: str) -> Callable:
+    def call(*args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timer.add(stage, time.perf_counter() - start)
+
+    return call
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one benchmark and return the JSON-serialisable report."""
+    model = create_backend(args.backend, args.weights, conf=args.conf, imgsz=args.imgsz)
+    source = open_source(args.source, realtime=args.realtime, loop=args.frames is not None)
+    if not source.isOpened():
+        raise SystemExit(f"Could not open {args.source}")
+    stream, close = STATION_BUILDERS[args.pipeline](model, source, args)
+
+    timer = StageTimer(args.warmup)
+    proc = psutil.Process()
+    rss_start = proc.memory_info().rss
+    clock: Dict[str, Any] = {"rss_peak": rss_start, "wall": None, "cpu": None}
+    pipeline = MultiCameraPipeline(model, [stream])
+
+    # Time the script's own station in place: capture, process hook, sinks and the whole frame
+    process = stream.process
+    stream.source = _TimedSource(source, timer)
+    for sink in stream.sinks:
+        sink.fn = _timed(sink.fn, timer, "sink")
+
+    def measured_process(result: FrameResult) -> None:
+        if result.inferred:
+            timer.add_model(model)  # one camera, one call in flight: the timings are this frame's
+        _timed(process, timer, "logic")(result)
+        if not args.no_overlay:
+            _timed(draw_detections, timer, "overlay")(result.frame.copy(), result.detections, model.names)
+        timer.add("frame", time.monotonic() - result.captured)
+        timer.frames += 1
+        if timer.frames == args.warmup:
+            clock["wall"], clock["cpu"] = time.perf_counter(), proc.cpu_times()
+        if timer.frames % 10 == 0:
+            clock["rss_peak"] = max(clock["rss_peak"], proc.memory_info().rss)
+        if args.frames is not None and timer.frames >= args.frames + args.warmup:
+            pipeline.stop("frame limit")
+
+    stream.process = measured_process
+    if args.warmup == 0:
+        clock["wall"], clock["cpu"] = time.perf_counter(), proc.cpu_times()
+    try:
+        asyncio.run(pipeline.run())
+    finally:
+        source.release()
+        sink = close()
+
+    measured = timer.frames - args.warmup
+    if clock["wall"] is None or measured <= 0:
+        raise SystemExit(f"Not enough frames: {timer.frames} read, {args.warmup} used for warm-up")
+    wall = time.perf_counter() - clock["wall"]
+    cpu_end = proc.cpu_times()
+    cpu = (cpu_end.user - clock["cpu"].user) + (cpu_end.system - clock["cpu"].system)
+    rss_end = proc.memory_info().rss
+
+    return {
+        "pipeline": args.pipeline,
+        "source": args.source,
+        "realtime": args.realtime,
+        "backend": model.name,
+        "weights": args.weights,
+        "imgsz": args.imgsz,
+        "commit": _git_commit(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "frames": measured,
+        "warmup_frames": args.warmup,
+        "wall_s": wall,
+        "fps": measured / wall,
+        "cpu_percent": cpu / wall * 100,  # may exceed 100 with several busy threads
+        "rss_mb": {
+            "start": rss_start / 2**20, "peak": max(clock["rss_peak"], rss_end) / 2**20, "end": rss_end / 2**20,
+        },
+        "stages": timer.report(),
+        "sink": sink,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"\n{report['pipeline']} | {report['backend']} {report['weights']} @ {report['imgsz']} | "
+        f"{report['frames']} frames in {report['wall_s']:.2f} s -> {report['fps']:.1f} FPS | "
+        f"CPU {report['cpu_percent']:.0f}% | RSS peak {report['rss_mb']['peak']:.0f} MB"
+    )
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'count':>8}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<12}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}{s['count']:>8}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark a detection pipeline on recorded footage.")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="food")
+    parser.add_argument("--source", required=True, help="video file, image folder or .raw dump")
+    parser.add_argument("--frames", type=int, default=None, help="measured frames (loops the source); default: one pass")
+    parser.add_argument("--warmup", type=int, default=5, help="frames run before measuring")
+    parser.add_argument("--realtime", action="store_true", help="pace replay at the recorded frame rate")
+    parser.add_argument("--backend", default="ultralytics", help="inference backend (ultralytics / onnx)")
+    parser.add_argument("--weights", default="yolov8s.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.6)
+    parser.add_argument("--no-overlay", action="store_true", help="skip drawing (as with HEADLESS=True)")
+    parser.add_argument("--plc-latency-ms", type=float, default=2.0, help="simulated PLC latency")
+    parser.add_argument("--plc-jitter-ms", type=float, default=0.5)
+    # food_detection.py settings; unset options keep the script's own value
+    parser.add_argument("--item-data", help="ITEM_DATA_FILE")
+    parser.add_argument("--only-items", action="store_true", help="like DETECT_ONLY_ITEMS=True")
+    parser.add_argument("--detect-every-n", type=int, help="DETECT_EVERY_N")
+    parser.add_argument("--track-min-hits", type=int, help="TRACK_MIN_HITS")
+    parser.add_argument("--track-max-age", type=int, help="TRACK_MAX_AGE")
+    parser.add_argument("--pulse-ms", type=float, help="Vision_NewData pulse length (NEWDATA_PULSE_S)")
+    parser.add_argument("--plc-queue-size", type=int, help="PLC_QUEUE_SIZE")
+    # test1.py settings
+    parser.add_argument("--udp-protocol", choices=("binary", "json"), help="ROBOT_PROTOCOL")
+    # presence_detection_modbus.py settings (MOTION_THRESHOLD, MOTION_RECHECK_S come from the script)
+    parser.add_argument("--no-motion-gate", action="store_true", help="like MOTION_GATE=False")
+    parser.add_argument("--json", help="write the report to this file")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
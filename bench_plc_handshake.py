@@ -0,0 +1,70 @@
+"""Round-trip benchmark for the PLC item handshake.
+
+Runs :class:`plc_output.PlcHandshakeWorker` against the local tag server of
+:mod:`plc_simulator` with an injected round-trip time, once with batched
+multi-tag writes and once tag by tag, and reports round-trips and
+time-to-NewData per handshake.
+
+Usage:
+    python bench_plc_handshake.py --items 50 --rtt-ms 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from plc_output import PlcHandshakeWorker
+from plc_simulator import LatencyModel, TagClient, TagServer
+
+
+def run(items: int, rtt_s: float, pulse_s: float, batch: bool, multi_service: bool = True) -> Dict[str, Any]:
+    server = TagServer(port=0, latency=LatencyModel(rtt_s), multi_service=multi_service).start()
+    client = TagClient(server.host, server.port)
+    worker = PlcHandshakeWorker(client, pulse_s=pulse_s, maxsize=items, batch_writes=batch)
+    for i in range(items):
+        worker.submit(f"item{i}", i % 5 + 1, 40.0 + i % 5)
+    worker.close()
+    client.Close()
+    server.stop()
+    stats = worker.stats()
+    return {
+        "mode": "batched" if batch else "sequential",
+        "items": items,
+        "rtt_ms": rtt_s * 1e3,
+        "round_trips": server.requests,
+        "round_trips_per_handshake": server.requests / items,
+        "raise_new_data_ms": stats["raise_new_data"]["mean_ms"],
+        "fell_back": batch and not stats["batch_writes"],
+        "worker": stats,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Batched vs sequential PLC handshake round-trips.")
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=4.0, help="injected tag-server latency per Write call")
+    parser.add_argument("--pulse-ms", type=float, default=0.0, help="NewData pulse (0 to measure writes only)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results: List[Dict[str, Any]] = []
+    for batch in (False, True):
+        start = time.perf_counter()
+        result = run(args.items, args.rtt_ms / 1e3, args.pulse_ms / 1e3, batch)
+        result["wall_s"] = time.perf_counter() - start
+        results.append(result)
+        print(
+            f"{result['mode']:<11} round-trips/handshake={result['round_trips_per_handshake']:.2f} "
+            f"time-to-NewData={result['raise_new_data_ms']:.2f} ms wall={result['wall_s']:.3f}s"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Two-stage nano -> small detector cascade.
+
+The fast model (``yolov8n.pt``) runs on every frame at a lowered confidence so
+it also reports boxes it is unsure about. The accurate model (``yolov8s.pt``)
+only runs when the fast model
+
+* has a box in the uncertain band ``[band_low, conf)``, or
+* is confident about more instances of a class than on the previous frame
+  (a new object).
+
+Frames that escalate use the accurate model's detections; all other frames use
+the fast model's confident boxes, so consumers see one detection stream. With
+``set_focus`` both checks are limited to the classes that matter (the labels
+that drive ``Vision_Pressure``).
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from detections import Detections
+from inference_backend import InferenceBackend, create_backend, resolve_class_ids
+
+
+class CascadeBackend(InferenceBackend):
+    """Run ``fast`` every frame and escalate to ``accurate`` when needed."""
+
+    name = "cascade"
+
+    def __init__(
+        self,
+        fast: InferenceBackend,
+        accurate: InferenceBackend,
+        conf: float = 0.6,
+        band_low: float = 0.3,
+    ) -> None:
+        super().__init__(conf, accurate.iou, accurate.imgsz)
+        if fast.names != accurate.names:
+            raise ValueError("Cascade models must share the same class names")
+        if not 0.0 < band_low < conf:
+            raise ValueError("band_low must be between 0 and conf")
+
+        self.fast = fast
+        self.accurate = accurate
+        self.band_low = band_low
+        self.names = accurate.names
+        fast.conf = band_low  # the fast stage must also report uncertain boxes
+        accurate.conf = conf
+
+        num_classes = max(self.names) + 1 if self.names else 0
+        self._focus = np.ones(num_classes, dtype=bool)
+        self._prev_counts = np.zeros(num_classes, dtype=np.int64)
+
+        self.frames = 0
+        self.escalations: Dict[str, int] = {"uncertain": 0, "new_object": 0}
+
+    def restrict_classes(self, labels: Optional[Iterable[str]]) -> np.ndarray:
+        labels = None if labels is None else list(labels)
+        self.fast.restrict_classes(labels)
+        self.accurate.restrict_classes(labels)
+        return super().restrict_classes(labels)
+
+    def set_focus(self, labels: Optional[Iterable[str]]) -> None:
+        """Only boxes of ``labels`` trigger the accurate model (``None`` = all)."""
+        if labels is None:
+            self._focus[:] = True
+            return
+        self._focus[:] = False
+        self._focus[resolve_class_ids(self.names, labels)] = True
+
+    def _escalation_reason(self, coarse: Detections) -> Optional[str]:
+        focused = self._focus[coarse.cls]
+        # Uncertain or unfocused boxes must not count as new objects, or they escalate every frame
+        confident = coarse.cls[focused & (coarse.conf >= self.conf)]
+        counts = np.bincount(confident, minlength=len(self._prev_counts))
+        appeared = bool((counts > self._prev_counts).any())
+        self._prev_counts = counts
+
+        if ((coarse.conf < self.conf) & focused).any():
+            return "uncertain"
+        if appeared:
+            return "new_object"
+        return None
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        self.frames += 1
+        coarse = self.fast(frame)
+        reason = self._escalation_reason(coarse)
+        if reason is None:
+            self.timings = dict(self.fast.timings)
+            return coarse[coarse.conf >= self.conf]
+        self.escalations[reason] += 1
+        detections = self.accurate(frame)
+        self.timings = {
+            stage: self.fast.timings.get(stage, 0.0) + self.accurate.timings.get(stage, 0.0)
+            for stage in {**self.fast.timings, **self.accurate.timings}
+        }
+        return detections
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        """Not supported: the new-object check compares each frame with the previous one of the same camera."""
+        raise ValueError("The cascade keeps per-camera state and cannot batch frames from several cameras")
+
+    def warmup(self, runs: int = 2, shape: Optional[Sequence[int]] = None) -> float:
+        return self.fast.warmup(runs, shape) + self.accurate.warmup(runs, shape)
+
+    def close(self) -> None:
+        self.fast.close()
+        self.accurate.close()
+
+    def stats(self) -> Dict[str, float]:
+        escalated = sum(self.escalations.values())
+        return {
+            "frames": self.frames,
+            "escalated": escalated,
+            "escalation_ratio": escalated / self.frames if self.frames else 0.0,
+            **self.escalations,
+        }
+
+
+def create_cascade(
+    backend: str,
+    fast_weights: str,
+    accurate_weights: str,
+    conf: float = 0.6,
+    band_low: float = 0.3,
+    **kwargs,
+) -> CascadeBackend:
+    """Build a cascade where both stages use the same backend implementation."""
+    fast = create_backend(backend, fast_weights, conf=band_low, **kwargs)
+    accurate = create_backend(backend, accurate_weights, conf=conf, **kwargs)
+    return CascadeBackend(fast, accurate, conf, band_low)
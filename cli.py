@@ -0,0 +1,223 @@
+"""Single command-line entry point for the detection scripts and maintenance tools.
+
+Usage:
+    python cli.py validate-recipe item_data.json --data yolo.yaml
+    python cli.py classes --weights yolov8s.pt
+    python cli.py run food --source production.raw --backend onnx --headless
+    python cli.py bench --pipeline food --source production.raw      (bench.py arguments)
+    python cli.py simulate-plc serve --latency-ms 5                  (plc_simulator.py arguments)
+    python cli.py import-time
+
+Only the standard library is imported up front. Each subcommand imports what
+it needs when it runs. ``validate-recipe`` with a dataset YAML only loads
+``recipe.py``, NumPy and PyYAML. ``classes`` reads a cached ONNX export and
+only falls back to torch / Ultralytics for weights that were never exported.
+Help and recipe checks on the HMI PC therefore return at once instead of
+waiting seconds for torch. ``import-time`` measures this, so a heavy import
+that creeps back in at module level shows up.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Dataset YAMLs validate-recipe checks against by default; the repo's own yolo.yml is the conda
+# environment, so only a file that lists class names counts
+DEFAULT_DATASETS = ("yolo.yaml", "yolo.yml")
+
+SCRIPTS = {  # run target -> script module
+    "food": "food_detection",
+    "presence": "presence_detection_modbus",
+    "udp": "test1",
+}
+
+FORWARDED = {  # subcommand -> module whose main(argv) gets the remaining arguments
+    "bench": ("bench", "end-to-end pipeline benchmark (bench.py arguments)"),
+    "simulate-plc": ("plc_simulator", "local PLC simulator (plc_simulator.py arguments)"),
+}
+
+IMPORT_TIME_MODULES = (
+    "recipe", "plc_simulator", "inference_backend", "pipeline",
+    "food_detection", "presence_detection_modbus", "test1",
+    "bench", "onnxruntime", "ultralytics",
+)
+
+
+def _names_from(data: Optional[str], weights: Optional[str]) -> Optional[Dict[int, str]]:
+    """Class names from a dataset YAML or from model weights; ``None`` if neither is given."""
+    if data:
+        from recipe import load_dataset_names
+
+        return dict(enumerate(load_dataset_names(data)))
+    if weights:
+        from inference_backend import class_names
+
+        return class_names(weights)
+    return None
+
+
+def default_dataset() -> Optional[str]:
+    """The first of :data:`DEFAULT_DATASETS` that exists and lists class names."""
+    from recipe import load_dataset_names
+
+    for path in DEFAULT_DATASETS:
+        if os.path.exists(path) and load_dataset_names(path):
+            return path
+    return None
+
+
+def validate_recipe(args: argparse.Namespace) -> int:
+    from recipe import compile_recipe, load_item_data
+
+    try:
+        item_data = load_item_data(args.items)
+    except (OSError, ValueError) as exc:  # json.JSONDecodeError is a ValueError
+        print(f"Invalid recipe: {exc}")
+        return 1
+    data = args.data
+    if data is None and args.weights is None:
+        data = default_dataset()
+    names = _names_from(data, args.weights)
+    known = set(names.values()) if names is not None else None
+
+    print(f"{args.items}: {len(item_data)} items" + (f", checked against {data or args.weights}" if names else ""))
+    print(f"{'index':>5}  {'label':<24}{'pressure':>10}")
+    for index, (label, pressure) in enumerate(item_data.items(), start=1):
+        note = "  <- not a model class" if known is not None and label not in known else ""
+        print(f"{index:>5}  {label:<24}{pressure:>7.1f} kPa{note}")
+    if names is None:
+        print("No --data or --weights given: labels were not checked against the model classes.")
+        return 0
+    unknown = compile_recipe(item_data, names).unknown_items
+    if unknown:
+        print(f"{len(unknown)} label(s) the model never produces (usually a typo): {unknown}")
+        return 1
+    print("OK")
+    return 0
+
+
+def list_classes(args: argparse.Namespace) -> int:
+    names = _names_from(args.data, args.weights)
+    if args.json:
+        print(json.dumps({str(k): v for k, v in names.items()}, indent=2))
+    else:
+        for idx, name in sorted(names.items()):
+            print(f"{idx:>4}  {name}")
+    return 0
+
+
+def run_script(args: argparse.Namespace) -> int:
+    script = importlib.import_module(SCRIPTS[args.target])
+    # The scripts are configured by module constants; override the ones given on the command line
+    overrides = {
+        "REPLAY_SOURCE": args.source,
+        "INFERENCE_BACKEND": args.backend,
+        "MODEL_PATH": args.weights,
+        "INFERENCE_WORKERS": args.workers,
+        "HEADLESS": True if args.headless else None,
+        "REPLAY_REALTIME": False if args.flat_out else None,
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            setattr(script, name, value)
+    script.main()
+    return 0
+
+
+def import_times(modules: Sequence[str], repeat: int = 3) -> List[Dict[str, object]]:
+    """Seconds to import each module in a fresh interpreter (best of ``repeat``), plus ``cli.py --help``."""
+    probe = "import sys, time; t = time.perf_counter(); import {0}; sys.stdout.write(repr(time.perf_counter() - t))"
+    results = []
+    for module in modules:
+        best, error = None, None
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, "-c", probe.format(module)], cwd=HERE,
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+                break
+            seconds = float(proc.stdout.strip().splitlines()[-1])
+            best = seconds if best is None else min(best, seconds)
+        results.append({"target": f"import {module}", "seconds": best, "error": error})
+
+    best = None
+    for _ in range(repeat):  # whole process, interpreter start included
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(HERE, "cli.py"), "--help"], capture_output=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results.append({"target": "python cli.py --help", "seconds": best, "error": None})
+    return results
+
+
+def import_time(args: argparse.Namespace) -> int:
+    results = import_times(args.modules or IMPORT_TIME_MODULES, args.repeat)
+    print(f"{'target':<42}{'seconds':>9}")
+    for result in results:
+        value = f"{result['seconds']:>9.3f}" if result["error"] is None else f"  {result['error']}"
+        print(f"{result['target']:<42}{value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Vision-guided gripper tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("validate-recipe", help="check item_data.json and its labels against the model classes")
+    p.add_argument("items", nargs="?", default="item_data.json")
+    p.add_argument("--data", help=f"dataset YAML with the class names (default: {' or '.join(DEFAULT_DATASETS)} if present)")
+    p.add_argument("--weights", help="read the class names from these weights instead")
+    p.set_defaults(func=validate_recipe)
+
+    p = sub.add_parser("classes", help="list a model's or dataset's class names")
+    source = p.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", help="dataset YAML")
+    source.add_argument("--weights", help=".pt or .onnx weights (a cached ONNX export avoids loading torch)")
+    p.add_argument("--json", action="store_true", help="print as JSON")
+    p.set_defaults(func=list_classes)
+
+    p = sub.add_parser("run", help="run a detection script with optional overrides")
+    p.add_argument("target", choices=sorted(SCRIPTS))
+    p.add_argument("--source", help="replay a video file, image folder or .raw dump instead of the camera")
+    p.add_argument("--backend", help="inference backend (ultralytics / onnx)")
+    p.add_argument("--weights", help="model weights")
+    p.add_argument("--workers", type=int, help="inference worker processes")
+    p.add_argument("--headless", action="store_true", help="no drawing and no window")
+    p.add_argument("--flat-out", action="store_true", help="replay as fast as possible instead of in real time")
+    p.set_defaults(func=run_script)
+
+    for name, (_, text) in FORWARDED.items():
+        sub.add_parser(name, help=text, add_help=False)  # listed here, dispatched in main()
+
+    p = sub.add_parser("import-time", help="measure module import times in fresh interpreters")
+    p.add_argument("modules", nargs="*", help=f"default: {' '.join(IMPORT_TIME_MODULES)}")
+    p.add_argument("--repeat", type=int, default=3, help="runs per module; the fastest counts")
+    p.add_argument("--json", help="write the results to this file")
+    p.set_defaults(func=import_time)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] in FORWARDED:
+        # Not parsed here, so "--help" and every option reach the tool's own parser
+        importlib.import_module(FORWARDED[argv[0]][0]).main(argv[1:])
+        return
+    args = build_parser().parse_args(argv)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compact per-frame detection results.
+
+Backends convert their output to :class:`Detections` once per frame: three
+contiguous NumPy arrays (struct of arrays) instead of Ultralytics ``Boxes``
+objects, so consumers (overlay, PLC, UDP) never index small tensors per box.
+Masks and index arrays select subsets without copying into Python objects, and
+centroids are computed for every box in one vectorized step.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+
+class Detections:
+    """Boxes for a single frame in original image coordinates."""
+
+    __slots__ = ("xyxy", "conf", "cls")
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray) -> None:
+        self.xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)  # (N, 4)
+        self.conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(-1)     # (N,)
+        self.cls = np.ascontiguousarray(cls, dtype=np.int64).reshape(-1)         # (N,)
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(np.zeros((0, 4), np.float32), np.zeros((0,), np.float32), np.zeros((0,), np.int64))
+
+    @classmethod
+    def from_ultralytics(cls, result: Any) -> "Detections":
+        """Convert an Ultralytics ``Results`` object with one device->host copy per field."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty()
+        return cls(boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())
+
+    # ------------------------------------------------------------ container
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def __getitem__(self, index: Any) -> "Detections":
+        """Select boxes with a boolean mask, index array or slice."""
+        return Detections(self.xyxy[index], self.conf[index], self.cls[index])
+
+    def __repr__(self) -> str:
+        return f"Detections(n={len(self)})"
+
+    # ----------------------------------------------------------- derived data
+    @property
+    def centroids(self) -> np.ndarray:
+        """``(N, 2)`` box centres as float32."""
+        return (self.xyxy[:, :2] + self.xyxy[:, 2:]) * 0.5
+
+    def rows(self) -> Iterator[Tuple[int, int, int, int, float, int, int, int]]:
+        """Yield ``(x1, y1, x2, y2, conf, cls, cx, cy)`` as plain Python numbers.
+
+        The integer conversion happens once for the whole frame, which keeps
+        per-box drawing and printing loops cheap.
+        """
+        boxes = self.xyxy.astype(np.int32).tolist()
+        centres = self.centroids.astype(np.int32).tolist()
+        for (x1, y1, x2, y2), conf, cls, (cx, cy) in zip(boxes, self.conf.tolist(), self.cls.tolist(), centres):
+            yield x1, y1, x2, y2, conf, cls, cx, cy
+
+    def labels(self, names: Dict[int, str]) -> List[str]:
+        return [names[c] for c in self.cls.tolist()]
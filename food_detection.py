@@ -9,122 +9,287 @@ Description:
  - Sends detected item index and pressure to Allen-Bradley PLC (EtherNet/IP)
 """
 
-from ultralytics import YOLO
-from pylogix import PLC
-import cv2
-import yaml
-import json
+import asyncio
 import os
-import time
+
+from cascade import create_cascade
+from frame_sources import open_source
+from governor import LatencyGovernor, build_levels
+from inference_pool import create_model
+from metrics import MetricsRegistry, PipelineMetrics, StartupTimer, start_metrics
+from overlay import OverlayViewer
+from pipeline import BlockingSink, CameraStream, MultiCameraPipeline
+from plc_output import PlcHandshakeWorker
+from recipe import DEFAULT_PRESSURE, compile_recipe, load_dataset_names, load_item_data
+from roi import RegionOfInterest
+from tiling import TiledBackend
+from tracker import Tracker
 
 # ------------------ USER SETTINGS ------------------
 MODEL_PATH = "yolov8s.pt"        # your trained YOLO model
+INFERENCE_BACKEND = "ultralytics" # "ultralytics" (PyTorch) or "onnx" (ONNX Runtime CPU)
+INFERENCE_WORKERS = 0            # >0: run the detector in this many processes (shared-memory frame ring)
+CASCADE_FAST_MODEL = None        # e.g. "yolov8n.pt": run every frame, escalate to MODEL_PATH when unsure
+CASCADE_BAND_LOW = 0.3           # fast-model boxes in [CASCADE_BAND_LOW, CONF_THRESHOLD) escalate
 DATASET_YAML = "yolo.yaml"       # dataset with class names
 ITEM_DATA_FILE = "item_data.json" # custom item-pressure mapping
 CAMERA_INDEX = 0                 # webcam index
+CAMERAS = None                   # several stations, one model: [{"source": 0}, {"source": 1, "tag_prefix": "St2_"}]
+ROI = None                       # conveyor strip only: [x, y, w, h] or polygon [[x, y], ...] (per camera: "roi")
+ROI_MASK = True                  # grey out polygon corners outside the ROI before inference
+REPLAY_SOURCE = None             # video file, image folder or .raw dump to replay instead of the camera
+REPLAY_REALTIME = True           # False: replay every frame as fast as possible (benchmarks)
 CONF_THRESHOLD = 0.6             # minimum detection confidence
+TILED = False                    # 1080p+ cameras: detect on overlapping native-resolution tiles (small produce)
+TILE_SIZE = 640                  # tile edge in pixels (match the model's input size)
+TILE_OVERLAP = 0.2               # fraction of a tile shared with its neighbour
+LATENCY_BUDGET_MS = None         # e.g. 50: capture-to-PLC budget the governor keeps by lowering quality
+GOVERNOR_FAST_MODEL = None       # cheaper weights with the same classes the governor may fall back to
+GOVERNOR_IMGSZ = (640, 480, 320) # input sizes the governor steps through, best first
+GOVERNOR_MAX_SKIP = 3            # last resort: only run the detector on every Nth due frame
+WARMUP_RUNS = 2                  # dummy inferences before the cameras open (0 to skip)
 PLC_IP = "192.168.1.20"          # Allen-Bradley PLC IP address
 SEND_TO_PLC = False               # set False to test without PLC
+PLC_SIMULATOR = None             # e.g. "127.0.0.1:5021": send the handshake to plc_simulator.py instead
+DETECT_ONLY_ITEMS = False        # True: detector only reports labels listed in item_data.json
+NEWDATA_PULSE_S = 0.5            # how long Vision_NewData stays True
+PLC_QUEUE_SIZE = 8               # pending handshakes before dropping
+PLC_QUEUE_POLICY = "drop_oldest" # "drop_oldest" or "coalesce_latest"
+PLC_BATCH_WRITES = True          # index + pressure + NewData in one multi-tag write (one round-trip)
+DETECT_EVERY_N = 1               # run the detector every Nth frame; the tracker interpolates in between
+TRACK_MIN_HITS = 2               # detections before an object counts as a new physical item
+TRACK_MAX_AGE = 10               # detector runs an item may be missed before its track is dropped
+HEADLESS = False                 # True on the production cell: no drawing, no window (Ctrl+C to stop)
+VIEWER_FPS = 15                  # display rate cap for the overlay window
+METRICS_PORT = 9108              # Prometheus text endpoint on 127.0.0.1 (None to disable)
+METRICS_FILE = None              # also dump the metrics as JSON to this file
+METRICS_DUMP_S = 10.0            # seconds between metrics file dumps
 # ----------------------------------------------------
 
 # ------------------ LOAD MODEL ------------------
-print("Loading model and dataset...")
-model = YOLO(MODEL_PATH)
+# Nothing heavy happens at import time: cli.py and other tools can import this module
+# (or run it with overrides) without loading torch or the weights.
+def camera_configs():
+    """Stations to run: CAMERAS, or the single configured camera."""
+    if CAMERAS:
+        # optional per station: "tag_prefix" for its Vision_* tags, "plc_ip" if it has its own controller, "roi"
+        return [{"name": f"cam{i}", **camera} for i, camera in enumerate(CAMERAS)]
+    return [{"name": "cam0", "source": CAMERA_INDEX if REPLAY_SOURCE is None else REPLAY_SOURCE, "roi": ROI}]
 
-# Load dataset-defined classes
-if os.path.exists(DATASET_YAML):
-    with open(DATASET_YAML, "r") as f:
-        data = yaml.safe_load(f)
-        dataset_classes = data.get("names", [])
-else:
-    dataset_classes = list(model.names.values())
+def load_detector(weights, batch=1, imgsz=None):
+    """Detector for ``weights`` shared by every camera (pool, ONNX batch and tiling as configured)."""
+    # the ONNX graph is exported with a batch slot per camera (a dynamic batch when tiling),
+    # unless pool workers take the frames one by one
+    options = {} if imgsz is None else {"imgsz": imgsz}
+    if INFERENCE_BACKEND == "onnx" and not INFERENCE_WORKERS:
+        options["batch"] = 0 if TILED else batch
+    detector = create_model(INFERENCE_BACKEND, weights, workers=INFERENCE_WORKERS, conf=CONF_THRESHOLD, **options)
+    if TILED:
+        detector = TiledBackend(detector, TILE_SIZE, TILE_OVERLAP)
+    return detector
 
-print(f"Model loaded: {MODEL_PATH}")
-print(f"Dataset classes: {dataset_classes}")
+def load_model(batch=1):
+    """The detector for ``batch`` cameras: cascade, latency governor or a single model."""
+    if CASCADE_FAST_MODEL:
+        if batch > 1 or INFERENCE_WORKERS or TILED or LATENCY_BUDGET_MS:
+            raise SystemExit("CASCADE_FAST_MODEL only supports a single camera without INFERENCE_WORKERS, "
+                             "TILED or LATENCY_BUDGET_MS")
+        return create_cascade(INFERENCE_BACKEND, CASCADE_FAST_MODEL, MODEL_PATH,
+                              conf=CONF_THRESHOLD, band_low=CASCADE_BAND_LOW)
+    if LATENCY_BUDGET_MS:
+        if INFERENCE_WORKERS:
+            raise SystemExit("LATENCY_BUDGET_MS cannot be combined with INFERENCE_WORKERS")
+        # every level is loaded up front so switching never stalls the line
+        levels = build_levels([MODEL_PATH] + ([GOVERNOR_FAST_MODEL] if GOVERNOR_FAST_MODEL else []),
+                              GOVERNOR_IMGSZ, GOVERNOR_MAX_SKIP)
+        model = LatencyGovernor(lambda weights, imgsz: load_detector(weights, batch, imgsz), levels,
+                                LATENCY_BUDGET_MS / 1000)
+        print(f"Latency governor: {LATENCY_BUDGET_MS} ms budget over {len(levels)} levels, starting at {model.level}")
+        return model
+    return load_detector(MODEL_PATH, batch)
 
 # ------------------ LOAD CUSTOM ITEM DATA ------------------
-if not os.path.exists(ITEM_DATA_FILE):
-    print(f"{ITEM_DATA_FILE} not found. Please create it (object: pressure).")
-    exit()
+def load_recipe(model):
+    """Restrict the detector to the wanted classes and compile item_data.json; returns (item_data, recipe)."""
+    # Load dataset-defined classes
+    if DATASET_YAML and os.path.exists(DATASET_YAML):
+        dataset_classes = load_dataset_names(DATASET_YAML)
+    else:
+        dataset_classes = list(model.names.values())
+    print(f"Dataset classes: {dataset_classes}")
+
+    if not os.path.exists(ITEM_DATA_FILE):
+        raise SystemExit(f"{ITEM_DATA_FILE} not found. Please create it (object: pressure).")
+
+    item_data = load_item_data(ITEM_DATA_FILE)
+
+    print(f"Loaded item-pressure map: {item_data}\n")
 
-with open(ITEM_DATA_FILE, "r") as f:
-    item_data = json.load(f)
+    # Let only the wanted classes survive NMS instead of filtering labels per box
+    wanted_classes = [c for c in dataset_classes if c in item_data] if DETECT_ONLY_ITEMS else dataset_classes
+    class_ids = model.restrict_classes(wanted_classes)
+    print(f"Detector restricted to {len(class_ids)} of {len(model.names)} classes\n")
 
-print(f"Loaded item-pressure map: {item_data}\n")
+    # Compile item index / pressure tables indexed by class id (key order = PLC item index)
+    recipe = compile_recipe(item_data, model.names, wanted_classes)
+    if recipe.unknown_items:
+        print(f"Warning: labels in {ITEM_DATA_FILE} the model never produces: {recipe.unknown_items}\n")
+    if CASCADE_FAST_MODEL:
+        model.set_focus(recipe.item_names)  # only pressure-driving labels need the small model's opinion
+    return item_data, recipe
 
-# Create item order (index reference)
-item_names = list(item_data.keys())
+# ------------------ PLC CONNECTION ------------------
+def connect_plc(camera):
+    """Open the station's PLC connection (or simulator client); None when PLC output is off."""
+    if PLC_SIMULATOR:
+        from plc_simulator import TagClient
+        host, port = PLC_SIMULATOR.rsplit(":", 1)
+        print(f"🔌 Connected to PLC simulator at {PLC_SIMULATOR}\n")
+        return TagClient(host, int(port))
+    if SEND_TO_PLC:
+        from pylogix import PLC
+        plc = PLC()
+        plc.IPAddress = camera.get("plc_ip", PLC_IP)
+        print(f"🔌 Connected to PLC at {plc.IPAddress}\n")
+        return plc
+    return None
 
 # ------------------ DETECTION FUNCTION ------------------
-def main():
-    cap = cv2.VideoCapture(CAMERA_INDEX)
-    if not cap.isOpened():
-        print("Camera not found or can't be opened.")
-        return
+def build_station(camera, cap, model, recipe, metrics, detected_items, multi):
+    """Tracker, PLC handshake and viewer for one camera; returns (stream, plc, plc_writer).
 
-    print("🎥 Camera started. Press 'q' to quit.\n")
-    detected_items = []
+    ``detected_items`` is this camera's ``{label: new items}`` count, in
+    first-seen order, for the summary printed on exit.
+    """
+    name, tag_prefix = camera["name"], camera.get("tag_prefix", "")
+    # One track per physical item, so a second apple is a new item for the PLC
+    tracker = Tracker(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS)
 
-    # optional: establish PLC connection
-    plc = PLC() if SEND_TO_PLC else None
+    plc = connect_plc(camera)
+    plc_writer = None
+    sinks = []
     if plc:
-        plc.IPAddress = PLC_IP
-        print(f"🔌 Connected to PLC at {PLC_IP}\n")
+        # handshake runs on its own thread so the NewData pulse never stalls the frame loop
+        plc_writer = PlcHandshakeWorker(plc, pulse_s=NEWDATA_PULSE_S,
+                                        maxsize=PLC_QUEUE_SIZE, policy=PLC_QUEUE_POLICY,
+                                        batch_writes=PLC_BATCH_WRITES, metrics=metrics, tag_prefix=tag_prefix)
+        metrics.registry.collect("vision_plc_handshakes_dropped_total", lambda: plc_writer.dropped,
+                                 "Handshakes discarded by the PLC queue policy", "counter",
+                                 {"camera": name} if multi else None)
+
+        def send_items(result):
+            for label, item_index, pressure in result.events:
+                if not plc_writer.submit(label, item_index, pressure):
+                    print(f"PLC busy ({name}): dropped an older pending item")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        sinks.append(BlockingSink(send_items, f"plc-{name}" if multi else "plc",
+                                  when=lambda result: bool(result.events)))
 
-        results = model(frame, conf=CONF_THRESHOLD, verbose=False)
+    window = "YOLOv8 Food Detection" + (f" ({name})" if multi else "")
+    roi = RegionOfInterest.parse(camera.get("roi"), ROI_MASK)
+    viewer = None if HEADLESS else OverlayViewer(window, model.names, max_fps=VIEWER_FPS, roi=roi)
 
-        for r in results:
-            for box in r.boxes:
-                cls = int(box.cls[0])
+    def track_items(result):
+        if result.inferred:
+            detections = result.detections
+            tracks = tracker.step(detections[recipe.allowed[detections.cls]])
+        else:
+            tracks = tracker.step()  # Kalman prediction only
+        result.detections = tracks.detections  # overlay shows the tracked boxes
+
+        # Exactly one PLC handshake per newly confirmed track; one gather resolves index & pressure
+        if tracks.new.any():
+            new_items = tracks.detections[tracks.new]
+            _, item_indices, pressures = recipe.resolve(new_items.cls)
+            for track_id, cls, item_index, pressure in zip(tracks.new_ids.tolist(), new_items.cls.tolist(),
+                                                           item_indices.tolist(), pressures.tolist()):
                 label = model.names[cls]
-                conf = float(box.conf[0])
-
-                if label not in dataset_classes:
-                    continue
-
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, f"{label} {conf:.2f}",
-                            (x1, max(20, y1 - 10)),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-                # Add to list if new
-                if label not in detected_items:
-                    detected_items.append(label)
-                    print(f"New item detected: {label}")
-
-                    # Get pressure from mapping (default 50)
-                    pressure = item_data.get(label, 50)
-                    item_index = item_names.index(label) + 1 if label in item_names else 0
-
-                    # Send to PLC
-                    if SEND_TO_PLC and item_index > 0:
-                        plc.Write('Vision_Item_Index', item_index)
-                        plc.Write('Vision_Pressure', float(pressure))
-                        plc.Write('Vision_NewData', True)
-                        print(f"Sent to PLC: {label} | Index={item_index} | Pressure={pressure} kPa\n")
-                        time.sleep(0.5)
-                        plc.Write('Vision_NewData', False)
-
-        cv2.imshow("YOLOv8 Food Detection", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    if plc:
-        plc.Close()
+                detected_items[label] = detected_items.get(label, 0) + 1
+                print(f"New item detected{f' at {name}' if multi else ''}: {label} (track {track_id})")
+                if item_index > 0:  # index 0 = not part of the recipe
+                    result.events.append((label, item_index, pressure))
+
+    stream = CameraStream(cap, sinks, process=track_items,
+                          should_infer=lambda frame, seq: seq % DETECT_EVERY_N == 0,
+                          viewer=viewer, metrics=metrics, name=name, roi=roi)
+    return stream, plc, plc_writer
+
+
+def main():
+    startup = StartupTimer.since_launch()
+    startup.mark("import")
+    print("Loading model and dataset...")
+    cameras = camera_configs()
+    multi = len(cameras) > 1
+    model = load_model(len(cameras))
+    print(f"Model loaded: {MODEL_PATH} ({model.name} backend)")
+    startup.mark("load")
+    item_data, recipe = load_recipe(model)
+    startup.mark("recipe")
+    if WARMUP_RUNS:
+        # lazy imports and first-call allocations happen now, not on the first items of the line
+        model.warmup(WARMUP_RUNS)
+        startup.mark("warm-up")
+    # live / real-time sources run behind a latest-frame reader, so we always infer on the newest frame
+    caps = []
+    for camera in cameras:
+        cap = open_source(camera["source"], realtime=REPLAY_REALTIME)
+        if not cap.isOpened():
+            print(f"Camera {camera['source']!r} not found or can't be opened.")
+            for opened in caps:
+                opened.release()
+            model.close()
+            return
+        caps.append(cap)
+
+    print("🎥 Camera started. Press 'q' to quit (Ctrl+C when headless).\n")
+    detected_items = {camera["name"]: {} for camera in cameras}
+    registry = MetricsRegistry()
+    stations = []
+    for camera, cap in zip(cameras, caps):
+        metrics = PipelineMetrics(registry, {"camera": camera["name"]} if multi else None)
+        metrics.watch_capture(cap)
+        stations.append(build_station(camera, cap, model, recipe, metrics, detected_items[camera["name"]], multi))
+    exporters = start_metrics(stations[0][0].metrics, METRICS_PORT, METRICS_FILE, METRICS_DUMP_S)
+    startup.mark("camera + PLC")
+    startup.export(registry)
+    print(startup.report())
+
+    governor = model if LATENCY_BUDGET_MS else None
+    if governor:
+        registry.collect("vision_governor_level", lambda: governor.index,
+                         "Latency governor level (0 = full quality)")
+    pipeline = MultiCameraPipeline(model, [stream for stream, _, _ in stations], governor=governor)
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        print("Interrupted; shutting down.")
+
+    for stream, plc, plc_writer in stations:
+        stream.source.release()
+        if stream.viewer:
+            stream.viewer.close()
+        print(f"Capture stats ({stream.name}): {stream.source.stats()}")
+        if plc_writer:
+            plc_writer.close()
+            print(f"PLC handshake stats ({stream.name}): {plc_writer.stats()}")
+        if plc:
+            plc.Close()
+    print(f"Pipeline stats: {pipeline.stats()}")
+    if CASCADE_FAST_MODEL or INFERENCE_WORKERS or TILED or LATENCY_BUDGET_MS:
+        print(f"{model.name.capitalize()} stats: {model.stats()}")
+    model.close()
+    for exporter in exporters:
+        exporter.close()
 
     print("\nProgram ended successfully.")
     print("Final Detected Items:")
-    for i, item in enumerate(detected_items, start=1):
-        pressure = item_data.get(item, 50)
-        print(f"[{i}] {item}  ->  {pressure} kPa")
+    for name, items in detected_items.items():
+        if multi:
+            print(f"{name}:")
+        for i, item in enumerate(items, start=1):
+            pressure = item_data.get(item, DEFAULT_PRESSURE)
+            print(f"[{i}] {item}  ->  {pressure} kPa")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,176 @@
+"""Threaded latest-frame capture reader.
+
+``cv2.VideoCapture.read()`` returns frames from the driver's internal buffer in
+order, so when inference is slower than the camera the detector falls further
+and further behind real time. :class:`LatestFrameReader` drains the capture on
+a background thread into a single slot and always hands the newest frame to the
+caller. Frames that were overwritten before anyone read them are counted as
+dropped, and the age of each delivered frame is tracked so stale input shows up
+in the stats instead of in the gripper timing.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+
+@dataclass
+class CapturedFrame:
+    """A frame plus the bookkeeping needed to measure its age."""
+
+    image: Any            # BGR ndarray as returned by cv2
+    seq: int              # 1-based capture sequence number
+    timestamp: float      # time.monotonic() right after the grab returned
+
+
+class LatestFrameReader:
+    """Wrap a ``cv2.VideoCapture``-like object and keep only its newest frame.
+
+    ``source`` must provide ``read()`` returning ``(ok, frame)`` and
+    ``release()``. The reader mimics that interface, so existing loops can keep
+    calling ``ret, frame = cap.read()``.
+    """
+
+    def __init__(self, source: Any, name: str = "capture") -> None:
+        self.source = source
+        self.name = name
+
+        # Ask the driver to keep as little as possible queued; not every backend honours it.
+        if hasattr(source, "set"):
+            import cv2
+
+            source.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._cond = threading.Condition()
+        self._latest: Optional[CapturedFrame] = None
+        self._last_delivered = 0
+        self._running = False
+        self._stopped = False
+        self._eof = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.grabbed = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.stalls = 0
+        self._age_total = 0.0
+        self._age_max = 0.0
+        self._last_age = 0.0
+
+    # ------------------------------------------------------------ lifecycle
+    def start(self) -> "LatestFrameReader":
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoCapture
+        return bool(self.source.isOpened()) if hasattr(self.source, "isOpened") else True
+
+    def stop(self) -> None:
+        """End pending and future reads without releasing the capture.
+
+        A stalled camera can keep :meth:`read` waiting indefinitely; the
+        pipeline calls this when it shuts down so that read returns
+        ``(False, None)`` instead.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        """Stop the grab thread and release the underlying capture."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.source.release()
+
+    # -------------------------------------------------------------- reading
+    def read_frame(self, timeout: Optional[float] = 1.0) -> Optional[CapturedFrame]:
+        """Return the newest frame not yet delivered, waiting up to ``timeout``.
+
+        Returns ``None`` when the source has ended or no new frame arrived in
+        time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.seq == self._last_delivered:
+                if self._eof or self._stopped or not self._running:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            frame = self._latest
+            self._last_delivered = frame.seq
+
+        age = time.monotonic() - frame.timestamp
+        self.delivered += 1
+        self._age_total += age
+        self._last_age = age
+        if age > self._age_max:
+            self._age_max = age
+        return frame
+
+    @property
+    def ended(self) -> bool:
+        """The source has no more frames, or the reader was stopped or released."""
+        with self._cond:
+            return self._eof or self._stopped or not self._running
+
+    def read(self, timeout: Optional[float] = 1.0) -> Tuple[bool, Any]:
+        """``cv2.VideoCapture.read`` compatible: block until a new frame arrives.
+
+        ``(False, None)`` only means the source ended or the reader was
+        stopped or released. A live camera that stalls (re-exposure, a USB hiccup) is
+        waited for; every ``timeout`` seconds without a frame counts as a
+        stall in :meth:`stats`.
+        """
+        waited = 0
+        while True:
+            frame = self.read_frame(timeout)
+            if frame is not None:
+                return True, frame.image
+            if self.ended:
+                return False, None
+            self.stalls += 1
+            waited += 1
+            if waited == 1:
+                print(f"{self.name}: no new frame for {timeout:.1f} s; still waiting")
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for grabbed / delivered / dropped frames and frame age."""
+        delivered = self.delivered
+        return {
+            "grabbed": self.grabbed,
+            "delivered": delivered,
+            "dropped": self.dropped,
+            "stalls": self.stalls,
+            "last_age_ms": self._last_age * 1e3,
+            "mean_age_ms": (self._age_total / delivered * 1e3) if delivered else 0.0,
+            "max_age_ms": self._age_max * 1e3,
+        }
+
+    # ------------------------------------------------------------ internals
+    def _run(self) -> None:
+        while self._running:
+            ok, image = self.source.read()
+            now = time.monotonic()
+            with self._cond:
+                if not ok:
+                    self._eof = True
+                    self._cond.notify_all()
+                    return
+                self.grabbed += 1
+                if self._latest is not None and self._latest.seq != self._last_delivered:
+                    self.dropped += 1
+                self._latest = CapturedFrame(image, self.grabbed, now)
+                self._cond.notify_all()
@@ -0,0 +1,316 @@
+"""Replayable frame sources for deterministic benchmarks.
+
+The detection scripts read frames through anything that looks like
+``cv2.VideoCapture`` (``read()`` / ``release()`` / ``isOpened()``). Besides the
+live camera, :func:`open_source` can replay
+
+* a video file (:class:`VideoFileSource`),
+* a folder of images, in file-name order (:class:`ImageFolderSource`),
+* a raw frame dump, memory-mapped so the OS pages frames in without decoding
+  (:class:`RawDumpSource`, written by :func:`record_raw_dump`).
+
+Replay runs in one of two modes:
+
+* real-time (``realtime=True``): frames are released at the recorded frame
+  rate and go through :class:`LatestFrameReader`, like a camera. A slow
+  pipeline drops frames, as it would in production.
+* as fast as possible (``realtime=False``): every frame is handed over
+  straight away, in order and without drops. This gives repeatable FPS
+  numbers that can be compared across commits.
+
+A raw dump is a headerless ``uint8`` file of ``count`` frames of ``shape``,
+with a ``<dump>.json`` sidecar holding ``shape``, ``count`` and ``fps``.
+
+Usage:
+    python frame_sources.py dump production.mp4 production.raw --max-frames 600
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from frame_capture import LatestFrameReader
+
+DEFAULT_FPS = 30.0
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+RAW_EXTENSION = ".raw"
+
+
+class FrameSource:
+    """Base class for recorded sources with optional real-time pacing.
+
+    Subclasses implement :meth:`_next` (return the next frame or ``None`` at
+    the end) and :meth:`_rewind` (start over, used with ``loop=True``).
+    """
+
+    def __init__(self, fps: float = DEFAULT_FPS, realtime: bool = True, loop: bool = False) -> None:
+        self.fps = fps if fps and fps > 0 else DEFAULT_FPS
+        self.realtime = realtime
+        self.loop = loop
+
+        self.frames = 0
+        self.late = 0          # real-time frames released after their due time
+        self._first: Optional[float] = None
+        self._last = 0.0
+
+    # ------------------------------------------------- cv2.VideoCapture API
+    def read(self):
+        image = self._next()
+        if image is None and self.loop and self.frames:
+            self._rewind()
+            image = self._next()
+        if image is None:
+            return False, None
+
+        now = time.monotonic()
+        if self._first is None:
+            self._first = now
+        elif self.realtime:
+            delay = self._first + self.frames / self.fps - now
+            if delay > 0:
+                time.sleep(delay)
+                now = time.monotonic()
+            else:
+                self.late += 1
+        self.frames += 1
+        self._last = now
+        return True, image
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoCapture
+        return True
+
+    def set(self, prop: int, value: float) -> bool:
+        """Capture properties do not apply to recordings; always ``False``."""
+        return False
+
+    def release(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = self._last - self._first if self._first is not None else 0.0
+        return {
+            "frames": self.frames,
+            "realtime": self.realtime,
+            "target_fps": self.fps,
+            "delivered_fps": (self.frames - 1) / elapsed if elapsed > 0 else 0.0,
+            "late": self.late,
+        }
+
+    # ------------------------------------------------------------ internals
+    def _next(self) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def _rewind(self) -> None:
+        raise NotImplementedError
+
+
+class VideoFileSource(FrameSource):
+    """Replay a video file; ``fps`` defaults to the container's frame rate."""
+
+    def __init__(self, path: str, realtime: bool = True, fps: Optional[float] = None, loop: bool = False) -> None:
+        import cv2  # imported on first use, so importing a script stays cheap
+
+        self.path = path
+        self._cap = cv2.VideoCapture(path)
+        super().__init__(fps or self._cap.get(cv2.CAP_PROP_FPS), realtime, loop)
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoCapture
+        return self._cap.isOpened()
+
+    def release(self) -> None:
+        self._cap.release()
+
+    def _next(self) -> Optional[np.ndarray]:
+        ok, image = self._cap.read()
+        return image if ok else None
+
+    def _rewind(self) -> None:
+        import cv2
+
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+
+class ImageFolderSource(FrameSource):
+    """Replay the images of a folder in sorted file-name order.
+
+    With ``preload`` every image is decoded up front so JPEG decoding and disk
+    reads stay out of the measured loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        realtime: bool = True,
+        fps: Optional[float] = None,
+        loop: bool = False,
+        preload: bool = False,
+    ) -> None:
+        super().__init__(fps or DEFAULT_FPS, realtime, loop)
+        self.path = path
+        self.files = sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._cache: Optional[List[np.ndarray]] = None
+        if preload:
+            self._cache = [image for image in map(self._load, self.files) if image is not None]
+        self._index = 0
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoCapture
+        return bool(self.files)
+
+    @staticmethod
+    def _load(file: str) -> Optional[np.ndarray]:
+        import cv2
+
+        image = cv2.imread(file)
+        if image is None:
+            print(f"Skipping unreadable image: {file}")
+        return image
+
+    def _next(self) -> Optional[np.ndarray]:
+        if self._cache is not None:
+            if self._index >= len(self._cache):
+                return None
+            self._index += 1
+            return self._cache[self._index - 1].copy()  # callers may draw on the frame
+
+        while self._index < len(self.files):
+            self._index += 1
+            image = self._load(self.files[self._index - 1])
+            if image is not None:
+                return image
+        return None
+
+    def _rewind(self) -> None:
+        self._index = 0
+
+
+def _sidecar(path: str) -> str:
+    return path + ".json"
+
+
+class RawDumpSource(FrameSource):
+    """Replay a memory-mapped raw frame dump written by :func:`record_raw_dump`."""
+
+    def __init__(self, path: str, realtime: bool = True, fps: Optional[float] = None, loop: bool = False) -> None:
+        with open(_sidecar(path), "r") as f:
+            meta = json.load(f)
+        super().__init__(fps or meta.get("fps", DEFAULT_FPS), realtime, loop)
+        self.path = path
+        shape = (int(meta["count"]), *meta["shape"])
+        if shape[0] == 0:  # np.memmap cannot map an empty file
+            self._frames: np.ndarray = np.empty(shape, dtype=np.uint8)
+        else:
+            self._frames = np.memmap(path, dtype=np.uint8, mode="r", shape=shape)
+        self._index = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoCapture
+        return len(self._frames) > 0
+
+    def release(self) -> None:
+        # Frames are handed out as copies, so this drops the last reference to
+        # the mapping and numpy unmaps the file.
+        self._frames = np.empty((0, *self._frames.shape[1:]), dtype=np.uint8)
+
+    def _next(self) -> Optional[np.ndarray]:
+        if self._index >= len(self._frames):
+            return None
+        self._index += 1
+        return np.array(self._frames[self._index - 1])  # writable copy of the mapped pages
+
+    def _rewind(self) -> None:
+        self._index = 0
+
+
+def record_raw_dump(source: Any, path: str, max_frames: Optional[int] = None, fps: Optional[float] = None) -> int:
+    """Write frames from ``source`` to a raw dump at ``path``; returns the frame count.
+
+    All frames must have the shape of the first one. ``source`` is only read,
+    never released.
+    """
+    if fps is None:
+        fps = source.fps if isinstance(source, FrameSource) else DEFAULT_FPS
+    count, shape = 0, None
+    with open(path, "wb") as f:
+        while max_frames is None or count < max_frames:
+            ok, frame = source.read()
+            if not ok:
+                break
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            if shape is None:
+                shape = frame.shape
+            elif frame.shape != shape:
+                raise ValueError(f"Frame {count} has shape {frame.shape}, expected {shape}")
+            f.write(frame.tobytes())
+            count += 1
+    with open(_sidecar(path), "w") as f:
+        json.dump({"shape": list(shape or ()), "count": count, "fps": fps}, f)
+    return count
+
+
+def open_source(
+    source: Union[int, str],
+    realtime: bool = True,
+    fps: Optional[float] = None,
+    loop: bool = False,
+    preload: bool = False,
+) -> Any:
+    """Open a camera index, stream URL, video file, image folder or raw dump.
+
+    Live sources and real-time replay are wrapped in a started
+    :class:`LatestFrameReader`; fast replay returns the source itself so every
+    frame is delivered in order. Check ``isOpened()`` on the result.
+    """
+    import cv2
+
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        frames: Any = cv2.VideoCapture(int(source))
+    elif "://" in source:
+        frames = cv2.VideoCapture(source)
+    elif os.path.isdir(source):
+        frames = ImageFolderSource(source, realtime, fps, loop, preload)
+    elif source.endswith(RAW_EXTENSION):
+        frames = RawDumpSource(source, realtime, fps, loop)
+    else:
+        frames = VideoFileSource(source, realtime, fps, loop)
+
+    live = not isinstance(frames, FrameSource)
+    if not frames.isOpened() or not (live or realtime):
+        return frames
+    return LatestFrameReader(frames).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record frames into a memory-mappable raw dump.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dump = sub.add_parser("dump", help="convert a camera, video or image folder to a raw dump")
+    dump.add_argument("source", help="camera index, video file or image folder")
+    dump.add_argument("output", help=f"dump file to write (*{RAW_EXTENSION})")
+    dump.add_argument("--max-frames", type=int, default=None)
+    dump.add_argument("--fps", type=float, default=None, help="frame rate stored for real-time replay")
+    args = parser.parse_args()
+
+    frames = open_source(args.source, realtime=False)
+    if not frames.isOpened():
+        raise SystemExit(f"Could not open {args.source}")
+    try:
+        fps = args.fps or getattr(frames, "fps", None) or DEFAULT_FPS
+        count = record_raw_dump(frames, args.output, args.max_frames, fps)
+    finally:
+        frames.release()
+    print(f"Wrote {count} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
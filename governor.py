@@ -0,0 +1,204 @@
+"""Latency governor: trade detection quality for speed to stay within a budget.
+
+The scripts used to run at whatever pace the detector allowed. When the cell
+PC was shared with other work and inference took 150 ms, every PLC command
+arrived 150 ms late. :class:`LatencyGovernor` wraps the detector and is told
+how long each inferred frame took from capture until its result was handed to
+the sinks (the PLC / robot). It then steps along a ladder of :class:`Level`
+objects, from best quality to cheapest:
+
+1. the main weights at each input size in ``sizes`` (e.g. 640, 480, 320),
+2. the same sizes with the faster weights (``yolov8n.pt``), if given,
+3. the cheapest model with the detector only running on every 2nd, 3rd, ...
+   due frame.
+
+Every ``window`` inferred frames the governor compares the ``quantile``
+latency (p90 by default) with the budget. Above the budget it moves one level
+down. Below ``headroom`` x budget it moves one level back up. A level that had
+to be left because it was too slow is retried only after a wait that doubles
+each time, so the governor does not oscillate between two levels. Every change
+is printed and kept in :attr:`LatencyGovernor.decisions`.
+
+All models of the ladder are loaded up front (and warmed by :meth:`warmup`),
+so a level change takes effect on the next frame without an export, a load or
+a cold first call on the frame path. Frame skip applies to the frames that the
+stream's own ``should_infer`` (motion gate, ``DETECT_EVERY_N``) lets through.
+It does not lower the latency of an inferred frame, but it frees CPU time on a
+shared machine and stops a recording from building up a backlog.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from detections import Detections
+from inference_backend import InferenceBackend
+
+MAX_BACKOFF = 6  # a level that keeps failing is retried after at most 2**6 windows
+
+
+@dataclass(frozen=True)
+class Level:
+    """One operating point of the governor."""
+
+    weights: str
+    imgsz: int
+    skip: int = 1  # run the detector on every ``skip``-th due frame
+
+    def __str__(self) -> str:
+        text = f"{os.path.basename(self.weights)}@{self.imgsz}"
+        return text if self.skip == 1 else f"{text} every {self.skip} frames"
+
+
+def build_levels(weights: Sequence[str], sizes: Sequence[int], max_skip: int = 1) -> List[Level]:
+    """Ladder from best to cheapest: every size of every model, then frame skip on the last one."""
+    if not weights or not sizes:
+        raise ValueError("The governor needs at least one model and one input size")
+    levels = [Level(w, size) for w in weights for size in sizes]
+    cheapest = levels[-1]
+    levels += [Level(cheapest.weights, cheapest.imgsz, skip) for skip in range(2, max_skip + 1)]
+    return levels
+
+
+class LatencyGovernor(InferenceBackend):
+    """Switch between ``levels`` so the measured frame latency stays under ``budget_s``.
+
+    ``factory(weights, imgsz)`` builds the detector for a level; detectors are
+    shared between levels that only differ in frame skip.
+    """
+
+    name = "governor"
+
+    def __init__(
+        self,
+        factory: Callable[[str, int], InferenceBackend],
+        levels: Sequence[Level],
+        budget_s: float,
+        window: int = 30,
+        quantile: float = 0.9,
+        headroom: float = 0.6,
+        log: Optional[Callable[[str], Any]] = print,
+    ) -> None:
+        if not levels:
+            raise ValueError("The governor needs at least one level")
+        if budget_s <= 0:
+            raise ValueError("The latency budget must be positive")
+        if not 0.0 < headroom < 1.0:
+            raise ValueError("headroom must be between 0 and 1")
+        self.levels = list(levels)
+        self.models: Dict[Tuple[str, int], InferenceBackend] = {}
+        for level in self.levels:
+            key = (level.weights, level.imgsz)
+            if key not in self.models:
+                self.models[key] = factory(level.weights, level.imgsz)
+        first = self.models[(self.levels[0].weights, self.levels[0].imgsz)]
+        if any(model.names != first.names for model in self.models.values()):
+            raise ValueError("All governor models must share the same class names")
+        super().__init__(first.conf, first.iou, first.imgsz)
+        self.names = first.names
+
+        self.budget_s = budget_s
+        self.window = window
+        self.quantile = quantile
+        self.headroom = headroom
+        self.log = log
+
+        self.index = 0
+        self.model = first
+        self.decisions: List[Dict[str, Any]] = []
+        self.latency: Optional[float] = None  # quantile of the last full window
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._observed = 0
+        self._retry_after = [0] * len(self.levels)  # observed-frame count before a level may be tried again
+        self._failures = [0] * len(self.levels)
+        self._due: Dict[Any, int] = {}
+
+    @property
+    def level(self) -> Level:
+        return self.levels[self.index]
+
+    def restrict_classes(self, labels: Optional[Iterable[str]]) -> np.ndarray:
+        labels = None if labels is None else list(labels)
+        for model in self.models.values():
+            model.restrict_classes(labels)
+        return super().restrict_classes(labels)
+
+    # ------------------------------------------------------------ pipeline side
+    def admit(self, stream: Any = None) -> bool:
+        """Whether a frame that ``stream`` wants inferred goes to the detector at the current skip."""
+        count = self._due.get(stream, 0)
+        self._due[stream] = count + 1
+        return count % self.level.skip == 0
+
+    def observe(self, seconds: float) -> None:
+        """Record the capture-to-sink latency of one inferred frame; may change the level."""
+        self._samples.append(seconds)
+        self._observed += 1
+        if len(self._samples) < self.window:
+            return
+        self.latency = float(np.quantile(np.fromiter(self._samples, float), self.quantile))
+        if self.latency > self.budget_s and self.index < len(self.levels) - 1:
+            failed = self.index
+            self._retry_after[failed] = self._observed + self.window * 2 ** self._failures[failed]
+            self._failures[failed] = min(self._failures[failed] + 1, MAX_BACKOFF)
+            self._switch(failed + 1, ">")
+        elif (
+            self.latency < self.headroom * self.budget_s
+            and self.index > 0
+            and self._observed >= self._retry_after[self.index - 1]
+        ):
+            self._switch(self.index - 1, "<")
+
+    def _switch(self, index: int, relation: str) -> None:
+        old = self.level
+        self.index = index
+        self.model = self.models[(self.level.weights, self.level.imgsz)]
+        self._samples.clear()  # judge the new level on its own frames
+        limit = self.budget_s if relation == ">" else self.headroom * self.budget_s
+        decision = {
+            "frame": self._observed,
+            "latency_ms": self.latency * 1e3,
+            "from": str(old),
+            "to": str(self.level),
+        }
+        self.decisions.append(decision)
+        if self.log:
+            self.log(
+                f"Governor: p{self.quantile * 100:.0f} latency {decision['latency_ms']:.1f} ms {relation} "
+                f"{limit * 1e3:.1f} ms; {old} -> {self.level} (level {index + 1}/{len(self.levels)})"
+            )
+
+    # ------------------------------------------------------------ detector side
+    def predict(self, frame: np.ndarray) -> Detections:
+        model = self.model
+        detections = model(frame)
+        self.timings = dict(model.timings)
+        return detections
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        model = self.model
+        results = model.predict_batch(frames)
+        self.timings = dict(model.timings)
+        return results
+
+    def warmup(self, runs: int = 2, shape: Optional[Sequence[int]] = None) -> float:
+        """Warm every level's model, so a switch does not hit a cold one."""
+        return sum(model.warmup(runs, shape) for model in self.models.values())
+
+    def close(self) -> None:
+        for model in self.models.values():
+            model.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "level": str(self.level),
+            "budget_ms": self.budget_s * 1e3,
+            "latency_ms": None if self.latency is None else self.latency * 1e3,
+            "changes": len(self.decisions),
+            "observed": self._observed,
+        }
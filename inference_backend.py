@@ -0,0 +1,504 @@
+"""Inference backends for the YOLOv8 detection scripts.
+
+Every script talks to the detector through :func:`create_backend`, which
+returns an object that is called with a BGR frame and gives back a
+:class:`detections.Detections` (NumPy arrays of boxes, confidences and class
+ids). Two implementations are provided:
+
+* ``"ultralytics"``: the original ``YOLO(MODEL_PATH)`` PyTorch eager path.
+  The conv + batch-norm fused model is cached on disk, so fusing happens once.
+* ``"onnx"``: ONNX Runtime on the CPU execution provider. The ``.pt`` weights
+  are exported once and the graph is cached on disk, keyed by the weights hash
+  and input size; letterboxing and NMS run in NumPy so torch never enters the
+  per-frame path. The graph as optimized by ONNX Runtime is cached as well,
+  which skips the optimization passes on later starts.
+
+:meth:`InferenceBackend.warmup` runs dummy frames through a freshly loaded
+backend, so lazy imports and allocations are paid for before the camera opens
+rather than on the first items of the line.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from detections import Detections
+
+DEFAULT_CACHE_DIR = ".model_cache"  # exported graphs live here, one per weights hash / imgsz
+LETTERBOX_COLOR = (114, 114, 114)   # same padding value Ultralytics uses
+MAX_WH = 7680                       # class offset for batched (class-aware) NMS
+DEFAULT_IOU = 0.7                   # Ultralytics' own NMS IoU, which the scripts always used
+
+
+def resolve_class_ids(names: Dict[int, str], labels: Iterable[str]) -> np.ndarray:
+    """Sorted model class ids for the given label strings."""
+    lookup = {name: idx for idx, name in names.items()}
+    return np.asarray(sorted({lookup[label] for label in labels if label in lookup}), dtype=np.int64)
+
+
+class InferenceBackend:
+    """Common interface: ``backend(frame) -> Detections`` plus ``names``."""
+
+    name = "base"
+
+    def __init__(self, conf: float = 0.25, iou: float = DEFAULT_IOU, imgsz: int = 640) -> None:
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.names: Dict[int, str] = {}
+        self.classes: Optional[np.ndarray] = None  # class ids allowed through NMS (None = all)
+        self.timings: Dict[str, float] = {}        # seconds per stage of the last predict() call
+
+    def restrict_classes(self, labels: Optional[Iterable[str]]) -> np.ndarray:
+        """Only let ``labels`` survive NMS; ``None`` restores every class.
+
+        Returns the resolved class ids. Labels the model does not know are
+        ignored.
+        """
+        if labels is None:
+            self.classes = None
+            return np.arange(len(self.names), dtype=np.int64)
+        self.classes = resolve_class_ids(self.names, labels)
+        if len(self.classes) == len(self.names):
+            self.classes = None  # nothing to filter; skip the extra work
+            return np.arange(len(self.names), dtype=np.int64)
+        return self.classes
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        raise NotImplementedError
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        """Detect on several frames at once (one per camera); ``timings`` covers the whole batch.
+
+        The default runs the frames one by one; backends override it to feed
+        the model a real batch.
+        """
+        results, totals = [], {}
+        for frame in frames:
+            results.append(self.predict(frame))
+            for stage, seconds in self.timings.items():
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        self.timings = totals
+        return results
+
+    def __call__(self, frame: np.ndarray) -> Detections:
+        return self.predict(frame)
+
+    def warmup(self, runs: int = 2, shape: Optional[Sequence[int]] = None) -> float:
+        """Run ``runs`` blank frames of ``shape`` (default ``imgsz`` square) through the model; returns seconds."""
+        start = time.perf_counter()
+        frame = np.full(tuple(shape or (self.imgsz, self.imgsz, 3)), LETTERBOX_COLOR[0], dtype=np.uint8)
+        for _ in range(runs):
+            self.predict(frame)
+        self.timings = {}
+        return time.perf_counter() - start
+
+    def close(self) -> None:
+        """Release worker processes or other runtime resources (no-op in-process)."""
+
+
+# --------------------------------------------------------------------------
+# Ultralytics (PyTorch) backend
+# --------------------------------------------------------------------------
+class UltralyticsBackend(InferenceBackend):
+    """Run the weights through ``ultralytics.YOLO`` as the scripts used to."""
+
+    name = "ultralytics"
+
+    def __init__(
+        self,
+        weights: str,
+        conf: float = 0.25,
+        iou: float = DEFAULT_IOU,
+        imgsz: int = 640,
+        device: Optional[str] = None,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    ) -> None:
+        super().__init__(conf, iou, imgsz)
+        from ultralytics import YOLO
+
+        self.device = device
+        cacheable = cache_dir is not None and weights.endswith(".pt") and os.path.exists(weights)
+        fused = cached_fused_path(weights, cache_dir) if cacheable else None
+        if fused and os.path.exists(fused):
+            self.model = YOLO(fused)
+        else:
+            self.model = YOLO(weights)
+            if fused:
+                save_fused(self.model, fused)
+        self.names = dict(self.model.names)
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        kwargs = {"device": self.device} if self.device else {}
+        if self.classes is not None:
+            kwargs["classes"] = self.classes.tolist()  # filtered inside Ultralytics' NMS
+        result = self.model(frame, conf=self.conf, iou=self.iou, imgsz=self.imgsz, verbose=False, **kwargs)[0]
+        self.timings = {stage: ms / 1e3 for stage, ms in result.speed.items() if ms is not None}
+        return Detections.from_ultralytics(result)
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        if not frames:
+            return []
+        kwargs = {"device": self.device} if self.device else {}
+        if self.classes is not None:
+            kwargs["classes"] = self.classes.tolist()
+        results = self.model(list(frames), conf=self.conf, iou=self.iou, imgsz=self.imgsz, verbose=False, **kwargs)
+        # Ultralytics reports per-image averages; scale them to the whole batch
+        self.timings = {stage: ms * len(frames) / 1e3 for stage, ms in results[0].speed.items() if ms is not None}
+        return [Detections.from_ultralytics(result) for result in results]
+
+
+def cached_fused_path(weights: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """Location of the fused copy of ``weights``."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    return os.path.join(cache_dir, f"{stem}-{weights_hash(weights)[:16]}-fused.pt")
+
+
+def save_fused(model, target: str) -> None:
+    """Fuse conv + batch-norm layers of an ``ultralytics.YOLO`` and save it as a checkpoint at ``target``.
+
+    Ultralytics skips fusing a model that is already fused, so loading the
+    checkpoint saves that step. Weights stay FP32 to keep the fused result
+    exact.
+    """
+    import torch
+
+    model.model.fuse(verbose=False)
+    checkpoint = {"model": model.model, "train_args": dict(getattr(model.model, "args", {}) or {})}
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    partial = f"{target}.{os.getpid()}.tmp"  # pool workers may save at the same time
+    torch.save(checkpoint, partial)
+    os.replace(partial, target)
+    print(f"Fused model cached at {target}")
+
+
+# --------------------------------------------------------------------------
+# ONNX Runtime backend
+# --------------------------------------------------------------------------
+def weights_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 of a weights file (hex digest)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_onnx_path(weights: str, imgsz: int, cache_dir: str = DEFAULT_CACHE_DIR, batch: int = 1) -> str:
+    """Location of the exported graph for ``weights`` at ``imgsz`` (and ``batch`` if not 1)."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    key = weights_hash(weights)[:16]
+    suffix = "-dyn" if batch == 0 else f"-b{batch}" if batch > 1 else ""
+    return os.path.join(cache_dir, f"{stem}-{key}-{imgsz}{suffix}.onnx")
+
+
+def cached_optimized_path(graph: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """Location of ONNX Runtime's optimized copy of ``graph``.
+
+    The key covers the graph file (path, size, mtime) and the runtime version.
+    The optimized graph may contain kernels for this CPU, so the cache is
+    local to the machine.
+    """
+    import onnxruntime as ort
+
+    stat = os.stat(graph)
+    source = f"{os.path.abspath(graph)}:{stat.st_size}:{stat.st_mtime_ns}:{ort.__version__}"
+    stem = os.path.splitext(os.path.basename(graph))[0]
+    return os.path.join(cache_dir, f"{stem}-{hashlib.sha256(source.encode()).hexdigest()[:16]}-opt.ort.onnx")
+
+
+def export_onnx(weights: str, imgsz: int = 640, cache_dir: str = DEFAULT_CACHE_DIR, batch: int = 1) -> str:
+    """Export ``weights`` to ONNX once and return the cached graph path.
+
+    The graph has a static input of ``batch`` images; multi-camera setups
+    export one with ``batch`` equal to the number of cameras. ``batch=0``
+    exports a dynamic batch axis for callers whose batch size varies (tiling).
+    """
+    target = cached_onnx_path(weights, imgsz, cache_dir, batch)
+    if os.path.exists(target):
+        return target
+
+    print(f"Exporting {weights} to ONNX (imgsz={imgsz}, batch={batch}); this only happens once...")
+    from ultralytics import YOLO
+
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, batch=max(batch, 1), dynamic=batch == 0,
+                                    simplify=True, verbose=False)
+    os.makedirs(cache_dir, exist_ok=True)
+    shutil.move(str(exported), target)
+    print(f"ONNX graph cached at {target}")
+    return target
+
+
+def class_names(weights: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Dict[int, str]:
+    """Class names of ``weights``, without torch when possible.
+
+    ``.onnx`` graphs, and ``.pt`` weights that already have an export in
+    ``cache_dir``, are read from the graph metadata with ONNX Runtime. Other
+    weights are loaded with Ultralytics.
+    """
+    graph = weights if weights.endswith(".onnx") else None
+    if graph is None and os.path.exists(weights):
+        stem = os.path.splitext(os.path.basename(weights))[0]
+        prefix = f"{stem}-{weights_hash(weights)[:16]}-"
+        exports = sorted(
+            name for name in (os.listdir(cache_dir) if os.path.isdir(cache_dir) else [])
+            if name.startswith(prefix) and name.endswith(".onnx") and not name.endswith(".ort.onnx")
+        )
+        graph = os.path.join(cache_dir, exports[0]) if exports else None
+    if graph is not None:
+        import onnxruntime as ort
+
+        metadata = ort.InferenceSession(graph, providers=["CPUExecutionProvider"]).get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            return {int(k): v for k, v in ast.literal_eval(metadata["names"]).items()}
+    from ultralytics import YOLO
+
+    return dict(YOLO(weights).names)
+
+
+def letterbox(image: np.ndarray, size: int) -> tuple:
+    """Resize keeping aspect ratio and pad to ``size``x``size``.
+
+    Returns ``(padded, ratio, (pad_x, pad_y))`` so boxes can be mapped back
+    with ``(xy - pad) / ratio``.
+    """
+    import cv2  # imported on first use, so importing a script stays cheap
+
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return padded, ratio, (left, top)
+
+
+def preprocess(image: np.ndarray, size: int) -> tuple:
+    """BGR frame -> normalized NCHW float32 blob plus letterbox parameters."""
+    padded, ratio, pad = letterbox(image, size)
+    blob = padded[:, :, ::-1].transpose(2, 0, 1)  # BGR->RGB, HWC->CHW
+    blob = np.ascontiguousarray(blob, dtype=np.float32)
+    blob *= 1.0 / 255.0
+    return blob[None], ratio, pad
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices sorted by score."""
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess(
+    output: np.ndarray,
+    conf: float,
+    iou: float,
+    ratio: float,
+    pad: tuple,
+    shape: tuple,
+    max_det: int = 300,
+    class_ids: Optional[np.ndarray] = None,
+) -> Detections:
+    """Decode a raw YOLOv8 head ``(1, 4 + nc, anchors)`` into frame-space boxes.
+
+    With ``class_ids`` the class head is sliced to those rows before the
+    confidence filter and NMS, so unwanted classes cost nothing downstream.
+    """
+    pred = output[0]
+    if class_ids is not None:
+        if len(class_ids) == 0:
+            return Detections.empty()
+        pred = pred[np.concatenate((np.arange(4), class_ids + 4))]
+    pred = pred.T  # (anchors, 4 + nc)
+    scores_all = pred[:, 4:]
+    cls = scores_all.argmax(axis=1)
+    scores = scores_all[np.arange(len(cls)), cls]
+
+    mask = scores >= conf
+    if not mask.any():
+        return Detections.empty()
+    pred, cls, scores = pred[mask], cls[mask], scores[mask]
+    if class_ids is not None:
+        cls = class_ids[cls]  # back from head rows to model class ids
+
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+
+    # Class-aware NMS in one pass by shifting each class into its own region.
+    keep = nms(boxes + (cls * MAX_WH)[:, None], scores, iou)[:max_det]
+    boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+
+    boxes[:, [0, 2]] -= pad[0]
+    boxes[:, [1, 3]] -= pad[1]
+    boxes /= ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return Detections(boxes, scores, cls)
+
+
+class OnnxBackend(InferenceBackend):
+    """YOLOv8 through ONNX Runtime's CPU execution provider.
+
+    ``weights`` may be a ``.pt`` file (exported and cached on first use) or an
+    already exported ``.onnx`` graph. ``batch`` sets the static batch size of
+    the export used by :meth:`predict_batch`. Single frames are padded to that
+    size, so keep ``batch=1`` for one camera; ``batch=0`` exports a dynamic
+    batch axis. With ``optimized_cache`` the session loads the graph that
+    ONNX Runtime optimized on an earlier start (see
+    :func:`cached_optimized_path`).
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        weights: str,
+        conf: float = 0.25,
+        iou: float = DEFAULT_IOU,
+        imgsz: int = 640,
+        device: Optional[str] = "cpu",
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        threads: Optional[int] = None,
+        batch: int = 1,
+        optimized_cache: bool = True,
+    ) -> None:
+        super().__init__(conf, iou, imgsz)
+        if device not in (None, "cpu"):
+            raise ValueError(f"The ONNX backend only runs on the CPU execution provider, not {device!r}")
+        import onnxruntime as ort
+
+        path = weights if weights.endswith(".onnx") else export_onnx(weights, imgsz, cache_dir, batch)
+        self.session = self._load_session(path, cache_dir, threads) if optimized_cache else None
+        if self.session is None:
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                options.intra_op_num_threads = threads
+            self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_path = path
+
+        input_shape = self.session.get_inputs()[0].shape
+        if isinstance(input_shape[-1], int):
+            self.imgsz = input_shape[-1]  # a static graph dictates its own size
+        self.batch_size = input_shape[0] if isinstance(input_shape[0], int) else None  # None = dynamic
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            self.names = {int(k): v for k, v in ast.literal_eval(metadata["names"]).items()}
+
+    @staticmethod
+    def _load_session(path: str, cache_dir: str, threads: Optional[int]):
+        """Session from the cached optimized graph, optimizing and caching it on the first start.
+
+        Returns ``None`` when the cache cannot be used, so the caller falls back
+        to optimizing in memory.
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        optimized = cached_optimized_path(path, cache_dir)
+        if os.path.exists(optimized):
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL  # already done
+            try:
+                return ort.InferenceSession(optimized, options, providers=["CPUExecutionProvider"])
+            except Exception as exc:  # e.g. copied from a machine with other CPU kernels
+                print(f"Ignoring cached optimized graph {optimized}: {exc}")
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.log_severity_level = 3  # the "hardware specific" warning is expected here
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = f"{optimized}.{os.getpid()}.tmp"  # pool workers may optimize at the same time
+        options.optimized_model_filepath = partial
+        try:
+            session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            os.replace(partial, optimized)
+        except OSError:
+            return None
+        return session
+
+    def _predict_one(self, frame: np.ndarray) -> Detections:
+        t0 = time.perf_counter()
+        blob, ratio, pad = preprocess(frame, self.imgsz)
+        t1 = time.perf_counter()
+        output = self.session.run(None, {self.input_name: blob})[0]
+        t2 = time.perf_counter()
+        detections = postprocess(output, self.conf, self.iou, ratio, pad, frame.shape[:2], class_ids=self.classes)
+        self.timings = {"preprocess": t1 - t0, "inference": t2 - t1, "postprocess": time.perf_counter() - t2}
+        return detections
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        if self.batch_size not in (None, 1):
+            return self.predict_batch([frame])[0]
+        return self._predict_one(frame)
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        if self.batch_size == 1:
+            return super().predict_batch(frames)
+        timings = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}
+        results: List[Detections] = []
+        step = self.batch_size or len(frames)
+        for start in range(0, len(frames), step):
+            chunk = frames[start:start + step]
+            t0 = time.perf_counter()
+            blobs, letterboxes = [], []
+            for frame in chunk:
+                blob, ratio, pad = preprocess(frame, self.imgsz)
+                blobs.append(blob)
+                letterboxes.append((ratio, pad, frame.shape[:2]))
+            batch = np.concatenate(blobs)
+            if len(chunk) < step:  # static graph: pad the last chunk with blank images
+                batch = np.concatenate((batch, np.zeros((step - len(chunk),) + batch.shape[1:], batch.dtype)))
+            t1 = time.perf_counter()
+            output = self.session.run(None, {self.input_name: batch})[0]
+            t2 = time.perf_counter()
+            for i, (ratio, pad, shape) in enumerate(letterboxes):
+                results.append(postprocess(output[i:i + 1], self.conf, self.iou, ratio, pad, shape,
+                                           class_ids=self.classes))
+            timings["preprocess"] += t1 - t0
+            timings["inference"] += t2 - t1
+            timings["postprocess"] += time.perf_counter() - t2
+        self.timings = timings
+        return results
+
+
+# --------------------------------------------------------------------------
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name: str, weights: str, **kwargs) -> InferenceBackend:
+    """Instantiate the backend called ``name`` ("ultralytics" or "onnx")."""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend: {name!r} (expected one of {sorted(BACKENDS)})") from None
+    return backend_cls(weights, **kwargs)
@@ -0,0 +1,505 @@
+"""Multi-process inference with a shared-memory frame ring.
+
+A single process running ``model(frame)`` tops out at a few cores. Letterboxing,
+NMS and the Python glue around the runtime all hold the GIL.
+:class:`InferencePool` runs ``workers`` detector processes, each with its own
+backend from :func:`inference_backend.create_backend`:
+
+* Frames are never pickled. The caller copies each frame into a free slot of
+  a :class:`FrameRing` (``multiprocessing.shared_memory``) and only sends
+  ``(seq, slot, shape)`` through the task queue of the least busy worker.
+  The worker runs the detector directly on that slot.
+* Workers return compact ``xyxy`` / ``conf`` / ``cls`` arrays, a few hundred
+  bytes per frame. A collector thread frees the slot and resolves the frame's
+  ``Future``.
+* :meth:`InferencePool.submit` returns futures in submission order, and
+  :meth:`InferencePool.imap` yields results in input order. The pipeline
+  awaits them in order, so the PLC sink sees frames in capture order even
+  though the workers finish out of order.
+
+The pool looks like an :class:`inference_backend.InferenceBackend` (``names``,
+``restrict_classes``, ``predict``, ``predict_batch``). It also exposes
+``max_in_flight`` so :class:`pipeline.MultiCameraPipeline` keeps enough frames
+in flight to occupy every worker.
+
+A worker that dies (a crash in the runtime, the OOM killer) is noticed by the
+collector within a second. Only the frames sent to that worker fail, their
+slots go back to the ring and the worker is started again. If the new worker
+cannot load the model, the pool fails every pending frame and refuses new
+ones.
+
+Workers are forked where the platform supports it (Linux). The scripts load
+their models and recipes in ``main()``, not at import time, so ``spawn`` is
+safe too: a spawned child re-imports the script's modules (about 0.2 s) and
+then loads only its own backend. Fork stays the default because the workers
+are ready about a second sooner. It must happen before the parent starts any
+other thread, which is why the scripts create the pool before the cameras,
+sinks and metrics server. Pass ``start_method="spawn"`` when that cannot be
+guaranteed. A restarted worker is forked while those threads run; use
+``spawn`` if the backend cannot cope with that.
+
+Throughput against worker count on a recording:
+    python inference_pool.py bench --source production.raw --workers 0 2 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import get_all_start_methods, get_context, resource_tracker, shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from detections import Detections
+from frame_sources import open_source
+from inference_backend import DEFAULT_IOU, LETTERBOX_COLOR, InferenceBackend, create_backend
+
+READY, DONE, FAILED = "ready", "done", "failed"
+WATCHDOG_S = 1.0  # how often the collector checks that the workers are alive
+
+
+class FrameRing:
+    """Fixed-size ``uint8`` frame slots in one shared-memory block."""
+
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None) -> None:
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+    def view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        """Zero-copy array over ``slot``; valid until the slot is reused."""
+        return np.ndarray(shape, np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot: int, frame: np.ndarray) -> None:
+        if frame.dtype != np.uint8:
+            raise ValueError(f"Frames must be uint8, got {frame.dtype}")
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes}-byte ring slot")
+        np.copyto(self.view(slot, frame.shape), frame)
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker(
+    index: int,
+    backend: str,
+    weights: str,
+    options: Dict[str, Any],
+    threads: Optional[int],
+    tasks: Any,
+    results: Any,
+) -> None:
+    """Worker process: load the backend, then detect on ring slots until ``None`` arrives."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl+C and shuts the pool down
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        if backend == "onnx":
+            options = {**options, "threads": threads}
+    try:
+        model = create_backend(backend, weights, **options)
+        if threads and backend == "ultralytics":
+            import torch
+
+            torch.set_num_threads(threads)
+    except Exception as exc:
+        results.put((READY, index, None, repr(exc)))
+        return
+    results.put((READY, index, model.names, None))
+
+    rings: Dict[str, FrameRing] = {}
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, ring_name, slot_bytes, shape, classes = task
+            if ring_name not in rings:
+                rings[ring_name] = FrameRing(0, slot_bytes, name=ring_name)
+            model.classes = classes
+            try:
+                detections = model.predict(rings[ring_name].view(slot, shape))
+                results.put((DONE, seq, slot, (detections.xyxy, detections.conf, detections.cls), model.timings))
+            except Exception as exc:
+                results.put((FAILED, seq, slot, repr(exc), None))
+    finally:
+        for ring in rings.values():
+            ring.close()
+
+
+class InferencePool(InferenceBackend):
+    """Run ``backend`` / ``weights`` in ``workers`` processes fed through a :class:`FrameRing`.
+
+    ``options`` go to :func:`inference_backend.create_backend` in every worker.
+    ``threads`` caps the math threads per worker (default: cores / workers), so
+    the workers do not oversubscribe the CPU. ``slots`` is the ring size
+    (default ``2 * workers``); :meth:`submit` blocks while every slot is in use.
+    The ring is sized from the first frame (or ``slot_bytes``). A larger
+    frame moves submissions to a new, larger ring; the old one stays mapped
+    until :meth:`close` because frames in flight may still live there.
+    """
+
+    name = "pool"
+
+    def __init__(
+        self,
+        backend: str,
+        weights: str,
+        workers: int = 2,
+        slots: Optional[int] = None,
+        threads: Optional[int] = None,
+        slot_bytes: Optional[int] = None,
+        start_method: Optional[str] = None,
+        ready_timeout: float = 600.0,
+        **options: Any,
+    ) -> None:
+        super().__init__(options.get("conf", 0.25), options.get("iou", DEFAULT_IOU), options.get("imgsz", 640))
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.backend = backend
+        self.workers = workers
+        self.slots = slots or 2 * workers
+        if self.slots < workers:
+            raise ValueError("slots must be at least the number of workers")
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self._slot_bytes = slot_bytes
+        self._ring: Optional[FrameRing] = None
+        self._retired: List[FrameRing] = []  # outgrown rings; in-flight frames may still live there
+
+        if start_method is None:
+            start_method = "fork" if "fork" in get_all_start_methods() else "spawn"
+        self._ctx = get_context(start_method)
+        self._worker_args = (backend, weights, options, self.threads)
+        self._results = self._ctx.Queue()
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._futures: Dict[int, Tuple[Future, int, int]] = {}  # seq -> (future, worker, slot)
+        self._load = [0] * workers   # frames in flight per worker
+        self._ready = [False] * workers
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._closing = False
+        self._broken: Optional[str] = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+        # One task queue per worker, so the pool knows which frames a dead worker took with it
+        self._tasks = [self._ctx.Queue() for _ in range(workers)]
+        self._processes = [self._new_process(i) for i in range(workers)]
+        # Workers must share the parent's tracker, or each one reports the ring as leaked at exit
+        resource_tracker.ensure_running()
+        for process in self._processes:
+            process.start()
+        try:
+            self._wait_ready(ready_timeout)
+        except Exception:
+            self.close()
+            raise
+        self._collector = threading.Thread(target=self._collect, name="inference-pool", daemon=True)
+        self._collector.start()
+
+    @property
+    def max_in_flight(self) -> int:
+        """Frames to keep submitted so every worker stays busy."""
+        return self.workers
+
+    # ------------------------------------------------------------------ API
+    def submit(self, frame: np.ndarray) -> "Future[Detections]":
+        """Copy ``frame`` into the ring and queue it; blocks while every slot is in use."""
+        slot = self._acquire_slot()
+        try:
+            ring = self._ring_for(frame.nbytes)
+            ring.write(slot, frame)
+        except Exception:
+            self._free.put(slot)
+            raise
+        future: Future = Future()
+        with self._lock:
+            if self._broken is not None:
+                self._free.put(slot)
+                raise RuntimeError(self._broken)
+            seq = self._seq
+            self._seq += 1
+            worker = self._pick_worker()
+            self._futures[seq] = (future, worker, slot)
+            self._load[worker] += 1
+            self.submitted += 1
+            self._tasks[worker].put((seq, slot, ring.name, ring.slot_bytes, frame.shape, self.classes))
+        return future
+
+    def submit_many(self, frames: Sequence[np.ndarray]) -> List["Future[Detections]"]:
+        return [self.submit(frame) for frame in frames]
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        return self.submit(frame).result()
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        """Spread ``frames`` over the workers and wait for all of them."""
+        return [future.result() for future in self.submit_many(frames)]
+
+    def warmup(self, runs: int = 2, shape: Optional[Sequence[int]] = None) -> float:
+        """Send ``runs`` rounds of one blank frame per worker, so every worker takes its cold first call."""
+        start = time.perf_counter()
+        frame = np.full(tuple(shape or (self.imgsz, self.imgsz, 3)), LETTERBOX_COLOR[0], dtype=np.uint8)
+        for _ in range(runs):
+            self.predict_batch([frame] * self.workers)
+        return time.perf_counter() - start
+
+    def imap(self, frames: Iterable[np.ndarray], in_flight: Optional[int] = None) -> Iterator[Detections]:
+        """Detections for ``frames`` in input order, with ``in_flight`` frames queued ahead."""
+        depth = in_flight or self.max_in_flight
+        pending: List[Future] = []
+        for frame in frames:
+            pending.append(self.submit(frame))
+            if len(pending) >= depth:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._futures)
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads,
+            "slots": self.slots,
+            "slot_mb": self._ring.slot_bytes / 1e6 if self._ring else 0.0,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "in_flight": in_flight,
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the workers (after queued frames) and release the ring."""
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            processes, tasks = list(self._processes), list(self._tasks)
+        for worker_tasks in tasks:
+            worker_tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        if getattr(self, "_collector", None) is not None:
+            self._collector.join(timeout)
+        self._fail_pending("inference pool closed")
+        for ring in self._retired + ([self._ring] if self._ring is not None else []):
+            ring.close()
+
+    def __enter__(self) -> "InferencePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------- internals
+    def _wait_ready(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        for _ in self._processes:
+            try:
+                _, index, names, error = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise RuntimeError(f"Inference workers did not load the model within {timeout:.0f} s") from None
+            if error is not None:
+                raise RuntimeError(f"Inference worker {index} failed to load the model: {error}")
+            self.names = names
+            self._ready[index] = True
+
+    def _new_process(self, index: int) -> Any:
+        return self._ctx.Process(target=_worker, name=f"inference-{index}", daemon=True,
+                                 args=(index, *self._worker_args, self._tasks[index], self._results))
+
+    def _pick_worker(self) -> int:
+        """The least busy loaded worker (any worker while none has loaded); call with the lock held."""
+        candidates = [i for i in range(self.workers) if self._ready[i]] or range(self.workers)
+        return min(candidates, key=self._load.__getitem__)
+
+    def _ring_for(self, nbytes: int) -> FrameRing:
+        """The current ring, replaced by a larger one when a frame does not fit."""
+        with self._lock:
+            if self._ring is None or nbytes > self._ring.slot_bytes:
+                if self._ring is not None:
+                    self._retired.append(self._ring)
+                self._ring = FrameRing(self.slots, max(nbytes, self._slot_bytes or 0))
+            return self._ring
+
+    def _acquire_slot(self) -> int:
+        while True:
+            if self._closing:
+                raise RuntimeError("Inference pool is closed")
+            try:
+                return self._free.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+    def _collect(self) -> None:
+        next_check = time.monotonic() + WATCHDOG_S
+        while True:
+            try:
+                message = self._results.get(timeout=WATCHDOG_S)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                return
+            if message:
+                self._handle(message)
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + WATCHDOG_S
+                self._check_workers()
+
+    def _handle(self, message: tuple) -> None:
+        if message[0] == READY:
+            _, index, _, error = message
+            if error is not None:
+                self._fail_pending(f"Restarted inference worker {index} failed to load the model: {error}", broken=True)
+                return
+            with self._lock:
+                self._ready[index] = True
+            return
+        kind, seq, _, payload, timings = message
+        future = self._finish(seq)
+        if future is None:  # already failed with its dead worker
+            return
+        if kind == DONE:
+            self.completed += 1
+            self.timings = timings
+            future.set_result(Detections(*payload))
+        else:
+            self.failed += 1
+            future.set_exception(RuntimeError(f"Inference failed on frame {seq}: {payload}"))
+
+    def _finish(self, seq: int) -> Optional[Future]:
+        """Forget frame ``seq`` and free its slot; ``None`` if it was already settled."""
+        with self._lock:
+            entry = self._futures.pop(seq, None)
+            if entry is None:
+                return None
+            future, worker, slot = entry
+            self._load[worker] -= 1
+        self._free.put(slot)
+        return future
+
+    def _check_workers(self) -> None:
+        for index, process in enumerate(list(self._processes)):
+            if not process.is_alive():
+                self._restart(index, process.exitcode)
+
+    def _restart(self, index: int, exitcode: Optional[int]) -> None:
+        """Fail the frames a dead worker took with it, reclaim their slots and start a new worker."""
+        with self._lock:
+            if self._closing or self._broken is not None:
+                return
+            if not self._ready[index]:
+                broken = True  # died before it loaded the model; restarting again would not help
+            else:
+                broken = False
+                self._ready[index] = False
+                old_tasks, self._tasks[index] = self._tasks[index], self._ctx.Queue()
+                self._processes[index] = self._new_process(index)
+                self._processes[index].start()
+                self.restarts += 1
+            lost = [seq for seq, (_, worker, _) in self._futures.items() if worker == index]
+        reason = f"Inference worker {index} died (exit code {exitcode})"
+        if broken:
+            self._fail_pending(f"{reason} while loading the model", broken=True)
+            return
+        print(f"{reason}; failing its {len(lost)} frame(s) and restarting it")
+        old_tasks.cancel_join_thread()  # frames still queued there are failed below
+        old_tasks.close()
+        for seq in lost:
+            future = self._finish(seq)
+            if future is not None:
+                self.failed += 1
+                future.set_exception(RuntimeError(f"{reason} on frame {seq}"))
+
+    def _fail_pending(self, reason: str, broken: bool = False) -> None:
+        """Fail every frame in flight; a ``broken`` pool also refuses new frames."""
+        with self._lock:
+            if broken:
+                if self._broken is not None:
+                    return
+                self._broken = reason
+                print(f"{reason}; inference pool disabled")
+            seqs = list(self._futures)
+        for seq in seqs:
+            future = self._finish(seq)
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError(reason))
+
+
+def create_model(backend: str, weights: str, workers: int = 0, **options: Any) -> InferenceBackend:
+    """A single in-process backend, or an :class:`InferencePool` when ``workers`` > 0."""
+    if workers > 0:
+        return InferencePool(backend, weights, workers=workers, **options)
+    return create_backend(backend, weights, **options)
+
+
+def bench(source: str, backend: str, weights: str, workers: int, frames: int, warmup: int = 5) -> Dict[str, Any]:
+    """Frames per second of ordered ``imap`` inference (``workers=0``: in-process)."""
+    cap = open_source(source, realtime=False, loop=True)
+    images = []
+    while len(images) < frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        images.append(frame)
+    cap.release()
+    slot_bytes = max(image.nbytes for image in images)
+    model = create_model(backend, weights, workers, **({"slot_bytes": slot_bytes} if workers else {}))
+    try:
+        for image in images[:warmup]:
+            model(image)
+        start = time.perf_counter()
+        if workers:
+            for _ in model.imap(images):
+                pass
+        else:
+            for image in images:
+                model(image)
+        elapsed = time.perf_counter() - start
+    finally:
+        model.close()
+    return {"workers": workers, "frames": len(images), "seconds": elapsed, "fps": len(images) / elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-process inference pool.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench", help="compare throughput across worker counts")
+    b.add_argument("--source", required=True, help="video file, image folder or .raw dump")
+    b.add_argument("--backend", default="onnx")
+    b.add_argument("--weights", default="yolov8s.pt")
+    b.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    b.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        result = bench(args.source, args.backend, args.weights, workers, args.frames)
+        print(f"workers={workers:<3} {result['fps']:.1f} FPS ({result['frames']} frames in {result['seconds']:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
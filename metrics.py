@@ -0,0 +1,468 @@
+"""Lightweight runtime metrics: counters, gauges and HDR-style histograms.
+
+The detection scripts record per-frame timings and event counts into a
+:class:`MetricsRegistry`. The registry can be
+
+* scraped over HTTP in the Prometheus text format (:class:`MetricsServer`,
+  ``GET /metrics``), and
+* dumped to a JSON file every few seconds (:class:`PeriodicDumper`).
+
+:class:`Histogram` uses log-linear buckets, as HdrHistogram does: each power of
+two is split into ``2**sub_bits`` equal buckets. Recording is O(1) and the
+relative error of any percentile is below ``2**-sub_bits`` (under 1 % by
+default), from microseconds up to a minute. Percentiles are exported as a
+Prometheus summary over a sliding window (the current plus the previous
+``window_s`` period), so a slowdown shows up within a minute rather than
+being averaged into the whole uptime. ``_sum`` and ``_count`` cover the whole
+uptime.
+
+:class:`PipelineMetrics` bundles the standard set used by the scripts, and
+:class:`StartupTimer` breaks the time from launch to the first frame into
+phases.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_PORT = 9108
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    """Value that can go up and down (queue depth, last frame age, ...)."""
+
+    kind = "gauge"
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class Callback:
+    """Counter or gauge whose value is read from ``fn`` at collection time."""
+
+    def __init__(self, kind: str, fn: Callable[[], float]) -> None:
+        self.kind = kind
+        self._fn = fn
+
+    @property
+    def value(self) -> float:
+        try:
+            return float(self._fn())
+        except Exception:  # a failing collector must never break the scrape
+            return float("nan")
+
+
+class _Buckets:
+    """Log-linear bucket counts over integer multiples of ``unit`` seconds."""
+
+    def __init__(self, size: int) -> None:
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.total = 0
+
+
+class Histogram:
+    """HDR-style duration histogram with a sliding percentile window.
+
+    Values are stored in units of ``lowest_s`` and clamped to ``highest_s``.
+    """
+
+    kind = "summary"
+
+    def __init__(
+        self,
+        lowest_s: float = 1e-6,
+        highest_s: float = 60.0,
+        sub_bits: int = 7,
+        window_s: float = 60.0,
+    ) -> None:
+        self.unit = lowest_s
+        self.sub_bits = sub_bits
+        self.window_s = window_s
+        self._max_units = max(1, int(highest_s / lowest_s))
+        self._size = self._index(self._max_units) + 1
+
+        self._lock = threading.Lock()
+        self._current = _Buckets(self._size)
+        self._previous = _Buckets(self._size)
+        self._rotated = time.monotonic()
+
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    # ------------------------------------------------------------ buckets
+    def _index(self, units: int) -> int:
+        shift = max(0, units.bit_length() - self.sub_bits - 1)
+        return (shift << self.sub_bits) + (units >> shift)
+
+    def _bucket_values(self) -> np.ndarray:
+        """Midpoint (in seconds) of every bucket."""
+        idx = np.arange(self._size)
+        shift = np.maximum(0, (idx >> self.sub_bits) - 1)
+        sub = idx - (shift << self.sub_bits)
+        low = sub << shift
+        return (low + ((1 << shift) - 1) / 2) * self.unit
+
+    def _rotate(self, now: float) -> None:
+        if now - self._rotated < self.window_s:
+            return
+        # An idle period longer than two windows leaves nothing worth keeping.
+        stale = now - self._rotated >= 2 * self.window_s
+        self._previous = _Buckets(self._size) if stale else self._current
+        self._current = _Buckets(self._size)
+        self._rotated = now
+
+    # ---------------------------------------------------------------- API
+    def record(self, seconds: float) -> None:
+        units = min(self._max_units, max(0, int(seconds / self.unit)))
+        index = self._index(units)
+        with self._lock:
+            self._rotate(time.monotonic())
+            self._current.counts[index] += 1
+            self._current.total += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def time(self) -> "_Timer":
+        """``with histogram.time(): ...`` records the block's duration."""
+        return _Timer(self)
+
+    def percentiles(self, quantiles=QUANTILES) -> Dict[float, float]:
+        """Percentiles (seconds) over the sliding window; NaN when it is empty."""
+        with self._lock:
+            self._rotate(time.monotonic())
+            counts = self._current.counts + self._previous.counts
+            total = self._current.total + self._previous.total
+        if not total:
+            return {q: float("nan") for q in quantiles}
+        cumulative = np.cumsum(counts)
+        values = self._bucket_values()
+        ranks = np.maximum(1, np.ceil(np.asarray(quantiles) * total)).astype(np.int64)
+        return {q: float(values[i]) for q, i in zip(quantiles, np.searchsorted(cumulative, ranks))}
+
+    def as_dict(self) -> Dict[str, Any]:
+        window = self.percentiles()
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "max_ms": self.max * 1e3,
+            **{f"p{int(q * 100)}_ms": value * 1e3 for q, value in window.items()},
+        }
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._histogram.record(time.perf_counter() - self._start)
+
+
+class MetricsRegistry:
+    """Named metrics, each optionally split by a set of labels."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._kind: Dict[str, str] = {}
+        self._metrics: Dict[str, Dict[LabelKey, Any]] = {}
+
+    def _get(self, name: str, help: str, labels: Optional[Dict[str, str]], factory: Callable[[], Any]) -> Any:
+        key = _label_key(labels)
+        with self._lock:
+            family = self._metrics.setdefault(name, {})
+            if key not in family:
+                metric = factory()
+                if self._kind.setdefault(name, metric.kind) != metric.kind:
+                    raise ValueError(f"Metric {name!r} is already registered as a {self._kind[name]}")
+                self._help.setdefault(name, help)
+                family[key] = metric
+            return family[key]
+
+    def counter(self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(name, help, labels, Counter)
+
+    def gauge(self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get(name, help, labels, Gauge)
+
+    def histogram(self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None, **kwargs) -> Histogram:
+        return self._get(name, help, labels, lambda: Histogram(**kwargs))
+
+    def collect(
+        self,
+        name: str,
+        fn: Callable[[], float],
+        help: str = "",
+        kind: str = "gauge",
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Callback:
+        """Register a counter / gauge read from ``fn`` whenever metrics are exported."""
+        return self._get(name, help, labels, lambda: Callback(kind, fn))
+
+    def _families(self) -> List[Tuple[str, Dict[LabelKey, Any]]]:
+        with self._lock:
+            return [(name, dict(family)) for name, family in self._metrics.items()]
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for name, family in self._families():
+            if self._help[name]:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._kind[name]}")
+            for key, metric in family.items():
+                if isinstance(metric, Histogram):
+                    for q, value in metric.percentiles().items():
+                        lines.append(f"{name}{_format_labels(key, ('quantile', str(q)))} {_format_value(value)}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(metric.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly view: ``{name: {labels: value or histogram dict}}``."""
+        out: Dict[str, Any] = {}
+        for name, family in self._families():
+            out[name] = {
+                _format_labels(key) or "": metric.as_dict() if isinstance(metric, Histogram) else metric.value
+                for key, metric in family.items()
+            }
+        return out
+
+
+class MetricsServer:
+    """Serve ``registry`` as Prometheus text on ``http://host:port/metrics``."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> None:
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:  # keep scrapes out of the console
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class PeriodicDumper:
+    """Write :meth:`MetricsRegistry.snapshot` as JSON to ``path`` every ``interval_s``.
+
+    The file is replaced atomically, so readers never see a partial dump.
+    """
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval_s: float = 10.0) -> None:
+        self.registry = registry
+        self.path = path
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+
+    def start(self) -> "PeriodicDumper":
+        self._thread.start()
+        return self
+
+    def dump(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"time": time.time(), "metrics": self.registry.snapshot()}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        """Stop the thread and write a final dump."""
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self.dump()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.dump()
+            except OSError as exc:
+                print(f"Metrics dump to {self.path} failed: {exc}")
+
+
+class PipelineMetrics:
+    """Standard frame / inference / PLC metrics shared by the detection scripts."""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, labels: Optional[Dict[str, str]] = None) -> None:
+        self.registry = registry or MetricsRegistry()
+        r, lb = self.registry, labels
+        self.frames = r.counter("vision_frames_total", "Frames processed by the vision loop", lb)
+        self.inferences = r.counter("vision_inferences_total", "Detector runs", lb)
+        self.inference_errors = r.counter("vision_inference_errors_total", "Detector runs that raised", lb)
+        self.frame_seconds = r.histogram("vision_frame_seconds", "Capture-to-decision time per frame", lb)
+        self.inference_seconds = r.histogram("vision_inference_seconds", "Detector call duration", lb)
+        self.plc_writes = r.counter("vision_plc_writes_total", "PLC write requests", lb)
+        self.plc_errors = r.counter("vision_plc_write_errors_total", "Failed PLC write requests", lb)
+        self.plc_write_seconds = r.histogram("vision_plc_write_seconds", "PLC write round-trip time", lb)
+        self._labels = lb
+
+    def watch_capture(self, cap: Any) -> None:
+        """Export the capture's dropped-frame count and frame age (if it tracks them)."""
+        if not hasattr(cap, "stats") or "dropped" not in cap.stats():
+            return
+        self.registry.collect(
+            "vision_frames_dropped_total", lambda: cap.stats()["dropped"],
+            "Frames overwritten before the detector used them", "counter", self._labels,
+        )
+        self.registry.collect(
+            "vision_frame_age_seconds", lambda: cap.stats()["last_age_ms"] / 1e3,
+            "Age of the last frame when it reached the detector", "gauge", self._labels,
+        )
+
+    def record_plc_write(self, seconds: float, ok: bool) -> None:
+        self.plc_writes.inc()
+        if not ok:
+            self.plc_errors.inc()
+        self.plc_write_seconds.record(seconds)
+
+
+def process_age() -> float:
+    """Seconds since this process was started."""
+    try:
+        # Linux: start time in clock ticks since boot (10 ms resolution)
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, AttributeError, ValueError, IndexError):
+        import psutil  # on Linux only whole seconds, as the boot time is; fine elsewhere
+
+        age = time.time() - psutil.Process().create_time()
+    return max(age, 0.0)
+
+
+class StartupTimer:
+    """Wall-clock time of consecutive startup phases (import, load, warm-up, ...)."""
+
+    def __init__(self, start: Optional[float] = None) -> None:
+        self.start = time.perf_counter() if start is None else start
+        self.phases: Dict[str, float] = {}
+        self._last = self.start
+
+    @classmethod
+    def since_launch(cls) -> "StartupTimer":
+        """Timer started at process start: the first phase covers interpreter start and imports."""
+        return cls(time.perf_counter() - process_age())
+
+    def mark(self, phase: str) -> float:
+        """End ``phase`` now; returns its duration in seconds."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+        return self.phases[phase]
+
+    @property
+    def total(self) -> float:
+        return self._last - self.start
+
+    def report(self) -> str:
+        parts = [f"{phase} {seconds:.2f} s" for phase, seconds in self.phases.items()]
+        return f"Startup: {', '.join(parts)} (ready after {self.total:.2f} s)"
+
+    def export(self, registry: MetricsRegistry) -> None:
+        """Publish the phases as ``vision_startup_seconds{phase=...}`` gauges."""
+        for phase, seconds in self.phases.items():
+            registry.gauge("vision_startup_seconds", "Startup time per phase", {"phase": phase}).set(seconds)
+
+
+def start_metrics(
+    metrics: PipelineMetrics,
+    port: Optional[int] = DEFAULT_PORT,
+    dump_file: Optional[str] = None,
+    dump_interval_s: float = 10.0,
+    host: str = "127.0.0.1",
+) -> List[Any]:
+    """Start the HTTP endpoint and / or file dumper; returns them for ``close()``."""
+    exporters: List[Any] = []
+    if port:
+        try:
+            server = MetricsServer(metrics.registry, host, port).start()
+            exporters.append(server)
+            print(f"Metrics at http://{server.host}:{server.port}/metrics")
+        except OSError as exc:
+            print(f"Metrics endpoint unavailable on port {port}: {exc}")
+    if dump_file:
+        exporters.append(PeriodicDumper(metrics.registry, dump_file, dump_interval_s).start())
+    return exporters
@@ -0,0 +1,130 @@
+"""Cheap scene-change gate in front of the detector.
+
+A presence check does not need YOLO while the conveyor is idle. The gate
+compares small, blurred grayscale copies of each frame and only lets the
+detector run when enough pixels changed, with a forced re-check every
+``max_interval_s`` so a missed change can never latch a stale result.
+
+Two methods are available:
+
+* ``"diff"``: absolute difference against the frame from the last executed
+  inference. Slow drift accumulates until it crosses the threshold.
+* ``"mog2"``: OpenCV's MOG2 background subtractor; the foreground fraction is
+  compared with the threshold. More robust to flicker, slightly more costly.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+GATE_METHODS = ("diff", "mog2")
+
+
+class MotionGate:
+    """Decide per frame whether the detector needs to run."""
+
+    def __init__(
+        self,
+        threshold: float = 0.01,
+        pixel_delta: int = 25,
+        width: int = 160,
+        max_interval_s: float = 2.0,
+        method: str = "diff",
+    ) -> None:
+        if method not in GATE_METHODS:
+            raise ValueError(f"Unknown motion gate method: {method!r} (expected one of {GATE_METHODS})")
+        import cv2  # imported on first use, so importing a script stays cheap
+
+        self.threshold = threshold          # fraction of changed pixels that triggers inference
+        self.pixel_delta = pixel_delta      # grey-level change that counts a pixel as changed
+        self.width = width                  # downsampled width used for the comparison
+        self.max_interval_s = max_interval_s
+        self.method = method
+
+        self._reference: Optional[np.ndarray] = None
+        self._subtractor = (
+            cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=pixel_delta, detectShadows=False)
+            if method == "mog2"
+            else None
+        )
+        self._last_run = 0.0
+        self._candidate: Optional[Tuple[np.ndarray, float, bool]] = None
+
+        self.checked = 0
+        self.executed = 0
+        self.forced = 0
+        self.last_change = 0.0
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        import cv2
+
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, int(h * self.width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def changed_fraction(self, small: np.ndarray) -> float:
+        """Fraction of pixels that changed (``1.0`` when there is no reference yet)."""
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(small)
+            return float(np.count_nonzero(mask)) / mask.size
+        if self._reference is None or self._reference.shape != small.shape:
+            return 1.0
+        import cv2
+
+        diff = cv2.absdiff(small, self._reference)
+        return float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+    def check(self, frame: np.ndarray, now: Optional[float] = None) -> bool:
+        """Return ``True`` if the detector must run on ``frame``, without recording that it did.
+
+        Call :meth:`commit` once the frame really goes to the detector. Until
+        then the reference frame and the re-check timer stay as they were, so
+        a change on a frame that was dropped later (e.g. by the latency
+        governor) still triggers on the next frame.
+        """
+        now = time.monotonic() if now is None else now
+        small = self._small_gray(frame)
+        self.last_change = self.changed_fraction(small)
+        self.checked += 1
+
+        run = self.last_change >= self.threshold
+        forced = not run and now - self._last_run >= self.max_interval_s
+        self._candidate = (small, now, forced) if run or forced else None
+        return run or forced
+
+    def commit(self) -> None:
+        """Record that the detector ran on the frame of the last positive :meth:`check`."""
+        if self._candidate is None:
+            return
+        small, now, forced = self._candidate
+        self._candidate = None
+        self.executed += 1
+        self.forced += int(forced)
+        self._last_run = now
+        self._reference = small
+
+    def should_infer(self, frame: np.ndarray, now: Optional[float] = None) -> bool:
+        """:meth:`check` and :meth:`commit` in one step, for callers that always run the detector."""
+        run = self.check(frame, now)
+        if run:
+            self.commit()
+        return run
+
+    @property
+    def skipped(self) -> int:
+        return self.checked - self.executed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "skipped": self.skipped,
+            "forced": self.forced,
+            "skip_ratio": self.skipped / self.checked if self.checked else 0.0,
+            "last_change": self.last_change,
+        }
@@ -0,0 +1,140 @@
+"""Detection overlays, rendered off the critical path.
+
+Drawing boxes, ``cv2.imshow`` and ``cv2.waitKey`` used to run inline in every
+frame loop. :class:`OverlayViewer` moves them to a separate thread: the loop
+only publishes the latest ``(frame, detections)`` snapshot, and the viewer
+renders whatever is newest at a capped display rate. In headless mode the
+scripts simply don't create a viewer, so no drawing happens at all.
+
+Note: HighGUI windows driven from a worker thread work with the GTK/Qt
+backends on Linux and on Windows; macOS requires the main thread.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from detections import Detections
+
+BOX_COLOR = (0, 255, 0)
+TEXT_COLOR = (255, 255, 255)
+CENTROID_COLOR = (0, 0, 255)
+
+
+def draw_detections(
+    frame: Any,
+    detections: Detections,
+    names: Optional[Dict[int, str]] = None,
+    show_centroids: bool = False,
+) -> Any:
+    """Draw boxes (and optionally centroids) onto ``frame`` in place.
+
+    Without ``names`` only the confidence is printed above each box.
+    """
+    import cv2  # imported on first use, so importing a script stays cheap
+
+    for x1, y1, x2, y2, conf, cls, cx, cy in detections.rows():
+        text = f"{names[cls]} {conf:.2f}" if names else f"{conf:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), BOX_COLOR, 2)
+        cv2.putText(frame, text, (x1, max(20, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, TEXT_COLOR, 2)
+        if show_centroids:
+            cv2.circle(frame, (cx, cy), 4, CENTROID_COLOR, -1)
+    return frame
+
+
+class OverlayViewer:
+    """Render the latest detection snapshot in a window on its own thread.
+
+    ``publish`` hands the frame over to the viewer, which draws on it in
+    place; the caller must not modify the frame afterwards. ``roi`` (anything
+    with ``draw(frame)``, e.g. :class:`roi.RegionOfInterest`) is outlined on
+    every rendered frame.
+    """
+
+    def __init__(
+        self,
+        window: str,
+        names: Optional[Dict[int, str]] = None,
+        max_fps: float = 15.0,
+        show_centroids: bool = False,
+        quit_keys: Sequence[str] = ("q", "Q"),
+        roi: Any = None,
+    ) -> None:
+        self.window = window
+        self.roi = roi
+        self.names = names
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.show_centroids = show_centroids
+        self._quit_codes = {ord(k) for k in quit_keys}
+
+        self._cond = threading.Condition()
+        self._snapshot: Optional[tuple] = None
+        self._running = True
+        self._quit = threading.Event()
+
+        self.published = 0
+        self.rendered = 0
+
+        self._thread = threading.Thread(target=self._run, name="overlay-viewer", daemon=True)
+        self._thread.start()
+
+    @property
+    def quit_requested(self) -> bool:
+        """``True`` once a quit key was pressed in the window."""
+        return self._quit.is_set()
+
+    def publish(self, frame: Any, detections: Detections) -> None:
+        """Replace the pending snapshot; never blocks on rendering."""
+        with self._cond:
+            self._snapshot = (frame, detections)
+            self.published += 1
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+
+    def _run(self) -> None:
+        import cv2  # the window thread is the only place the viewer needs OpenCV
+
+        next_render = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    if self._running and self._snapshot is None:
+                        self._cond.wait(0.05)
+                    if not self._running:
+                        return
+                    snapshot, self._snapshot = self._snapshot, None
+
+                if snapshot is None:
+                    if self.rendered:
+                        self._poll_keys(1)  # keep the window responsive while idle
+                    continue
+
+                frame, detections = snapshot
+                if self.roi is not None:
+                    self.roi.draw(frame)
+                draw_detections(frame, detections, self.names, self.show_centroids)
+                cv2.imshow(self.window, frame)
+                self.rendered += 1
+
+                # waitKey doubles as the frame-rate cap and pumps the GUI events.
+                next_render += self.interval
+                delay_ms = int((next_render - time.monotonic()) * 1e3)
+                if delay_ms < 1:
+                    delay_ms, next_render = 1, time.monotonic()
+                self._poll_keys(delay_ms)
+        finally:
+            if self.rendered:
+                cv2.destroyWindow(self.window)
+
+    def _poll_keys(self, delay_ms: int) -> None:
+        import cv2
+
+        if cv2.waitKey(delay_ms) & 0xFF in self._quit_codes:
+            self._quit.set()
@@ -0,0 +1,513 @@
+"""Asyncio pipeline runtime shared by the detection scripts.
+
+The three scripts used to repeat the same blocking loop. In that loop, capture,
+inference, drawing and PLC / robot I/O all ran one after the other, so a slow
+write held up the next frame. :class:`Pipeline` runs that loop on an asyncio
+event loop instead:
+
+* ``source.read()`` and the detector each run in their own single-thread
+  executor. For recorded sources the next frame is read while the current one
+  is being inferred; live sources are read after inference so the detector
+  still gets the newest frame.
+* A synchronous ``process`` hook turns the raw detections into the frame's
+  result (tracking, recipe lookups, presence state, console output).
+* Every :class:`Sink` gets the result through its own bounded queue and
+  consumes it on its own task. ``offer`` never waits: when a sink falls behind,
+  its queue policy decides what to drop (``drop_oldest`` or
+  ``coalesce_latest``, as in :mod:`plc_output`). A slow PLC or robot
+  therefore cannot stall the frame loop.
+
+:class:`BlockingSink` adapts a blocking function such as a pylogix, Modbus
+or UDP call. The function runs in the sink's own thread, so two slow sinks do
+not wait on each other either.
+
+:class:`MultiCameraPipeline` runs several cameras (:class:`CameraStream`)
+against one model instance and batches their frames on every tick;
+:class:`Pipeline` is its single-camera case.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from detections import Detections
+from frame_capture import LatestFrameReader
+from plc_output import COALESCE_LATEST, DROP_OLDEST, QUEUE_POLICIES
+
+
+@dataclass
+class FrameResult:
+    """Everything the sinks and the viewer need to know about one frame."""
+
+    seq: int                       # 0-based frame number
+    frame: np.ndarray
+    detections: Detections         # what the overlay shows; ``process`` may replace it
+    captured: float                # time.monotonic() when the frame was read
+    captured_at: float             # time.time() at the same moment, for other machines
+    inferred: bool                 # the detector ran on this frame
+    events: List[Any] = field(default_factory=list)  # sink payloads added by ``process``
+
+
+class Sink:
+    """Async consumer of :class:`FrameResult` objects with a bounded queue."""
+
+    name = "sink"
+
+    def __init__(self, maxsize: int = 8, policy: str = DROP_OLDEST) -> None:
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown sink queue policy: {policy!r} (expected one of {QUEUE_POLICIES})")
+        self.policy = policy
+        self.maxsize = 1 if policy == COALESCE_LATEST else maxsize
+        self._queue: Optional[asyncio.Queue] = None
+
+        self.offered = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def accepts(self, result: FrameResult) -> bool:
+        """Filter applied before queueing; by default every frame goes through."""
+        return True
+
+    async def consume(self, result: FrameResult) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release resources once the queue has been drained."""
+
+    # ------------------------------------------------------------ runtime side
+    def offer(self, result: FrameResult) -> bool:
+        """Queue ``result`` without waiting; returns ``False`` if something was dropped."""
+        if not self.accepts(result):
+            return True
+        self.offered += 1
+        discarded = False
+        while self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+            discarded = True
+        self._queue.put_nowait(result)
+        return not discarded
+
+    async def run(self) -> None:
+        self._queue = asyncio.Queue(self.maxsize)
+        while True:
+            result = await self._queue.get()
+            try:
+                await self.consume(result)
+                self.consumed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.errors += 1
+                print(f"{self.name} sink error: {exc}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "offered": self.offered,
+            "consumed": self.consumed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+class BlockingSink(Sink):
+    """Run a blocking ``fn(result)`` on a dedicated thread.
+
+    ``when`` filters the results that are queued at all, e.g. only frames that
+    carry events. Sinks that share a connection that is not thread-safe (one
+    Modbus client for several stations) pass the same ``executor``; the sink
+    does not shut down an executor it did not create.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[FrameResult], Any],
+        name: str = "sink",
+        maxsize: int = 8,
+        policy: str = DROP_OLDEST,
+        when: Optional[Callable[[FrameResult], bool]] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ) -> None:
+        super().__init__(maxsize, policy)
+        self.fn = fn
+        self.name = name
+        self.when = when
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(1, thread_name_prefix=f"sink-{name}")
+
+    def accepts(self, result: FrameResult) -> bool:
+        return self.when is None or self.when(result)
+
+    async def consume(self, result: FrameResult) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.fn, result)
+
+    async def close(self) -> None:
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+
+class CameraStream:
+    """One camera of a :class:`MultiCameraPipeline` together with its station's sinks.
+
+    ``source``, ``sinks``, ``process``, ``should_infer``, ``viewer`` and
+    ``metrics`` mean the same as for :class:`Pipeline`, scoped to this camera.
+    ``on_infer(frame, seq)`` is called for each frame that is actually sent
+    to the detector, after ``should_infer`` and the governor agreed; a
+    motion gate commits its reference frame there. ``name`` labels the
+    stream in logs and stats. With a ``roi``
+    (:class:`roi.RegionOfInterest`), ``should_infer`` and the detector only
+    see the cropped region. The detections are mapped back to full-frame
+    coordinates before ``process`` runs.
+    """
+
+    def __init__(
+        self,
+        source: Any,
+        sinks: Sequence[Sink] = (),
+        process: Optional[Callable[[FrameResult], None]] = None,
+        should_infer: Optional[Callable[[np.ndarray, int], bool]] = None,
+        viewer: Any = None,
+        metrics: Any = None,
+        name: str = "camera",
+        prefetch: Optional[bool] = None,
+        roi: Any = None,
+        on_infer: Optional[Callable[[np.ndarray, int], None]] = None,
+    ) -> None:
+        self.source = source
+        self.sinks = list(sinks)
+        self.process = process
+        self.should_infer = should_infer
+        self.on_infer = on_infer
+        self.viewer = viewer
+        self.metrics = metrics
+        self.name = name
+        self.roi = roi
+        # Reading ahead only makes sense for recordings; a camera frame would go stale.
+        self.prefetch = not isinstance(source, LatestFrameReader) if prefetch is None else prefetch
+
+        self.frames = 0                       # frames published
+        self.inferences = 0
+        self.inference_errors = 0
+        self.stop_reason: Optional[str] = None
+        self.detections = Detections.empty()  # reused on frames the detector skips
+        self._seq = 0                         # frames read; runs ahead of ``frames`` with a pool
+        self._stopping = False
+        self._capture: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[asyncio.Future] = None
+
+    @property
+    def active(self) -> bool:
+        return not self._stopping
+
+    def stop(self, reason: str = "stopped") -> None:
+        """Stop reading from this camera after the current frame."""
+        self.stop_reason = self.stop_reason or reason
+        self._stopping = True
+        self._stop_source()
+
+    def _stop_source(self) -> None:
+        # A read waiting on a stalled camera returns instead of blocking shutdown
+        if isinstance(self.source, LatestFrameReader):
+            self.source.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "inferences": self.inferences,
+            "inference_errors": self.inference_errors,
+            "stop_reason": self.stop_reason,
+            "sinks": {sink.name: sink.stats() for sink in self.sinks},
+        }
+
+    # ------------------------------------------------------------ runtime side
+    def _open(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._capture = ThreadPoolExecutor(1, thread_name_prefix=f"capture-{self.name}")
+        if self.prefetch:
+            self._pending = loop.run_in_executor(self._capture, self.source.read)
+
+    async def _read(self, loop: asyncio.AbstractEventLoop):
+        """``(seq, frame, captured, captured_at)`` for the next frame, or ``None`` at the end of the stream."""
+        read = self._pending if self._pending is not None else loop.run_in_executor(self._capture, self.source.read)
+        ok, frame = await read
+        self._pending = None
+        if not ok:
+            self.stop("end of stream")
+            return None
+        captured, captured_at = time.monotonic(), time.time()
+        if self.prefetch:
+            self._pending = loop.run_in_executor(self._capture, self.source.read)
+        self._seq += 1
+        return self._seq - 1, frame, captured, captured_at
+
+    async def _close(self) -> None:
+        self._stop_source()
+        if self._pending is not None:
+            await asyncio.wait([self._pending], timeout=2.0)  # the grab thread cannot be interrupted
+            self._pending = None
+        if self._capture is not None:
+            self._capture.shutdown(wait=False)
+
+
+class MultiCameraPipeline:
+    """Run several :class:`CameraStream` objects against one shared model.
+
+    Each tick reads one frame from every active camera in parallel (one
+    capture thread per camera). The frames that need the detector then go to
+    the model together as one batch: ``model.predict_batch(frames)`` when the
+    model has it (see :meth:`inference_backend.InferenceBackend.predict_batch`)
+    and more than one frame is due, ``model(frame)`` otherwise. Each camera's
+    results go back to its own ``process`` hook, sinks, metrics and viewer, so
+    every station keeps its own PLC tags or coils. The model is loaded once
+    and the CPU cores see one large batch instead of N small ones. A camera
+    that ends drops out; the others keep running. A batch whose inference
+    raises is counted in ``inference_errors`` and its cameras keep their
+    previous detections for that frame.
+
+    With an :class:`inference_pool.InferencePool` as ``model``, up to
+    ``model.max_in_flight`` ticks are submitted before the oldest one is
+    awaited. Results are still processed and handed to the sinks in capture
+    order.
+
+    A ``governor`` (:class:`governor.LatencyGovernor`, usually also the
+    ``model``) gets the capture-to-sink latency of every inferred frame and
+    may thin out the frames each camera's ``should_infer`` lets through.
+    """
+
+    def __init__(
+        self,
+        model: Callable[[np.ndarray], Detections],
+        streams: Sequence[CameraStream],
+        drain_timeout: float = 5.0,
+        governor: Any = None,
+    ) -> None:
+        if not streams:
+            raise ValueError("MultiCameraPipeline needs at least one camera stream")
+        self.model = model
+        self.streams = list(streams)
+        self.drain_timeout = drain_timeout
+        self.governor = governor
+
+        # Ticks kept in flight: an InferencePool needs one per worker to keep them all busy
+        self.in_flight = max(1, getattr(model, "max_in_flight", 1))
+
+        self.ticks = 0
+        self.batches = 0
+        self.inference_errors = 0
+        self.batched_frames = 0
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def sinks(self) -> List[Sink]:
+        return [sink for stream in self.streams for sink in stream.sinks]
+
+    def stop(self, reason: str = "stopped") -> None:
+        """Ask every camera to finish after the current tick."""
+        self.stop_reason = self.stop_reason or reason
+        for stream in self.streams:
+            stream.stop(reason)
+
+    def _infer(self, frames: List[np.ndarray]) -> List[Detections]:
+        if len(frames) == 1 or not hasattr(self.model, "predict_batch"):
+            return [self.model(frame) for frame in frames]
+        return self.model.predict_batch(frames)
+
+    async def _submit(self, loop: asyncio.AbstractEventLoop, executor: ThreadPoolExecutor, frames: List[np.ndarray]):
+        """Start inference on ``frames``; returns an awaitable for their detections."""
+        if self.in_flight == 1:
+            return loop.run_in_executor(executor, self._infer, frames)
+        # Out-of-process model: submitting only waits for a free ring slot
+        futures = await loop.run_in_executor(executor, self.model.submit_many, frames)
+        return asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        inference = ThreadPoolExecutor(1, thread_name_prefix="inference")
+        sink_tasks = [asyncio.create_task(sink.run(), name=f"sink-{sink.name}") for sink in self.sinks]
+        await asyncio.sleep(0)  # let the sinks create their queues
+        for stream in self.streams:
+            stream._open(loop)
+        ticks: Deque[tuple] = deque()  # submitted, not yet published; completed strictly in order
+        try:
+            while True:
+                active = [stream for stream in self.streams if stream.active]
+                if not active:
+                    self.stop_reason = self.stop_reason or "end of stream"
+                    break
+                reads = await self._read_all(loop, active)
+                ready = [(stream, read) for stream, read in zip(active, reads) if read is not None]
+                if not ready:
+                    continue
+
+                # The detector (and motion gate) only look at each camera's region of interest
+                inputs = [stream.roi.crop(frame) if stream.roi else frame for stream, (_, frame, _, _) in ready]
+                due = [
+                    i for i, (stream, (seq, _, _, _)) in enumerate(ready)
+                    if (stream.should_infer is None or stream.should_infer(inputs[i], seq))
+                    and (self.governor is None or self.governor.admit(stream.name))
+                ]
+                pending = None
+                for i in due:
+                    stream, (seq, _, _, _) = ready[i]
+                    if stream.on_infer:
+                        stream.on_infer(inputs[i], seq)
+                if due:
+                    start = time.perf_counter()
+                    pending = await self._submit(loop, inference, [inputs[i] for i in due])
+                ticks.append((ready, due, pending, start if due else 0.0))
+                while len(ticks) >= self.in_flight:
+                    await self._complete(*ticks.popleft())
+            while ticks:
+                await self._complete(*ticks.popleft())
+        finally:
+            for _, _, pending, _ in ticks:
+                if pending is not None:
+                    pending.cancel()
+            for stream in self.streams:
+                await stream._close()
+            await self._drain_sinks()
+            for task in sink_tasks:
+                task.cancel()
+            await asyncio.gather(*sink_tasks, return_exceptions=True)
+            for sink in self.sinks:
+                await sink.close()
+            inference.shutdown(wait=False)
+
+    async def _read_all(self, loop: asyncio.AbstractEventLoop, streams: List[CameraStream]) -> list:
+        """One read per stream; the quit key still works while a camera stalls."""
+        reads = asyncio.gather(*(stream._read(loop) for stream in streams))
+        try:
+            while True:
+                done, _ = await asyncio.wait([reads], timeout=0.5)
+                if done:
+                    return reads.result()
+                if any(stream.viewer and stream.viewer.quit_requested for stream in self.streams):
+                    self.stop("quit key")  # stops the readers, so the pending reads return
+        except asyncio.CancelledError:
+            reads.cancel()
+            raise
+
+    async def _complete(self, ready: list, due: List[int], pending: Any, start: float) -> None:
+        """Wait for one tick's detections and publish its frames."""
+        if pending is not None:
+            try:
+                results = await pending
+            except Exception as exc:
+                # One bad batch must not end the run: the due cameras keep their previous detections
+                self._inference_failed(ready, due, exc)
+                due = []
+            else:
+                elapsed = time.perf_counter() - start  # each camera waited for the whole batch
+                self.batches += 1
+                self.batched_frames += len(due)
+                for i, detections in zip(due, results):
+                    stream = ready[i][0]
+                    stream.detections = stream.roi.to_frame(detections) if stream.roi else detections
+                    stream.inferences += 1
+                    if stream.metrics:
+                        stream.metrics.inference_seconds.record(elapsed)
+                        stream.metrics.inferences.inc()
+
+        for i, (stream, (seq, frame, captured, captured_at)) in enumerate(ready):
+            self._publish(stream, FrameResult(seq, frame, stream.detections, captured, captured_at, i in due))
+        self.ticks += 1
+
+    def _inference_failed(self, ready: list, due: List[int], exc: Exception) -> None:
+        print(f"Inference failed on tick {self.ticks}: {exc!r}")
+        self.inference_errors += 1
+        for i in due:
+            stream = ready[i][0]
+            stream.inference_errors += 1
+            if stream.metrics:
+                stream.metrics.inference_errors.inc()
+
+    def _publish(self, stream: CameraStream, result: FrameResult) -> None:
+        if stream.process:
+            stream.process(result)
+        for sink in stream.sinks:
+            sink.offer(result)
+        stream.frames += 1
+        latency = time.monotonic() - result.captured
+        if stream.metrics:
+            stream.metrics.frames.inc()
+            stream.metrics.frame_seconds.record(latency)
+        if self.governor and result.inferred:
+            self.governor.observe(latency)
+
+        if stream.viewer:
+            stream.viewer.publish(result.frame, result.detections)
+            if stream.viewer.quit_requested:
+                self.stop("quit key")
+
+    async def _drain_sinks(self) -> None:
+        try:
+            await asyncio.wait_for(asyncio.gather(*(sink.drain() for sink in self.sinks)), self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Sinks not drained after {self.drain_timeout} s; pending results are dropped")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ticks": self.ticks,
+            "batches": self.batches,
+            "mean_batch": self.batched_frames / self.batches if self.batches else 0.0,
+            "inference_errors": self.inference_errors,
+            "stop_reason": self.stop_reason,
+            "cameras": {stream.name: stream.stats() for stream in self.streams},
+        }
+
+
+class Pipeline(MultiCameraPipeline):
+    """Capture -> detect -> process -> sinks for a single camera.
+
+    ``should_infer(frame, seq)`` decides whether the detector runs on a frame
+    (motion gate, every-Nth frame); on skipped frames ``detections`` is the
+    previous frame's result; ``on_infer`` is told about the frames that did
+    go to the detector. ``metrics`` is an optional
+    :class:`metrics.PipelineMetrics`.
+    """
+
+    def __init__(
+        self,
+        source: Any,
+        model: Callable[[np.ndarray], Detections],
+        sinks: Sequence[Sink] = (),
+        process: Optional[Callable[[FrameResult], None]] = None,
+        should_infer: Optional[Callable[[np.ndarray, int], bool]] = None,
+        viewer: Any = None,
+        metrics: Any = None,
+        prefetch: Optional[bool] = None,
+        drain_timeout: float = 5.0,
+        roi: Any = None,
+        governor: Any = None,
+        on_infer: Optional[Callable[[np.ndarray, int], None]] = None,
+    ) -> None:
+        self.stream = CameraStream(source, sinks, process, should_infer, viewer, metrics,
+                                   prefetch=prefetch, roi=roi, on_infer=on_infer)
+        super().__init__(model, [self.stream], drain_timeout, governor)
+
+    @property
+    def frames(self) -> int:
+        return self.stream.frames
+
+    @property
+    def inferences(self) -> int:
+        return self.stream.inferences
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stream.stats(), "stop_reason": self.stop_reason}
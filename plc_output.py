@@ -0,0 +1,297 @@
+"""Background PLC handshake writer for the EtherNet/IP item tags.
+
+The vision loop hands each new item to :class:`PlcHandshakeWorker`, which runs
+the ``Vision_Item_Index`` / ``Vision_Pressure`` / ``Vision_NewData`` handshake
+on its own thread. Capture and inference keep running at full frame rate while
+the ~0.5 s NewData pulse and the EtherNet/IP round-trips happen in parallel.
+
+Two queue policies are available when the PLC falls behind:
+
+* ``drop_oldest``: keep the most recent ``maxsize`` requests, discarding the
+  oldest pending one when the queue is full.
+* ``coalesce_latest``: only the newest request is kept pending; anything that
+  has not been written yet is superseded.
+
+With ``batch_writes`` (the default) the index, pressure and the rising NewData
+edge go out as one multi-tag ``Write([(tag, value), ...])`` call, which pylogix
+packs into a single CIP Multiple Service Packet: one round-trip instead of
+three. NewData is the last service in the packet, so the PLC applies index and
+pressure first. Only when the PLC answers the batch with "Service not
+supported" (CIP status 0x08, no Multiple Service Packet support) does the
+worker fall back to sequential writes for good. Any other failure (a timeout,
+a dropped connection, a per-tag error) is retried tag by tag for that item
+only, and the next item is batched again.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+DROP_OLDEST = "drop_oldest"
+COALESCE_LATEST = "coalesce_latest"
+QUEUE_POLICIES = (DROP_OLDEST, COALESCE_LATEST)
+
+ITEM_INDEX_TAG = "Vision_Item_Index"
+PRESSURE_TAG = "Vision_Pressure"
+NEW_DATA_TAG = "Vision_NewData"
+BATCH_KEY = "batch"  # write_stats entry for multi-tag writes
+BATCH_UNSUPPORTED = ("Service not supported",)  # reply statuses meaning the PLC cannot batch at all
+
+
+@dataclass(frozen=True)
+class HandshakeRequest:
+    """A single item to publish to the PLC."""
+
+    label: str
+    item_index: int
+    pressure: float
+    created: float  # time.monotonic() when the request was queued
+
+
+class LatencyStats:
+    """Running count / mean / max of a latency measured in seconds."""
+
+    __slots__ = ("count", "errors", "total", "max", "last")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        """Add one sample; failed writes are counted but still timed."""
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return the stats in milliseconds for printing or JSON output."""
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": self.mean * 1e3,
+            "max_ms": self.max * 1e3,
+            "last_ms": self.last * 1e3,
+        }
+
+
+class PlcHandshakeWorker:
+    """Perform the item handshake on a dedicated thread.
+
+    ``plc`` is any object exposing pylogix's ``Write(tag, value)`` and
+    ``Write([(tag, value), ...])`` (``pylogix.PLC`` in production). The worker
+    never closes the connection; the owner does. Each write round-trip is also
+    reported to ``metrics`` (a :class:`metrics.PipelineMetrics`) when given.
+    ``tag_prefix`` is prepended to the three tag names, so several stations
+    can share one PLC (``"St2_"`` -> ``St2_Vision_Item_Index``, ...).
+    """
+
+    def __init__(
+        self,
+        plc: Any,
+        pulse_s: float = 0.5,
+        maxsize: int = 8,
+        policy: str = DROP_OLDEST,
+        batch_writes: bool = True,
+        metrics: Optional[Any] = None,
+        tag_prefix: str = "",
+    ) -> None:
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown PLC queue policy: {policy!r} (expected one of {QUEUE_POLICIES})")
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.plc = plc
+        self.pulse_s = pulse_s
+        self.policy = policy
+        self.maxsize = 1 if policy == COALESCE_LATEST else maxsize
+        self.batch_writes = batch_writes
+        self.metrics = metrics
+        self.index_tag = tag_prefix + ITEM_INDEX_TAG
+        self.pressure_tag = tag_prefix + PRESSURE_TAG
+        self.new_data_tag = tag_prefix + NEW_DATA_TAG
+
+        self._queue: Deque[HandshakeRequest] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.round_trips = 0
+        self.write_stats: Dict[str, LatencyStats] = {
+            BATCH_KEY: LatencyStats(),
+            self.index_tag: LatencyStats(),
+            self.pressure_tag: LatencyStats(),
+            self.new_data_tag: LatencyStats(),
+        }
+        self.handshake_stats = LatencyStats()  # queued -> NewData raised
+        self.raise_stats = LatencyStats()      # dequeued -> NewData raised (write path only)
+
+        self._thread = threading.Thread(target=self._run, name=f"plc-handshake{'-' + tag_prefix.rstrip('_') if tag_prefix else ''}", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------ API
+    def submit(self, label: str, item_index: int, pressure: float) -> bool:
+        """Queue a handshake; returns ``False`` if a pending request was discarded."""
+        request = HandshakeRequest(label, int(item_index), float(pressure), time.monotonic())
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("PLC handshake worker is closed")
+            discarded = False
+            while len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+                discarded = True
+            self._queue.append(request)
+            self.submitted += 1
+            self._cond.notify()
+        return not discarded
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def close(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        """Stop the worker, optionally finishing queued handshakes first."""
+        with self._cond:
+            if not drain:
+                self.dropped += len(self._queue)
+                self._queue.clear()
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue counters and per-tag write latency."""
+        with self._cond:
+            pending = len(self._queue)
+        return {
+            "policy": self.policy,
+            "batch_writes": self.batch_writes,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending": pending,
+            "round_trips": self.round_trips,
+            "round_trips_per_handshake": self.round_trips / self.completed if self.completed else 0.0,
+            "handshake": self.handshake_stats.as_dict(),
+            "raise_new_data": self.raise_stats.as_dict(),
+            "writes": {tag: s.as_dict() for tag, s in self.write_stats.items()},
+        }
+
+    # ------------------------------------------------------------- internals
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                request = self._queue.popleft()
+            self._handshake(request)
+
+    def _handshake(self, request: HandshakeRequest) -> None:
+        start = time.perf_counter()
+        if not self._raise_new_data(request):
+            self.failed += 1
+            print(f"PLC handshake failed for {request.label}: NewData was not raised")
+            return
+        self.raise_stats.record(time.perf_counter() - start)
+        self.handshake_stats.record(time.monotonic() - request.created)
+        print(
+            f"Sent to PLC: {request.label} | Index={request.item_index} "
+            f"| Pressure={request.pressure} kPa"
+        )
+        time.sleep(self.pulse_s)
+        self._write(self.new_data_tag, False)
+        self.completed += 1
+
+    def _raise_new_data(self, request: HandshakeRequest) -> bool:
+        """Write index + pressure and raise NewData; ``False`` if any of the writes failed."""
+        if self.batch_writes:
+            ok, unsupported = self._write_batch(
+                [
+                    (self.index_tag, request.item_index),
+                    (self.pressure_tag, request.pressure),
+                    (self.new_data_tag, True),
+                ]
+            )
+            if ok:
+                return True
+            if unsupported:
+                print("PLC does not support multi-tag writes; falling back to sequential writes")
+                self.batch_writes = False
+            else:
+                print("Batched PLC write failed; retrying tag by tag")
+
+        ok = self._write(self.index_tag, request.item_index)
+        ok = self._write(self.pressure_tag, request.pressure) and ok
+        if not ok:
+            return False
+        return self._write(self.new_data_tag, True)
+
+    def _write_batch(self, writes: List[Tuple[str, Any]]) -> Tuple[bool, bool]:
+        """One multi-tag write; returns ``(ok, unsupported)``.
+
+        ``unsupported`` is only set when the PLC explicitly refuses the
+        Multiple Service Packet. Exceptions and timeouts count as transient.
+        """
+        start = time.perf_counter()
+        self.round_trips += 1
+        unsupported = False
+        try:
+            responses = self.plc.Write(writes)
+            if not isinstance(responses, (list, tuple)) or len(responses) != len(writes):
+                raise TypeError(f"unexpected multi-write response: {responses!r}")
+            failed = [
+                (tag, getattr(r, "Status", "Success"))
+                for (tag, _), r in zip(writes, responses)
+                if getattr(r, "Status", "Success") != "Success"
+            ]
+            for tag, status in failed:
+                print(f"PLC write error on {tag}: {status}")
+            ok = not failed
+            unsupported = any(status in BATCH_UNSUPPORTED for _, status in failed)
+        except Exception as exc:  # pragma: no cover - depends on hardware
+            print(f"PLC multi-tag write error: {exc}")
+            ok = False
+        self._record(BATCH_KEY, time.perf_counter() - start, ok)
+        return ok, unsupported
+
+    def _write(self, tag: str, value: Any) -> bool:
+        start = time.perf_counter()
+        self.round_trips += 1
+        try:
+            response = self.plc.Write(tag, value)
+            status = getattr(response, "Status", "Success")
+            ok = status == "Success"
+            if not ok:
+                print(f"PLC write error on {tag}: {status}")
+        except Exception as exc:  # pragma: no cover - depends on hardware
+            print(f"PLC write error on {tag}: {exc}")
+            ok = False
+        self._record(tag, time.perf_counter() - start, ok)
+        return ok
+
+    def _record(self, key: str, seconds: float, ok: bool) -> None:
+        self.write_stats[key].record(seconds, ok)
+        if self.metrics is not None:
+            self.metrics.record_plc_write(seconds, ok)
@@ -0,0 +1,445 @@
+"""Local PLC simulator and output-path latency harness.
+
+Lets the output layer be measured without hardware:
+
+* :class:`ModbusSimulator` - a pymodbus TCP server with coils and holding
+  registers, standing in for the presence-detection PLC.
+* :class:`TagServer` - a minimal tag server holding ``Vision_Item_Index`` /
+  ``Vision_Pressure`` / ``Vision_NewData``. It speaks a small JSON-lines
+  protocol, not real CIP; :class:`TagClient` gives it the ``pylogix.PLC``
+  ``Write`` / ``Read`` / ``Close`` interface so :class:`PlcHandshakeWorker`
+  runs against it unchanged. A multi-tag write is one request, like a CIP
+  Multiple Service Packet.
+
+Both servers inject a configurable latency plus uniform jitter before applying
+a write and log the arrival time (``time.monotonic()``) of every write. The
+harness records a timestamp per simulated frame capture and reports capture ->
+tag arrival latency percentiles.
+
+Usage:
+    python plc_simulator.py serve --latency-ms 3 --jitter-ms 1
+    python plc_simulator.py bench --events 200 --latency-ms 3 --inference-ms 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from plc_output import ITEM_INDEX_TAG, NEW_DATA_TAG, PRESSURE_TAG, PlcHandshakeWorker
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_MODBUS_PORT = 5020   # 502 needs root; point PLC_PORT here for local runs
+DEFAULT_TAG_PORT = 5021
+DEFAULT_TAGS = {ITEM_INDEX_TAG: 0, PRESSURE_TAG: 0.0, NEW_DATA_TAG: False}
+
+
+def station_tags(prefixes: Sequence[str]) -> Dict[str, Any]:
+    """Handshake tags for every station prefix (``""`` is the unprefixed set)."""
+    return {prefix + name: value for prefix in prefixes for name, value in DEFAULT_TAGS.items()}
+
+
+class LatencyModel:
+    """Fixed latency plus uniform jitter, seeded for repeatable runs."""
+
+    def __init__(self, latency_s: float = 0.0, jitter_s: float = 0.0, seed: int = 0) -> None:
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self._rng = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency_s + self._rng.uniform(-self.jitter_s, self.jitter_s))
+
+
+class EventLog:
+    """Thread-safe ``(arrival_time, source, name, value)`` write log."""
+
+    def __init__(self) -> None:
+        self._events: List[Tuple[float, str, str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, source: str, name: str, value: Any) -> None:
+        with self._lock:
+            self._events.append((time.monotonic(), source, name, value))
+
+    def snapshot(self) -> List[Tuple[float, str, str, Any]]:
+        with self._lock:
+            return list(self._events)
+
+    def arrivals(self, name: str, value: Any = None) -> List[float]:
+        """Arrival times of writes to ``name`` (optionally only of ``value``)."""
+        return [t for t, _, n, v in self.snapshot() if n == name and (value is None or v == value)]
+
+
+class _ServerThread:
+    """Run an asyncio server coroutine on a private event loop thread."""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def _start(self, serve: Callable[[], Any]) -> None:
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(serve())
+            self._ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name=self._name, daemon=True)
+        self._thread.start()
+        if not self._ready.wait(5.0):
+            raise RuntimeError(f"{self._name} did not start")
+
+    def _stop(self, shutdown: Callable[[], Any]) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5.0)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5.0)
+        self._loop = None
+
+
+# --------------------------------------------------------------------------
+# Modbus TCP
+# --------------------------------------------------------------------------
+class ModbusSimulator(_ServerThread):
+    """pymodbus TCP server with recorded, delayed coil / register writes."""
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_MODBUS_PORT,
+        latency: Optional[LatencyModel] = None,
+        size: int = 100,
+    ) -> None:
+        super().__init__("modbus-simulator")
+        from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+
+        self.host, self.port = host, port
+        self.latency = latency or LatencyModel()
+        self.log = EventLog()
+        sim = self
+
+        class RecordingBlock(ModbusSequentialDataBlock):
+            def __init__(self, kind: str, values: list) -> None:
+                super().__init__(0, values)
+                self.kind = kind
+
+            def setValues(self, address, values):  # noqa: N802 - pymodbus API
+                time.sleep(sim.latency.delay())  # a slow PLC also stalls its Modbus server
+                super().setValues(address, values)
+                values = values if isinstance(values, list) else [values]
+                for offset, value in enumerate(values):
+                    sim.log.record("modbus", f"{self.kind}{address + offset - 1}", value)
+
+        self.coils = RecordingBlock("coil", [False] * size)
+        self.registers = RecordingBlock("hr", [0] * size)
+        slave = ModbusSlaveContext(co=self.coils, hr=self.registers, zero_mode=False)
+        self._context = ModbusServerContext(slaves=slave, single=True)
+        self._server = None
+
+    def start(self) -> "ModbusSimulator":
+        from pymodbus.server import ModbusTcpServer
+
+        async def serve() -> None:
+            self._server = ModbusTcpServer(self._context, address=(self.host, self.port))
+            asyncio.ensure_future(self._server.serve_forever())
+            await asyncio.sleep(0.2)  # let the listener bind
+
+        self._start(serve)
+        return self
+
+    def stop(self) -> None:
+        async def shutdown() -> None:
+            if self._server is not None:
+                await self._server.shutdown()
+
+        self._stop(shutdown)
+
+
+# --------------------------------------------------------------------------
+# Tag server (pylogix stand-in)
+# --------------------------------------------------------------------------
+class TagServer(_ServerThread):
+    """JSON-lines tag server emulating the ``Vision_*`` controller tags.
+
+    Requests: ``{"op": "write", "tags": [[name, value], ...]}`` or
+    ``{"op": "read", "tags": [name, ...]}``; the reply carries one status (and
+    value) per tag. Unknown tags fail like a missing controller tag would.
+    With ``multi_service=False`` multi-tag writes are refused with "Service not
+    supported", like a controller without Multiple Service Packet support.
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_TAG_PORT,
+        latency: Optional[LatencyModel] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        multi_service: bool = True,
+    ) -> None:
+        super().__init__("tag-server")
+        self.host, self.port = host, port
+        self.latency = latency or LatencyModel()
+        self.tags = dict(DEFAULT_TAGS if tags is None else tags)
+        self.multi_service = multi_service
+        self.log = EventLog()
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def start(self) -> "TagServer":
+        async def serve() -> None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]  # resolves port=0
+
+        self._start(serve)
+        return self
+
+    def stop(self) -> None:
+        async def shutdown() -> None:
+            if self._server is not None:
+                self._server.close()
+                await self._server.wait_closed()
+
+        self._stop(shutdown)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                self.requests += 1
+                await asyncio.sleep(self.latency.delay())
+                writer.write(json.dumps(self._apply(request)).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    def _apply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        results = []
+        if request.get("op") == "write":
+            if len(request["tags"]) > 1 and not self.multi_service:
+                return {"results": [{"tag": name, "status": "Service not supported"} for name, _ in request["tags"]]}
+            for name, value in request["tags"]:
+                if name not in self.tags:
+                    results.append({"tag": name, "status": "Path destination unknown"})
+                    continue
+                self.tags[name] = value
+                self.log.record("tag", name, value)
+                results.append({"tag": name, "value": value, "status": "Success"})
+        elif request.get("op") == "read":
+            for name in request["tags"]:
+                if name in self.tags:
+                    results.append({"tag": name, "value": self.tags[name], "status": "Success"})
+                else:
+                    results.append({"tag": name, "value": None, "status": "Path destination unknown"})
+        else:
+            return {"results": [], "error": f"unknown op {request.get('op')!r}"}
+        return {"results": results}
+
+
+class TagClient:
+    """``pylogix.PLC``-compatible client for :class:`TagServer`."""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_TAG_PORT, timeout: float = 5.0) -> None:
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        self._lock = threading.Lock()
+
+    def _request(self, payload: Dict[str, Any]) -> List[SimpleNamespace]:
+        with self._lock:
+            self._sock.sendall(json.dumps(payload).encode() + b"\n")
+            reply = json.loads(self._file.readline())
+        return [SimpleNamespace(TagName=r["tag"], Value=r.get("value"), Status=r["status"]) for r in reply["results"]]
+
+    def Write(self, tag, value=None):  # noqa: N802 - mirrors pylogix
+        if isinstance(tag, (list, tuple)):
+            return self._request({"op": "write", "tags": [[t, v] for t, v in tag]})
+        return self._request({"op": "write", "tags": [[tag, value]]})[0]
+
+    def Read(self, tag):  # noqa: N802 - mirrors pylogix
+        if isinstance(tag, (list, tuple)):
+            return self._request({"op": "read", "tags": list(tag)})
+        return self._request({"op": "read", "tags": [tag]})[0]
+
+    def Close(self) -> None:  # noqa: N802 - mirrors pylogix
+        self._file.close()
+        self._sock.close()
+
+
+# --------------------------------------------------------------------------
+# Harness
+# --------------------------------------------------------------------------
+def summarize(samples_s: Sequence[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    if not samples_s:
+        return {"count": 0}
+    ordered = sorted(samples_s)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1e3
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1e3,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+def bench_tags(
+    events: int,
+    latency: LatencyModel,
+    inference_s: float = 0.0,
+    interval_s: float = 0.0,
+    pulse_s: float = 0.0,
+    batch_writes: bool = True,
+) -> Dict[str, Any]:
+    """Frame capture -> ``Vision_NewData`` rising edge at the tag server."""
+    server = TagServer(port=0, latency=latency).start()
+    client = TagClient(server.host, server.port)
+    worker = PlcHandshakeWorker(client, pulse_s=pulse_s, maxsize=events, batch_writes=batch_writes)
+
+    captures = []
+    start = time.monotonic()
+    for i in range(events):
+        captures.append(time.monotonic())       # frame captured
+        time.sleep(inference_s)                 # stand-in for inference
+        worker.submit(f"item{i}", i % 5 + 1, 40.0 + i % 5)
+        time.sleep(interval_s)
+    worker.close()
+    elapsed = time.monotonic() - start
+
+    arrivals = server.log.arrivals(NEW_DATA_TAG, True)
+    client.Close()
+    server.stop()
+    return {
+        "sink": "tags",
+        "batch_writes": batch_writes,
+        "events": events,
+        "delivered": len(arrivals),
+        "throughput_per_s": len(arrivals) / elapsed if elapsed else 0.0,
+        "requests": server.requests,
+        "capture_to_tag": summarize([a - c for c, a in zip(captures, arrivals)]),
+        "worker": worker.stats(),
+    }
+
+
+def bench_modbus(
+    events: int,
+    latency: LatencyModel,
+    inference_s: float = 0.0,
+    interval_s: float = 0.0,
+    coil: int = 1,
+    port: int = DEFAULT_MODBUS_PORT,
+) -> Dict[str, Any]:
+    """Frame capture -> coil write arrival, toggling the coil on every event."""
+    from pymodbus.client import ModbusTcpClient
+
+    server = ModbusSimulator(port=port, latency=latency).start()
+    client = ModbusTcpClient(server.host, port=server.port)
+    if not client.connect():
+        server.stop()
+        raise ConnectionError(f"Could not connect to the Modbus simulator on port {server.port}")
+
+    captures = []
+    start = time.monotonic()
+    for i in range(events):
+        captures.append(time.monotonic())
+        time.sleep(inference_s)
+        client.write_coil(coil, i % 2 == 0)
+        time.sleep(interval_s)
+    elapsed = time.monotonic() - start
+
+    arrivals = server.log.arrivals(f"coil{coil}")
+    client.close()
+    server.stop()
+    return {
+        "sink": "modbus",
+        "events": events,
+        "delivered": len(arrivals),
+        "throughput_per_s": len(arrivals) / elapsed if elapsed else 0.0,
+        "capture_to_coil": summarize([a - c for c, a in zip(captures, arrivals)]),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local Modbus / tag-server PLC simulator.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("--latency-ms", type=float, default=2.0, help="injected latency per request")
+        p.add_argument("--jitter-ms", type=float, default=0.5, help="uniform jitter around the latency")
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--modbus-port", type=int, default=DEFAULT_MODBUS_PORT)
+        p.add_argument("--tag-port", type=int, default=DEFAULT_TAG_PORT)
+    sub.choices["serve"].add_argument("--tag-prefix", action="append", default=None,
+                                      help="serve an extra station's tags, e.g. St2_ (repeatable)")
+    bench = sub.choices["bench"]
+    bench.add_argument("--events", type=int, default=100)
+    bench.add_argument("--inference-ms", type=float, default=0.0, help="simulated capture->decision time")
+    bench.add_argument("--interval-ms", type=float, default=20.0, help="pause between events")
+    bench.add_argument("--pulse-ms", type=float, default=0.0, help="Vision_NewData pulse length")
+    bench.add_argument("--sequential", action="store_true", help="disable batched multi-tag writes")
+    bench.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    def latency() -> LatencyModel:
+        return LatencyModel(args.latency_ms / 1e3, args.jitter_ms / 1e3, args.seed)
+
+    if args.command == "serve":
+        modbus = ModbusSimulator(port=args.modbus_port, latency=latency()).start()
+        tags = TagServer(port=args.tag_port, latency=latency(),
+                         tags=station_tags([""] + (args.tag_prefix or []))).start()
+        print(f"Modbus simulator on {modbus.host}:{modbus.port}, tag server on {tags.host}:{tags.port}")
+        print("Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            tags.stop()
+            modbus.stop()
+        return
+
+    results = [
+        bench_tags(
+            args.events, latency(), args.inference_ms / 1e3, args.interval_ms / 1e3,
+            args.pulse_ms / 1e3, not args.sequential,
+        ),
+        bench_modbus(args.events, latency(), args.inference_ms / 1e3, args.interval_ms / 1e3, port=args.modbus_port),
+    ]
+    for result in results:
+        key = "capture_to_tag" if result["sink"] == "tags" else "capture_to_coil"
+        stats = result[key]
+        print(
+            f"{result['sink']:<7} delivered={result['delivered']}/{result['events']} "
+            f"p50={stats.get('p50_ms', 0):.2f} ms p95={stats.get('p95_ms', 0):.2f} ms "
+            f"p99={stats.get('p99_ms', 0):.2f} ms throughput={result['throughput_per_s']:.1f}/s"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,38 +10,116 @@ Author: Akhilesh Dandavati
 
 from __future__ import annotations
 
+import asyncio
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-import cv2
-from pymodbus.client import ModbusTcpClient
-from ultralytics import YOLO
+from cascade import create_cascade
+from frame_sources import open_source
+from governor import LatencyGovernor, build_levels
+from inference_backend import InferenceBackend
+from inference_pool import create_model
+from metrics import MetricsRegistry, PipelineMetrics, StartupTimer, start_metrics
+from motion_gate import MotionGate
+from overlay import OverlayViewer
+from pipeline import BlockingSink, CameraStream, FrameResult, MultiCameraPipeline
+from plc_output import COALESCE_LATEST
+from roi import RegionOfInterest
+from tiling import TiledBackend
+
+if TYPE_CHECKING:
+    from pymodbus.client import ModbusTcpClient
 
 # ----------------------------- CONFIGURATION -----------------------------
 MODEL_PATH = "yolov8s.pt"        # YOLO model path
+INFERENCE_BACKEND = "ultralytics" # "ultralytics" (PyTorch) or "onnx" (ONNX Runtime CPU)
+INFERENCE_WORKERS = 0            # >0: run the detector in this many processes (shared-memory frame ring)
+CASCADE_FAST_MODEL = None        # e.g. "yolov8n.pt": run every frame, escalate to MODEL_PATH when unsure
+CASCADE_BAND_LOW = 0.3           # Fast-model boxes in [CASCADE_BAND_LOW, CONF_THRESHOLD) escalate
 CAMERA_INDEX = 0                 # Camera index (0 for default webcam)
+REPLAY_SOURCE = None             # Video file, image folder or .raw dump to replay instead of the camera
+REPLAY_REALTIME = True           # False: replay every frame as fast as possible (benchmarks)
 CONF_THRESHOLD = 0.6             # Minimum detection confidence
+TILED = False                    # Detect on overlapping native-resolution tiles (small objects, 1080p+)
+TILE_SIZE = 640                  # Tile edge in pixels (match the model's input size)
+TILE_OVERLAP = 0.2               # Fraction of a tile shared with its neighbour
+LATENCY_BUDGET_MS = None         # e.g. 50: capture-to-PLC budget the governor keeps by lowering quality
+GOVERNOR_FAST_MODEL = "yolov8n.pt" # Cheaper weights the governor may fall back to (None: MODEL_PATH only)
+GOVERNOR_IMGSZ = (640, 480, 320) # Input sizes the governor steps through, best first
+GOVERNOR_MAX_SKIP = 3            # Last resort: only run the detector on every Nth due frame
+WARMUP_RUNS = 2                  # Dummy inferences before the camera opens (0 to skip)
 PLC_IP = "127.0.0.7"             # PLC IP address
 PLC_PORT = 502                   # Modbus TCP port (default: 502)
 PLC_COIL_ADDRESS = 1             # Coil/register address for writing detection state
+CAMERAS = None                   # Several stations, one model: [{"source": 0, "coil": 1}, {"source": 1, "coil": 2}]
+ROI = None                       # Conveyor region only: [x, y, w, h] or polygon [[x, y], ...] (per camera: "roi")
+ROI_MASK = True                  # Grey out polygon corners outside the ROI before inference
 SEND_TO_PLC = True               # Enable/disable PLC communication
+HEADLESS = False                 # Skip all drawing and the preview window (stop with Ctrl+C)
+MOTION_GATE = True               # Only run YOLO when the scene changes
+MOTION_THRESHOLD = 0.01          # Fraction of changed pixels that counts as a scene change
+MOTION_RECHECK_S = 2.0           # Force a detector run at least this often
+VIEWER_FPS = 15                  # Display rate cap for the preview window
+METRICS_PORT = 9108              # Prometheus text endpoint on 127.0.0.1 (None to disable)
+METRICS_FILE = None              # Also dump the metrics as JSON to this file
+METRICS_DUMP_S = 10.0            # Seconds between metrics file dumps
 # -------------------------------------------------------------------------
 
 
-def initialize_model() -> YOLO:
-    """Load the YOLO model in CPU mode."""
-    print("Loading YOLO model on CPU...")
-    model = YOLO(MODEL_PATH)
+def camera_configs() -> List[Dict[str, Any]]:
+    """Stations to run: ``CAMERAS``, or the single configured camera and coil."""
+    if CAMERAS:
+        return [{"name": f"cam{i}", **camera} for i, camera in enumerate(CAMERAS)]
+    source = CAMERA_INDEX if REPLAY_SOURCE is None else REPLAY_SOURCE
+    return [{"name": "cam0", "source": source, "coil": PLC_COIL_ADDRESS, "roi": ROI}]
+
+
+def load_detector(weights: str, batch: int = 1, imgsz: Optional[int] = None) -> InferenceBackend:
+    """One detector for ``weights`` with the configured backend, workers and tiling."""
+    # The ONNX graph has a static batch size, so export it for all cameras at once
+    # (or with a dynamic batch for tiles); pool workers take one frame each instead
+    options = {} if imgsz is None else {"imgsz": imgsz}
+    if INFERENCE_BACKEND == "onnx" and not INFERENCE_WORKERS:
+        options["batch"] = 0 if TILED else batch
+    model = create_model(INFERENCE_BACKEND, weights, workers=INFERENCE_WORKERS,
+                         conf=CONF_THRESHOLD, device="cpu", **options)
+    if TILED:
+        model = TiledBackend(model, TILE_SIZE, TILE_OVERLAP)
+    return model
+
+
+def initialize_model(batch: int = 1) -> InferenceBackend:
+    """Load the YOLO model in CPU mode; ``batch`` is the number of cameras sharing it."""
+    print(f"Loading YOLO model on CPU ({INFERENCE_BACKEND} backend)...")
+    if CASCADE_FAST_MODEL:
+        if batch > 1 or INFERENCE_WORKERS or TILED or LATENCY_BUDGET_MS:
+            raise ValueError("CASCADE_FAST_MODEL only supports a single camera without INFERENCE_WORKERS, "
+                             "TILED or LATENCY_BUDGET_MS")
+        model = create_cascade(
+            INFERENCE_BACKEND, CASCADE_FAST_MODEL, MODEL_PATH,
+            conf=CONF_THRESHOLD, band_low=CASCADE_BAND_LOW, device="cpu",
+        )
+    elif LATENCY_BUDGET_MS:
+        if INFERENCE_WORKERS:
+            raise ValueError("LATENCY_BUDGET_MS cannot be combined with INFERENCE_WORKERS")
+        # Every level is loaded now so a switch never stalls the line
+        weights = [MODEL_PATH] + ([GOVERNOR_FAST_MODEL] if GOVERNOR_FAST_MODEL else [])
+        levels = build_levels(weights, GOVERNOR_IMGSZ, GOVERNOR_MAX_SKIP)
+        model = LatencyGovernor(lambda w, imgsz: load_detector(w, batch, imgsz), levels, LATENCY_BUDGET_MS / 1000)
+        print(f"Latency governor: {LATENCY_BUDGET_MS} ms budget over {len(levels)} levels, starting at {model.level}")
+    else:
+        model = load_detector(MODEL_PATH, batch)
     print(f"Model loaded successfully (CPU mode): {MODEL_PATH}")
     return model
 
 
-def initialize_camera() -> cv2.VideoCapture:
-    """Initialize the camera feed."""
-    cap = cv2.VideoCapture(CAMERA_INDEX)
+def initialize_camera(source):
+    """Open the camera (or replay source); live feeds run behind a latest-frame reader."""
+    cap = open_source(source, realtime=REPLAY_REALTIME)
     if not cap.isOpened():
-        raise RuntimeError("Camera not found or could not be opened.")
-    print("Camera initialized successfully.")
+        raise RuntimeError(f"Camera {source!r} not found or could not be opened.")
+    print(f"Camera {source!r} initialized successfully.")
     return cap
 
 
@@ -50,6 +128,8 @@ def initialize_plc() -> Optional[ModbusTcpClient]:
     if not SEND_TO_PLC:
         return None
 
+    from pymodbus.client import ModbusTcpClient
+
     plc = ModbusTcpClient(PLC_IP, port=PLC_PORT)
     if plc.connect():
         print(f"Connected to PLC at {PLC_IP}:{PLC_PORT}")
@@ -58,76 +138,134 @@ def initialize_plc() -> Optional[ModbusTcpClient]:
     raise ConnectionError(msg)
 
 
-def update_plc(plc: ModbusTcpClient, state: bool) -> None:
-    """Write the presence state to the configured Modbus coil."""
+def update_plc(
+    plc: ModbusTcpClient,
+    state: bool,
+    metrics: Optional[PipelineMetrics] = None,
+    address: int = PLC_COIL_ADDRESS,
+) -> None:
+    """Write the presence state to the station's Modbus coil."""
     if not SEND_TO_PLC or plc is None:
         return
 
+    start = time.perf_counter()
+    ok = False
     try:
-        plc.write_coil(PLC_COIL_ADDRESS, state)
-        print(f"PLC updated: Coil {PLC_COIL_ADDRESS} -> {int(state)}")
+        response = plc.write_coil(address, state)
+        ok = not response.isError()
+        if ok:
+            print(f"PLC updated: Coil {address} -> {int(state)}")
+        else:
+            print(f"PLC write error: {response}")
     except Exception as exc:  # pragma: no cover - depends on hardware
         print(f"PLC write error: {exc}")
+    if metrics:
+        metrics.record_plc_write(time.perf_counter() - start, ok)
+
+
+def build_station(camera: Dict[str, Any], cap, plc, metrics: PipelineMetrics, plc_thread, multi: bool):
+    """Wire one camera to its presence state, motion gate, coil and viewer; returns ``(stream, gate)``."""
+    name, coil = camera["name"], camera.get("coil", PLC_COIL_ADDRESS)
+    prefix = f"[{name}] " if multi else ""
+    last_state: Optional[bool] = None  # Track last detection state to prevent redundant writes
+    gate = MotionGate(MOTION_THRESHOLD, max_interval_s=MOTION_RECHECK_S) if MOTION_GATE else None
+
+    def presence_changes(result: FrameResult) -> None:
+        """Queue the new state for the PLC only if the detection state changes."""
+        nonlocal last_state
+        object_detected = len(result.detections) > 0
+        if object_detected != last_state:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            state_text = "Object detected" if object_detected else "No object detected"
+            print(f"{prefix}[{timestamp}] {state_text}")
+            result.events.append(object_detected)
+            last_state = object_detected
+
+    # Only the latest state matters, so a slow PLC coalesces pending transitions
+    plc_sink = BlockingSink(lambda result: update_plc(plc, result.events[-1], metrics, coil),
+                            f"modbus-{name}" if multi else "modbus", policy=COALESCE_LATEST, when=lambda result: bool(result.events), executor=plc_thread)
+    window = "Vision-Based Presence Detection" + (f" ({name})" if multi else "")
+    roi = RegionOfInterest.parse(camera.get("roi"), ROI_MASK)
+    stream = CameraStream(
+        cap, [plc_sink] if plc else [],
+        process=presence_changes,
+        # Perform object detection (CPU-only) unless the scene is unchanged. The gate only
+        # takes a new reference once the frame was really sent (the governor may drop it).
+        should_infer=(lambda frame, seq: gate.check(frame)) if gate else None,
+        on_infer=(lambda frame, seq: gate.commit()) if gate else None,
+        viewer=None if HEADLESS else OverlayViewer(window, max_fps=VIEWER_FPS, roi=roi),
+        metrics=metrics, name=name, roi=roi,
+    )
+    return stream, gate
 
 
 def main() -> None:
-    """Main execution loop."""
-    model = initialize_model()
-    cap = initialize_camera()
+    """Configure and run the presence pipeline (one stream per station)."""
+    startup = StartupTimer.since_launch()
+    startup.mark("import")
+    cameras = camera_configs()
+    multi = len(cameras) > 1
+    model = initialize_model(len(cameras))
+    startup.mark("load")
+    if WARMUP_RUNS:
+        # Lazy imports and first-call allocations happen here, not on the first item of the line
+        model.warmup(WARMUP_RUNS)
+        startup.mark("warm-up")
+    caps = [initialize_camera(camera["source"]) for camera in cameras]
 
     try:
         plc = initialize_plc()
     except Exception as exc:  # pragma: no cover - depends on hardware
         print(f"PLC connection error: {exc}")
         plc = None
+    # The Modbus client is not thread-safe: every station writes through one thread
+    plc_thread = ThreadPoolExecutor(1, thread_name_prefix="modbus")
 
-    print("\nSystem ready. Press 'Q' to terminate.\n")
-    last_state: Optional[bool] = None  # Track last detection state to prevent redundant writes
+    registry = MetricsRegistry()
+    streams, gates = [], []
+    for camera, cap in zip(cameras, caps):
+        metrics = PipelineMetrics(registry, {"camera": camera["name"]} if multi else None)
+        metrics.watch_capture(cap)
+        stream, gate = build_station(camera, cap, plc, metrics, plc_thread, multi)
+        streams.append(stream)
+        gates.append(gate)
+    exporters = start_metrics(streams[0].metrics, METRICS_PORT, METRICS_FILE, METRICS_DUMP_S)
+    startup.mark("camera + PLC")
+    startup.export(registry)
+    print(startup.report())
+
+    print("\nSystem ready. Press 'Q' (or Ctrl+C) to terminate.\n")
+    governor = model if LATENCY_BUDGET_MS else None
+    if governor:
+        registry.collect("vision_governor_level", lambda: governor.index,
+                         "Latency governor level (0 = full quality)")
+    pipeline = MultiCameraPipeline(model, streams, governor=governor)
 
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Camera frame could not be read; exiting loop.")
-                break
-
-            # Perform object detection (CPU-only)
-            results = model(frame, conf=CONF_THRESHOLD, verbose=False, device="cpu")
-            object_detected = any(len(r.boxes) > 0 for r in results)
-
-            # Update PLC only if the detection state changes
-            if object_detected != last_state:
-                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                state_text = "Object detected" if object_detected else "No object detected"
-                print(f"[{timestamp}] {state_text}")
-                update_plc(plc, object_detected)
-                last_state = object_detected
-
-            # Display video with bounding boxes
-            for r in results:
-                for box in r.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf[0])
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(
-                        frame,
-                        f"{conf:.2f}",
-                        (x1, max(20, y1 - 10)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.6,
-                        (255, 255, 255),
-                        2,
-                    )
-
-            cv2.imshow("Vision-Based Presence Detection", frame)
-            if cv2.waitKey(1) & 0xFF in [ord("q"), ord("Q")]:
-                print("'Q' pressed; exiting loop.")
-                break
+        asyncio.run(pipeline.run())
+        if pipeline.stop_reason == "quit key":
+            print("'Q' pressed; exiting loop.")
+        elif pipeline.stop_reason == "end of stream":
+            print("Camera frame could not be read; exiting loop.")
+    except KeyboardInterrupt:
+        print("Interrupted; exiting loop.")
     finally:
         # Cleanup
-        cap.release()
-        cv2.destroyAllWindows()
+        for stream, gate in zip(streams, gates):
+            stream.source.release()
+            if stream.viewer:
+                stream.viewer.close()
+            print(f"Capture stats ({stream.name}): {stream.source.stats()}")
+            if gate:
+                print(f"Motion gate stats ({stream.name}): {gate.stats()}")
+        print(f"Pipeline stats: {pipeline.stats()}")
+        if CASCADE_FAST_MODEL or INFERENCE_WORKERS or TILED or LATENCY_BUDGET_MS:
+            print(f"{model.name.capitalize()} stats: {model.stats()}")
+        model.close()
+        for exporter in exporters:
+            exporter.close()
 
+        plc_thread.shutdown(wait=True)
         if plc:
             plc.close()
             print("PLC connection closed.")
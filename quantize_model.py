@@ -0,0 +1,332 @@
+"""INT8 post-training quantization for the detection weights.
+
+Exports the YOLOv8 weights to ONNX (reusing the backend cache), calibrates a
+static INT8 model on frames captured from the cell, and compares FP32 and INT8
+side by side on a held-out set: mAP@0.5, mAP@0.5:0.95, per-class recall at the
+operating confidence for the items in ``item_data.json``, and per-frame
+latency. The resulting ``*-int8.onnx`` file can be used directly as
+``MODEL_PATH`` with ``INFERENCE_BACKEND = "onnx"``.
+
+Held-out data uses the usual YOLO layout: ``<dir>/images/*.jpg`` with matching
+``<dir>/labels/*.txt`` files of ``class cx cy w h`` (normalized) rows.
+
+Usage:
+    python quantize_model.py --weights yolov8s.pt --calib-dir calib_frames \\
+        --eval-dir holdout --report quant_report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from inference_backend import DEFAULT_CACHE_DIR, OnnxBackend, export_onnx, preprocess
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+EVAL_CONF = 0.001      # mAP is computed over the full precision/recall curve
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+# ------------------------------------------------------------- calibration
+def list_images(directory: str) -> List[str]:
+    """Sorted image paths directly inside ``directory``."""
+    paths = [p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(paths)
+
+
+def _calibration_reader(paths: Sequence[str], input_name: str, imgsz: int):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class FrameCalibrationReader(CalibrationDataReader):
+        """Feed letterboxed calibration frames to the ORT calibrator."""
+
+        def __init__(self) -> None:
+            self._paths: Iterator[str] = iter(paths)
+
+        def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: preprocess(image, imgsz)[0]}
+            return None
+
+    return FrameCalibrationReader()
+
+
+def head_node_names(model_path: str) -> List[str]:
+    """Nodes of the detection head (highest ``/model.N/`` block).
+
+    The head concatenates box coordinates (0..640) and class scores (0..1);
+    quantizing that with one scale destroys the scores, so it stays FP32.
+    """
+    import onnx
+
+    graph = onnx.load(model_path).graph
+    pattern = re.compile(r"^/model\.(\d+)/")
+    blocks = [(int(m.group(1)), node.name) for node in graph.node if (m := pattern.match(node.name))]
+    if not blocks:
+        return []
+    last = max(block for block, _ in blocks)
+    return [name for block, name in blocks if block == last]
+
+
+def quantize(
+    weights: str,
+    calib_dir: str,
+    imgsz: int = 640,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    max_calib: int = 200,
+    keep_head_fp32: bool = True,
+) -> Tuple[str, str]:
+    """Produce an INT8 ONNX model; returns ``(fp32_path, int8_path)``."""
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    fp32_path = weights if weights.endswith(".onnx") else export_onnx(weights, imgsz, cache_dir)
+    base = os.path.splitext(fp32_path)[0]
+    prep_path = f"{base}-prep.onnx"
+    int8_path = f"{base}-int8.onnx"
+
+    calib_paths = list_images(calib_dir)[:max_calib]
+    if not calib_paths:
+        raise FileNotFoundError(f"No calibration images found in {calib_dir}")
+    print(f"Calibrating on {len(calib_paths)} frames from {calib_dir}...")
+
+    quant_pre_process(fp32_path, prep_path, skip_symbolic_shape=True)
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(prep_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(
+        prep_path,
+        int8_path,
+        _calibration_reader(calib_paths, input_name, imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=head_node_names(prep_path) if keep_head_fp32 else [],
+    )
+    _copy_metadata(fp32_path, int8_path)
+    os.remove(prep_path)
+    print(f"INT8 model written to {int8_path}")
+    return fp32_path, int8_path
+
+
+def _copy_metadata(src: str, dst: str) -> None:
+    """Carry the Ultralytics metadata (class names, imgsz) over to the INT8 graph."""
+    import onnx
+
+    source = onnx.load(src)
+    target = onnx.load(dst)
+    existing = {p.key for p in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(target, dst)
+
+
+# -------------------------------------------------------------- evaluation
+def load_labels(label_path: str, shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Read a YOLO label file into pixel ``xyxy`` boxes and class ids."""
+    h, w = shape
+    if not os.path.exists(label_path):
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+    rows = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+    cls = rows[:, 0].astype(np.int64)
+    cx, cy, bw, bh = rows[:, 1] * w, rows[:, 2] * h, rows[:, 3] * w, rows[:, 4] * h
+    boxes = np.stack((cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2), axis=1)
+    return boxes, cls
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between ``(N, 4)`` and ``(M, 4)`` xyxy boxes."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (rb - lt).clip(0).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_predictions(
+    pred_boxes: np.ndarray, pred_cls: np.ndarray, gt_boxes: np.ndarray, gt_cls: np.ndarray
+) -> np.ndarray:
+    """Return a ``(N, 10)`` true-positive matrix over the COCO IoU thresholds."""
+    correct = np.zeros((len(pred_boxes), len(IOU_THRESHOLDS)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return correct
+    iou = box_iou(gt_boxes, pred_boxes) * (gt_cls[:, None] == pred_cls[None, :])
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        gt_idx, pred_idx = np.nonzero(iou >= threshold)
+        if not len(gt_idx):
+            continue
+        order = iou[gt_idx, pred_idx].argsort()[::-1]
+        gt_idx, pred_idx = gt_idx[order], pred_idx[order]
+        _, first = np.unique(pred_idx, return_index=True)
+        gt_idx, pred_idx = gt_idx[first], pred_idx[first]
+        _, first = np.unique(gt_idx, return_index=True)
+        correct[pred_idx[first], t] = True
+    return correct
+
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """101-point interpolated AP (COCO style)."""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    return float(_trapezoid(np.interp(x, mrec, mpre), x))
+
+
+def evaluate(
+    backend: OnnxBackend,
+    eval_dir: str,
+    class_ids: Optional[Sequence[int]] = None,
+    operating_conf: float = 0.6,
+    warmup: int = 3,
+) -> Dict[str, object]:
+    """Run ``backend`` over a held-out set and compute mAP, recall and latency."""
+    image_paths = list_images(os.path.join(eval_dir, "images")) or list_images(eval_dir)
+    label_dir = os.path.join(eval_dir, "labels")
+    if not image_paths:
+        raise FileNotFoundError(f"No evaluation images found in {eval_dir}")
+
+    first = cv2.imread(image_paths[0])
+    for _ in range(warmup if first is not None else 0):
+        backend(first)  # keep allocator / thread-pool start-up out of the latency numbers
+
+    tps, confs, pred_classes, gt_classes, latencies = [], [], [], [], []
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        start = time.perf_counter()
+        det = backend(image)
+        latencies.append(time.perf_counter() - start)
+
+        stem = os.path.splitext(os.path.basename(path))[0]
+        gt_boxes, gt_cls = load_labels(os.path.join(label_dir, f"{stem}.txt"), image.shape[:2])
+        tps.append(match_predictions(det.xyxy, det.cls, gt_boxes, gt_cls))
+        confs.append(det.conf)
+        pred_classes.append(det.cls)
+        gt_classes.append(gt_cls)
+
+    tp = np.concatenate(tps) if tps else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+    conf = np.concatenate(confs) if confs else np.zeros((0,))
+    pred_cls = np.concatenate(pred_classes) if pred_classes else np.zeros((0,), dtype=np.int64)
+    gt_cls = np.concatenate(gt_classes) if gt_classes else np.zeros((0,), dtype=np.int64)
+
+    order = conf.argsort()[::-1]
+    tp, conf, pred_cls = tp[order], conf[order], pred_cls[order]
+
+    classes = np.unique(gt_cls) if class_ids is None else np.asarray(sorted(class_ids))
+    per_class: Dict[str, Dict[str, float]] = {}
+    ap50, ap5095 = [], []
+    for c in classes:
+        n_gt = int((gt_cls == c).sum())
+        if n_gt == 0:
+            continue
+        mask = pred_cls == c
+        tpc = tp[mask].cumsum(axis=0)
+        fpc = (~tp[mask]).cumsum(axis=0)
+        recall = tpc / n_gt
+        precision = tpc / np.maximum(tpc + fpc, 1)
+        aps = [average_precision(recall[:, t], precision[:, t]) for t in range(len(IOU_THRESHOLDS))]
+        at_op = tp[mask & (conf >= operating_conf), 0].sum()
+        name = backend.names.get(int(c), str(int(c)))
+        per_class[name] = {
+            "instances": n_gt,
+            "ap50": aps[0],
+            "ap50_95": float(np.mean(aps)),
+            "recall_at_conf": float(at_op / n_gt),
+        }
+        ap50.append(aps[0])
+        ap5095.append(float(np.mean(aps)))
+
+    lat = np.asarray(latencies) * 1e3 if latencies else np.zeros((1,))
+    return {
+        "model": backend.model_path,
+        "images": len(image_paths),
+        "map50": float(np.mean(ap50)) if ap50 else 0.0,
+        "map50_95": float(np.mean(ap5095)) if ap5095 else 0.0,
+        "latency_ms": {
+            "mean": float(lat.mean()),
+            "p50": float(np.percentile(lat, 50)),
+            "p95": float(np.percentile(lat, 95)),
+        },
+        "per_class": per_class,
+    }
+
+
+def item_class_ids(item_data_file: str, names: Dict[int, str]) -> List[int]:
+    """Model class ids for the labels listed in ``item_data.json``."""
+    with open(item_data_file, "r") as f:
+        items = json.load(f)
+    lookup = {name: idx for idx, name in names.items()}
+    missing = [label for label in items if label not in lookup]
+    if missing:
+        print(f"Warning: labels not produced by the model: {missing}")
+    return [lookup[label] for label in items if label in lookup]
+
+
+def print_report(report: Dict[str, Dict[str, object]]) -> None:
+    """Side-by-side FP32 / INT8 summary on the console."""
+    fp32, int8 = report["fp32"], report["int8"]
+    print(f"\n{'metric':<22}{'FP32':>12}{'INT8':>12}")
+    print(f"{'mAP@0.5':<22}{fp32['map50']:>12.4f}{int8['map50']:>12.4f}")
+    print(f"{'mAP@0.5:0.95':<22}{fp32['map50_95']:>12.4f}{int8['map50_95']:>12.4f}")
+    for key in ("mean", "p50", "p95"):
+        label = f"latency {key} (ms)"
+        print(f"{label:<22}{fp32['latency_ms'][key]:>12.2f}{int8['latency_ms'][key]:>12.2f}")
+    for name, stats in fp32["per_class"].items():
+        other = int8["per_class"].get(name, {})
+        label = f"recall {name}"
+        print(f"{label:<22}{stats['recall_at_conf']:>12.3f}{other.get('recall_at_conf', 0.0):>12.3f}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization with an FP32 comparison report.")
+    parser.add_argument("--weights", default="yolov8s.pt", help=".pt weights or an exported .onnx graph")
+    parser.add_argument("--calib-dir", required=True, help="folder of calibration frames captured from the cell")
+    parser.add_argument("--eval-dir", help="held-out set (images/ + labels/) for the accuracy report")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-calib", type=int, default=200, help="maximum number of calibration frames")
+    parser.add_argument("--quantize-head", action="store_true", help="also quantize the detection head")
+    parser.add_argument("--item-data", default="item_data.json", help="restrict the report to these labels")
+    parser.add_argument("--conf", type=float, default=0.6, help="operating confidence for the recall column")
+    parser.add_argument("--report", default="quant_report.json", help="where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    fp32_path, int8_path = quantize(
+        args.weights, args.calib_dir, args.imgsz, args.cache_dir, args.max_calib, not args.quantize_head
+    )
+    if not args.eval_dir:
+        return
+
+    report = {}
+    for key, path in (("fp32", fp32_path), ("int8", int8_path)):
+        backend = OnnxBackend(path, conf=EVAL_CONF, imgsz=args.imgsz)
+        class_ids = item_class_ids(args.item_data, backend.names) if os.path.exists(args.item_data) else None
+        report[key] = evaluate(backend, args.eval_dir, class_ids, args.conf)
+
+    print_report(report)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
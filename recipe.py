@@ -0,0 +1,106 @@
+"""Recipe compiler: ``item_data.json`` + model class names -> lookup arrays.
+
+The PLC needs an item index and a grip pressure for every detection. Instead of
+resolving label strings per box (``list.index`` / ``dict.get`` / membership
+scans), :func:`compile_recipe` builds dense NumPy tables indexed by model class
+id once at startup, and :meth:`Recipe.resolve` turns a frame's class ids into
+indices and pressures with a single gather.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_PRESSURE = 50.0  # kPa for labels without an entry in item_data.json
+
+
+def load_item_data(path: str) -> Dict[str, float]:
+    """Load and validate an ``{label: pressure_kPa}`` recipe file.
+
+    Key order is significant: it defines the 1-based ``Vision_Item_Index``.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a JSON object mapping label -> pressure")
+    for label, pressure in data.items():
+        if isinstance(pressure, bool) or not isinstance(pressure, (int, float)):
+            raise ValueError(f"{path}: pressure for {label!r} must be a number, got {pressure!r}")
+        if pressure <= 0:
+            raise ValueError(f"{path}: pressure for {label!r} must be positive, got {pressure}")
+    return data
+
+
+def load_dataset_names(path: str) -> List[str]:
+    """Class names from a YOLO dataset YAML (``names:`` as a list or an ``{id: name}`` mapping)."""
+    import yaml  # only the scripts and the CLI read dataset files
+
+    with open(path, "r") as f:
+        data = yaml.safe_load(f) or {}
+    names = data.get("names", [])
+    if isinstance(names, dict):  # Ultralytics-style {id: name} mapping
+        names = [names[key] for key in sorted(names)]
+    return list(names)
+
+
+@dataclass(frozen=True)
+class Recipe:
+    """Per-class lookup tables; every array has one entry per model class id."""
+
+    names: Dict[int, str]
+    item_names: List[str]      # recipe order, index 0 -> Vision_Item_Index 1
+    allowed: np.ndarray        # bool, class may be reported at all
+    item_index: np.ndarray     # int32, 1-based PLC item index, 0 = not in recipe
+    pressure: np.ndarray       # float32, grip pressure in kPa
+
+    @property
+    def class_ids(self) -> np.ndarray:
+        """Ids of the allowed classes."""
+        return np.flatnonzero(self.allowed)
+
+    @property
+    def unknown_items(self) -> List[str]:
+        """Recipe labels the model cannot produce (usually a typo)."""
+        known = set(self.names.values())
+        return [label for label in self.item_names if label not in known]
+
+    def resolve(self, cls: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Gather ``(allowed, item_index, pressure)`` for an array of class ids."""
+        return self.allowed[cls], self.item_index[cls], self.pressure[cls]
+
+
+def compile_recipe(
+    item_data: Dict[str, float],
+    names: Dict[int, str],
+    allowed_labels: Optional[Iterable[str]] = None,
+    default_pressure: float = DEFAULT_PRESSURE,
+) -> Recipe:
+    """Build the lookup tables for a model's ``names``.
+
+    ``allowed_labels`` limits which classes may be reported (``None`` allows
+    every class the model knows).
+    """
+    num_classes = max(names) + 1 if names else 0
+    lookup = {name: idx for idx, name in names.items()}
+
+    allowed = np.zeros(num_classes, dtype=bool)
+    if allowed_labels is None:
+        allowed[list(names)] = True
+    else:
+        allowed[[lookup[label] for label in allowed_labels if label in lookup]] = True
+
+    item_index = np.zeros(num_classes, dtype=np.int32)
+    pressure = np.full(num_classes, default_pressure, dtype=np.float32)
+    item_names = list(item_data)
+    for position, label in enumerate(item_names, start=1):
+        cls = lookup.get(label)
+        if cls is None:
+            continue
+        item_index[cls] = position
+        pressure[cls] = item_data[label]
+
+    return Recipe(dict(names), item_names, allowed, item_index, pressure)
@@ -0,0 +1,116 @@
+"""Per-camera regions of interest applied before inference.
+
+The cameras see the whole cell, but only the conveyor strip matters. A
+:class:`RegionOfInterest` crops each frame to the region's bounding box before
+letterboxing. This has two effects:
+
+* The detector works on fewer pixels. At the same ``imgsz``, a narrow strip
+  is also upscaled less, so small items keep more detail.
+* People walking past outside the lane never reach the model.
+
+A region is a rectangle ``[x, y, w, h]`` or a polygon ``[[x, y], ...]`` in
+full-frame pixels. For polygons, ``mask=True`` paints everything outside the
+polygon with the letterbox grey, so the model does not see the rest of the
+bounding box either. Detections whose centre falls outside the polygon are
+dropped in both modes. :meth:`RegionOfInterest.to_frame` shifts the surviving
+boxes back to full-frame coordinates, so the overlay, the PLC logic and the UDP
+``cx`` / ``cy`` are unchanged.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+from detections import Detections
+from inference_backend import LETTERBOX_COLOR
+
+OUTLINE_COLOR = (255, 128, 0)
+
+
+class RegionOfInterest:
+    """Rectangle or polygon of the frame that the detector looks at."""
+
+    def __init__(self, polygon: Any, mask: bool = True) -> None:
+        self.polygon = np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError("A region needs at least three polygon points")
+        self.mask = mask
+        xs, ys = self.polygon[:, 0], self.polygon[:, 1]
+        self.is_rectangle = len(self.polygon) == 4 and len(set(xs.tolist())) == 2 and len(set(ys.tolist())) == 2
+
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._bounds = (0, 0, 0, 0)               # x1, y1, x2, y2 clipped to the frame
+        self._inside: Optional[np.ndarray] = None  # (h, w) bool in crop coordinates
+
+    @classmethod
+    def rectangle(cls, x: int, y: int, w: int, h: int) -> "RegionOfInterest":
+        return cls([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+
+    @classmethod
+    def parse(cls, spec: Optional[Sequence], mask: bool = True) -> Optional["RegionOfInterest"]:
+        """Build a region from config: ``None``, ``[x, y, w, h]`` or ``[[x, y], ...]``."""
+        if spec is None:
+            return None
+        if len(spec) == 4 and all(isinstance(v, (int, float)) for v in spec):
+            region = cls.rectangle(*(int(v) for v in spec))
+            region.mask = mask
+            return region
+        if all(isinstance(point, (list, tuple)) and len(point) == 2 for point in spec):
+            return cls(spec, mask)
+        raise ValueError(f"ROI must be [x, y, w, h] or a list of [x, y] points, got {spec!r}")
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        """Top-left corner of the crop in the last frame size seen."""
+        return self._bounds[0], self._bounds[1]
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """The part of ``frame`` the detector should see.
+
+        Rectangles are a view without a copy; masked polygons are a copy.
+        """
+        if frame.shape != self._shape:
+            self._prepare(frame.shape)
+        x1, y1, x2, y2 = self._bounds
+        view = frame[y1:y2, x1:x2]
+        if self.mask and not self.is_rectangle:
+            view = view.copy()
+            view[~self._inside] = LETTERBOX_COLOR[: view.shape[2]] if view.ndim == 3 else LETTERBOX_COLOR[0]
+        return view
+
+    def to_frame(self, detections: Detections) -> Detections:
+        """Map crop-relative ``detections`` back to the full frame, dropping boxes centred outside."""
+        if not len(detections):
+            return detections
+        if not self.is_rectangle:
+            h, w = self._inside.shape
+            centres = detections.centroids.astype(np.int64)
+            cx = np.clip(centres[:, 0], 0, w - 1)
+            cy = np.clip(centres[:, 1], 0, h - 1)
+            detections = detections[self._inside[cy, cx]]
+        x1, y1 = self.offset
+        shift = np.array([x1, y1, x1, y1], dtype=np.float32)
+        return Detections(detections.xyxy + shift, detections.conf, detections.cls)
+
+    def draw(self, frame: np.ndarray) -> np.ndarray:
+        """Outline the region on ``frame`` in place."""
+        import cv2
+
+        cv2.polylines(frame, [self.polygon.reshape(-1, 1, 2)], True, OUTLINE_COLOR, 2)
+        return frame
+
+    def _prepare(self, shape: Tuple[int, ...]) -> None:
+        import cv2
+
+        height, width = shape[:2]
+        x1, y1 = np.maximum(self.polygon.min(axis=0), 0)
+        x2, y2 = np.minimum(self.polygon.max(axis=0), [width, height])
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"ROI {self.polygon.tolist()} lies outside the {width}x{height} frame")
+        inside = np.zeros((y2 - y1, x2 - x1), np.uint8)
+        cv2.fillPoly(inside, [(self.polygon - [x1, y1]).astype(np.int32).reshape(-1, 1, 2)], 1)
+        self._bounds = (int(x1), int(y1), int(x2), int(y2))
+        self._inside = inside.astype(bool)
+        self._shape = shape
@@ -4,86 +4,129 @@ Author: Akhilesh Dandavati
 Description:
  - Uses YOLOv8 pre-trained model to detect objects via webcam
  - Displays bounding boxes and labels in real-time
- - Optional: Sends detection data (object name + coordinates) to robot over UDP
+ - Optional: Sends detection data (one packed datagram per frame, see udp_protocol.py) to robot over UDP
 """
 
 # ------------------- IMPORTS -------------------
-from ultralytics import YOLO
-import cv2
-import socket
-import json
+import asyncio
+
+from frame_sources import open_source
+from inference_pool import create_model
+from metrics import PipelineMetrics, StartupTimer, start_metrics
+from overlay import OverlayViewer
+from pipeline import BlockingSink, CameraStream, MultiCameraPipeline
+from roi import RegionOfInterest
+from udp_protocol import DetectionSender
 
 # ------------------- SETTINGS -------------------
-# Load pre-trained YOLOv8 model (general object detection)
-model = YOLO("yolov8n.pt")   # pre-trained on COCO dataset
+# Pre-trained YOLOv8 model (general object detection); loaded in main(), not at import time
+MODEL_PATH = "yolov8n.pt"           # pre-trained on COCO dataset
+INFERENCE_BACKEND = "ultralytics"   # "ultralytics" (PyTorch) or "onnx" (ONNX Runtime CPU)
+INFERENCE_WORKERS = 0               # >0: run YOLO in this many processes fed through shared memory
+WARMUP_RUNS = 2                     # dummy inferences before the camera opens (0 to skip)
 
 # Camera index: 0 = default webcam; change if needed
 CAMERA_INDEX = 0
+# Replay a video file, image folder or .raw dump instead; REPLAY_REALTIME=False runs every frame flat out
+REPLAY_SOURCE = None
+REPLAY_REALTIME = True
+
+# Only detect inside this region: [x, y, w, h] or polygon [[x, y], ...]; None = whole frame
+ROI = None
+ROI_MASK = True
+
+# Headless: no drawing and no window (stop with Ctrl+C); viewer redraw rate otherwise
+HEADLESS = False
+VIEWER_FPS = 15
+
+# Prometheus text endpoint on 127.0.0.1 (None to disable) and optional JSON dump file
+METRICS_PORT = 9108
+METRICS_FILE = None
+METRICS_DUMP_S = 10.0
 
 # Optional: Robot UDP setup (set to False if not using)
 SEND_TO_ROBOT = False
 ROBOT_IP = "192.168.1.10"   # Change to your robot or PC IP
 ROBOT_PORT = 5000
-
-# Initialize socket if sending data
-if SEND_TO_ROBOT:
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+ROBOT_PROTOCOL = "binary"   # "binary": one packed datagram per frame; "json": legacy datagram per box
+
+# ------------------- DETECTION STATION -------------------
+def build_station(cap, model, sender, metrics):
+    """Console output, optional UDP sink and viewer for the camera; returns its CameraStream."""
+    # Boxes come back in full-frame coordinates, so the UDP cx/cy need no correction
+    roi = RegionOfInterest.parse(ROI, ROI_MASK)
+    viewer = None if HEADLESS else OverlayViewer("YOLOv8 Food Detection", model.names,
+                                                 max_fps=VIEWER_FPS, show_centroids=True, roi=roi)
+
+    def print_detections(result):
+        # Centroids for every box are computed in one step inside rows()
+        for x1, y1, x2, y2, conf, cls, cx, cy in result.detections.rows():
+            label = model.names[cls]
+            print(f"Detected {label} at ({cx}, {cy}) | Confidence: {conf:.2f}")
+
+    # Optional: send every frame to the robot (empty frames too, so it can detect packet loss)
+    sinks = []
+    if sender:
+        sinks.append(BlockingSink(lambda result: sender.send(result.detections, result.frame.shape,
+                                                             result.captured_at), "udp"))
+    return CameraStream(cap, sinks, process=print_detections, viewer=viewer, metrics=metrics, roi=roi)
 
 # ------------------- MAIN PROGRAM -------------------
 def main():
+    startup = StartupTimer.since_launch()
+    startup.mark("import")
+    model = create_model(INFERENCE_BACKEND, MODEL_PATH, workers=INFERENCE_WORKERS)
+    startup.mark("load")
+
+    # Pay for lazy imports and first-call allocations before the camera opens
+    if WARMUP_RUNS:
+        model.warmup(WARMUP_RUNS)
+        startup.mark("warm-up")
+
     # Open camera
-    cap = cv2.VideoCapture(CAMERA_INDEX)
+    # Live / real-time sources grab on a background thread and keep the newest frame
+    cap = open_source(CAMERA_INDEX if REPLAY_SOURCE is None else REPLAY_SOURCE, realtime=REPLAY_REALTIME)
     if not cap.isOpened():
         print("❌ Camera not found or can't be opened.")
+        model.close()
         return
 
     print("✅ Camera started. Press 'q' to quit.\n")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
+    # Initialize socket if sending data
+    sender = DetectionSender(ROBOT_IP, ROBOT_PORT, model.names, ROBOT_PROTOCOL) if SEND_TO_ROBOT else None
+
+    metrics = PipelineMetrics()
+    metrics.watch_capture(cap)
+    exporters = start_metrics(metrics, METRICS_PORT, METRICS_FILE, METRICS_DUMP_S)
+    startup.mark("camera")
+    startup.export(metrics.registry)
+    print(startup.report())
+
+    # Capture and YOLO run in executors; boxes & centroids are drawn on the viewer thread; exit on 'q'
+    stream = build_station(cap, model, sender, metrics)
+    pipeline = MultiCameraPipeline(model, [stream])
+    try:
+        asyncio.run(pipeline.run())
+        if pipeline.stop_reason == "end of stream":
             print("❌ Failed to read frame.")
-            break
-
-        # Run YOLO detection
-        results = model(frame, verbose=False)
-
-        # Parse results
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                cls = int(box.cls[0])
-                label = model.names[cls]
-                conf = float(box.conf[0])
-                x1, y1, x2, y2 = box.xyxy[0]
-                cx, cy = int((x1 + x2) / 2), int((y1 + y2) / 2)
-
-                # Draw bounding box & info
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                cv2.putText(frame, f"{label} {conf:.2f}", (int(x1), int(y1) - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                cv2.circle(frame, (cx, cy), 4, (0, 0, 255), -1)
-
-                # Print results
-                print(f"Detected {label} at ({cx}, {cy}) | Confidence: {conf:.2f}")
-
-                # Optional: send data to robot
-                if SEND_TO_ROBOT:
-                    data = {"object": label, "confidence": conf, "cx": cx, "cy": cy}
-                    sock.sendto(json.dumps(data).encode(), (ROBOT_IP, ROBOT_PORT))
-
-        # Show camera window
-        cv2.imshow("YOLOv8 Food Detection", frame)
-
-        # Exit on 'q'
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    except KeyboardInterrupt:
+        print("Interrupted.")
 
     # Cleanup
     cap.release()
-    cv2.destroyAllWindows()
-    if SEND_TO_ROBOT:
-        sock.close()
+    if stream.viewer:
+        stream.viewer.close()
+    print(f"Capture stats: {cap.stats()}")
+    print(f"Pipeline stats: {pipeline.stats()}")
+    if sender:
+        print(f"UDP stats: {sender.stats()}")
+        sender.close()
+    if INFERENCE_WORKERS:
+        print(f"Pool stats: {model.stats()}")
+    model.close()
+    for exporter in exporters:
+        exporter.close()
     print("\n✅ Program ended successfully.")
 
 # ------------------- ENTRY POINT -------------------
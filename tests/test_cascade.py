@@ -0,0 +1,58 @@
+"""Cascade escalation: only focused, confident boxes count as new objects."""
+
+import numpy as np
+
+from cascade import CascadeBackend
+from detections import Detections
+from inference_backend import InferenceBackend
+
+NAMES = {0: "egg", 1: "tomato", 2: "hand"}
+
+
+class Scripted(InferenceBackend):
+    """Fake detector returning the next scripted ``(cls, conf)`` list per call."""
+
+    def __init__(self, script=()):
+        super().__init__()
+        self.names = dict(NAMES)
+        self.script = list(script)
+        self.calls = 0
+
+    def predict(self, frame):
+        self.calls += 1
+        boxes = self.script.pop(0) if self.script else []
+        xyxy = np.array([[10 * i, 0, 10 * i + 8, 8] for i in range(len(boxes))], np.float32).reshape(-1, 4)
+        conf = np.array([c for _, c in boxes], np.float32)
+        return Detections(xyxy, conf, np.array([k for k, _ in boxes], np.int64))
+
+
+def run(script, focus=None):
+    fast, accurate = Scripted(script), Scripted()
+    cascade = CascadeBackend(fast, accurate, conf=0.6, band_low=0.3)
+    cascade.set_focus(focus)
+    frame = np.zeros((8, 8, 3), np.uint8)
+    for _ in script:
+        cascade.predict(frame)
+    return cascade
+
+
+def test_new_confident_object_escalates_once():
+    cascade = run([[(0, 0.9)]] * 4)
+    assert cascade.escalations == {"uncertain": 0, "new_object": 1}
+
+
+def test_uncertain_box_escalates_as_uncertain_only():
+    cascade = run([[(0, 0.9)], [(0, 0.9), (0, 0.4)], [(0, 0.9)]])
+    assert cascade.escalations == {"uncertain": 1, "new_object": 1}
+
+
+def test_unfocused_boxes_never_escalate():
+    flicker = [[(2, 0.9)], [], [(2, 0.4)], [(2, 0.9), (2, 0.9)]] * 3
+    cascade = run(flicker, focus=["egg", "tomato"])
+    assert cascade.escalations == {"uncertain": 0, "new_object": 0}
+    assert cascade.accurate.calls == 0
+
+
+def test_flickering_low_confidence_box_is_not_a_new_object():
+    cascade = run([[(0, 0.9)], [(0, 0.9), (1, 0.35)], [(0, 0.9), (1, 0.35)]], focus=["egg"])
+    assert cascade.escalations["new_object"] == 1
@@ -0,0 +1,31 @@
+"""Importing a script or the CLI must not pull in OpenCV, PLC drivers or the model runtimes."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("cv2", "pylogix", "pymodbus", "yaml", "torch", "ultralytics", "onnxruntime")
+
+
+@pytest.mark.parametrize("module", ["cli", "food_detection", "presence_detection_modbus", "test1", "bench"])
+def test_import_stays_light(module):
+    probe = f"import sys, {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ""
+
+
+def test_default_dataset_skips_files_without_class_names(tmp_path, monkeypatch):
+    import cli
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "yolo.yml").write_text("name: yolo\ndependencies:\n  - python=3.11\n")
+    assert cli.default_dataset() is None
+
+    (tmp_path / "yolo.yml").write_text("names:\n  0: apple\n  1: egg\n")
+    assert cli.default_dataset() == "yolo.yml"
+
+    (tmp_path / "yolo.yaml").write_text("names: [tomato]\n")
+    assert cli.default_dataset() == "yolo.yaml"
@@ -0,0 +1,51 @@
+"""LatestFrameReader: stalls are waited for, but never block a shutdown."""
+
+import threading
+import time
+
+import numpy as np
+
+from frame_capture import LatestFrameReader
+
+
+class StallingCamera:
+    """Delivers ``frames`` frames, then blocks in read() until released."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.released = threading.Event()
+
+    def read(self):
+        if self.frames:
+            self.frames -= 1
+            return True, np.zeros((4, 4, 3), np.uint8)
+        self.released.wait()
+        return False, None
+
+    def release(self):
+        self.released.set()
+
+
+def test_stall_is_waited_for_and_stop_ends_the_read():
+    camera = StallingCamera(frames=1)
+    reader = LatestFrameReader(camera).start()
+    try:
+        assert reader.read(timeout=0.05)[0]
+        threading.Timer(0.3, reader.stop).start()
+        start = time.monotonic()
+        assert reader.read(timeout=0.05) == (False, None)
+        assert 0.25 < time.monotonic() - start < 2.0
+        assert reader.stats()["stalls"] >= 3
+        assert reader.ended
+    finally:
+        camera.release()
+        reader.release()
+
+
+def test_end_of_source_ends_the_stream():
+    camera = StallingCamera(frames=0)
+    camera.release()
+    reader = LatestFrameReader(camera).start()
+    assert reader.read(timeout=0.05) == (False, None)
+    assert reader.stats()["stalls"] == 0
+    reader.release()
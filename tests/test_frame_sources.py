@@ -0,0 +1,54 @@
+import numpy as np
+
+from frame_sources import ImageFolderSource, RawDumpSource, record_raw_dump
+
+
+class Frames:
+    def __init__(self, frames):
+        self._frames = list(frames)
+
+    def read(self):
+        if not self._frames:
+            return False, None
+        return True, self._frames.pop(0)
+
+
+def test_raw_dump_round_trip(tmp_path):
+    frames = [np.full((4, 6, 3), i, dtype=np.uint8) for i in range(3)]
+    path = str(tmp_path / "clip.raw")
+    assert record_raw_dump(Frames(frames), path) == 3
+
+    source = RawDumpSource(path, realtime=False)
+    assert len(source) == 3
+    for expected in frames:
+        ok, frame = source.read()
+        assert ok and np.array_equal(frame, expected)
+    assert source.read() == (False, None)
+
+
+def test_empty_raw_dump_is_exhausted(tmp_path):
+    path = str(tmp_path / "empty.raw")
+    assert record_raw_dump(Frames([]), path) == 0
+
+    source = RawDumpSource(path, realtime=False, loop=True)
+    assert not source.isOpened()
+    assert source.read() == (False, None)
+    source.release()
+
+
+def test_released_raw_dump_stops_reading(tmp_path):
+    path = str(tmp_path / "clip.raw")
+    record_raw_dump(Frames([np.zeros((2, 2, 3), dtype=np.uint8)] * 2), path)
+
+    source = RawDumpSource(path, realtime=False)
+    ok, frame = source.read()
+    source.release()
+    assert ok and frame.shape == (2, 2, 3)
+    assert source.read() == (False, None)
+    source.release()
+
+
+def test_image_folder_without_images(tmp_path):
+    source = ImageFolderSource(str(tmp_path), realtime=False)
+    assert not source.isOpened()
+    assert source.read() == (False, None)
@@ -0,0 +1,164 @@
+"""Shared-memory frame ring and slot reuse in the inference pool."""
+
+import os
+import time
+from multiprocessing import get_all_start_methods
+
+import numpy as np
+import pytest
+
+import inference_backend
+from detections import Detections
+from inference_backend import InferenceBackend
+from inference_pool import FrameRing, InferencePool
+
+
+class Echo(InferenceBackend):
+    """Fake detector reporting the frame's fill value as confidence and its size as the box."""
+
+    name = "echo"
+
+    def __init__(self, weights, **options) -> None:
+        super().__init__(**options)
+        self.names = {0: "item"}
+
+    def predict(self, frame):
+        if frame[0, 0, 0] == 255:
+            raise RuntimeError("bad frame")
+        h, w = frame.shape[:2]
+        box = np.array([[0, 0, w, h]], np.float32)
+        return Detections(box, np.array([frame[0, 0, 0] / 255], np.float32), np.zeros(1, np.int64))
+
+
+def frame(value, shape=(48, 64, 3)):
+    return np.full(shape, value, np.uint8)
+
+
+def test_ring_slots_are_independent_and_reusable():
+    ring = FrameRing(slots=2, slot_bytes=frame(0).nbytes)
+    try:
+        ring.write(0, frame(1))
+        ring.write(1, frame(2))
+        assert ring.view(0, frame(0).shape).max() == 1
+        assert ring.view(1, frame(0).shape).min() == 2
+        ring.write(0, frame(3))
+        assert (ring.view(0, frame(0).shape) == 3).all()
+        assert (ring.view(1, frame(0).shape) == 2).all()
+    finally:
+        ring.close()
+
+
+def test_attached_ring_sees_the_owner_writes():
+    ring = FrameRing(slots=2, slot_bytes=1024)
+    other = FrameRing(0, 1024, name=ring.name)
+    try:
+        assert not other.owner
+        ring.write(1, frame(7, (4, 4, 3)))
+        assert (other.view(1, (4, 4, 3)) == 7).all()
+    finally:
+        other.close()
+        ring.close()
+
+
+def test_ring_rejects_what_does_not_fit():
+    ring = FrameRing(slots=1, slot_bytes=16)
+    try:
+        with pytest.raises(ValueError, match="uint8"):
+            ring.write(0, np.zeros((2, 2), np.float32))
+        with pytest.raises(ValueError, match="does not fit"):
+            ring.write(0, np.zeros(17, np.uint8))
+    finally:
+        ring.close()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    if "fork" not in get_all_start_methods():
+        pytest.skip("the fake backend reaches the workers only through fork")
+    monkeypatch.setitem(inference_backend.BACKENDS, Echo.name, Echo)
+    pool = InferencePool(Echo.name, "unused.pt", workers=2, slots=2, threads=1, start_method="fork")
+    yield pool
+    pool.close()
+
+
+def test_pool_reuses_slots_without_mixing_frames(pool):
+    values = list(range(1, 13))
+    results = list(pool.imap(frame(v) for v in values))
+    confs = [round(float(r.conf[0]) * 255) for r in results]
+    assert confs == values
+    assert pool.stats()["completed"] == len(values)
+    assert pool._free.qsize() == pool.slots
+
+
+def test_pool_grows_the_ring_for_larger_frames(pool):
+    small, large = pool.predict(frame(10)), pool.predict(frame(20, (96, 128, 3)))
+    assert small.xyxy.tolist() == [[0, 0, 64, 48]]
+    assert large.xyxy.tolist() == [[0, 0, 128, 96]]
+    assert len(pool._retired) == 1
+
+
+def test_failed_frame_releases_its_slot(pool):
+    with pytest.raises(RuntimeError, match="bad frame"):
+        pool.predict(frame(255))
+    assert [round(float(r.conf[0]) * 255) for r in pool.predict_batch([frame(5), frame(6)])] == [5, 6]
+    assert pool.stats()["failed"] == 1
+
+
+class Crashes(Echo):
+    """Echo that kills its worker process on frames filled with 13."""
+
+    name = "crashes"
+    load_error = False  # set after the pool started: restarted workers fail to load
+
+    def __init__(self, weights, **options) -> None:
+        if self.load_error:
+            raise RuntimeError("model file gone")
+        super().__init__(weights, **options)
+
+    def predict(self, frame):
+        if frame[0, 0, 0] == 13:
+            os._exit(1)
+        return super().predict(frame)
+
+
+def test_dead_worker_fails_only_its_frames_and_is_restarted(monkeypatch):
+    if "fork" not in get_all_start_methods():
+        pytest.skip("the fake backend reaches the workers only through fork")
+    monkeypatch.setitem(inference_backend.BACKENDS, Crashes.name, Crashes)
+    pool = InferencePool(Crashes.name, "unused.pt", workers=2, slots=4, threads=1, start_method="fork")
+    try:
+        crash, other = pool.submit(frame(13)), pool.submit(frame(7))
+        assert round(float(other.result(10).conf[0]) * 255) == 7
+        with pytest.raises(RuntimeError, match="died"):
+            crash.result(10)
+
+        deadline = time.monotonic() + 10
+        while not all(pool._ready) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        results = pool.predict_batch([frame(v) for v in range(1, 9)])
+        assert [round(float(r.conf[0]) * 255) for r in results] == list(range(1, 9))
+        stats = pool.stats()
+        assert stats["restarts"] == 1
+        assert stats["failed"] == 1
+        assert pool._free.qsize() == pool.slots
+    finally:
+        pool.close()
+
+
+def test_pool_refuses_frames_when_a_restart_fails(monkeypatch):
+    if "fork" not in get_all_start_methods():
+        pytest.skip("the fake backend reaches the workers only through fork")
+    monkeypatch.setitem(inference_backend.BACKENDS, Crashes.name, Crashes)
+    pool = InferencePool(Crashes.name, "unused.pt", workers=1, slots=2, threads=1, start_method="fork")
+    try:
+        monkeypatch.setattr(Crashes, "load_error", True)
+        with pytest.raises(RuntimeError, match="died"):
+            pool.predict(frame(13))
+        deadline = time.monotonic() + 10
+        while pool._broken is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with pytest.raises(RuntimeError, match="model file gone"):
+            pool.predict(frame(1))
+        assert pool._free.qsize() == pool.slots
+    finally:
+        pool.close()
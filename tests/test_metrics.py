@@ -0,0 +1,44 @@
+"""Histogram percentiles stay within the bucket resolution."""
+
+import math
+
+import numpy as np
+import pytest
+
+from metrics import Histogram
+
+
+def test_empty_histogram_reports_nan():
+    assert all(math.isnan(v) for v in Histogram().percentiles((0.5, 0.99)).values())
+
+
+@pytest.mark.parametrize("sub_bits", [4, 7])
+def test_percentiles_within_relative_error(sub_bits):
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(mean=np.log(0.02), sigma=1.0, size=5000)
+    histogram = Histogram(sub_bits=sub_bits)
+    for value in samples:
+        histogram.record(float(value))
+
+    quantiles = (0.5, 0.9, 0.99, 0.999)
+    ordered = np.sort(samples)
+    bound = 2.0 ** -sub_bits
+    for q, estimate in histogram.percentiles(quantiles).items():
+        exact = ordered[max(1, math.ceil(q * len(samples))) - 1]
+        assert abs(estimate - exact) <= bound * exact + histogram.unit
+
+
+def test_single_value_and_extremes():
+    histogram = Histogram()
+    histogram.record(0.004)
+    assert histogram.percentiles((0.0, 0.5, 1.0)) == pytest.approx({0.0: 0.004, 0.5: 0.004, 1.0: 0.004}, rel=2**-7)
+
+
+def test_values_are_clamped_to_the_range():
+    histogram = Histogram(highest_s=1.0)
+    histogram.record(-1.0)
+    histogram.record(30.0)
+    low, high = histogram.percentiles((0.0, 1.0)).values()
+    assert 0.0 <= low <= histogram.unit
+    assert high == pytest.approx(1.0, rel=2**-7)
+    assert histogram.max == 30.0
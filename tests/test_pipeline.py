@@ -0,0 +1,48 @@
+import asyncio
+
+import numpy as np
+
+from detections import Detections
+from metrics import PipelineMetrics
+from pipeline import CameraStream, MultiCameraPipeline
+
+
+class Frames:
+    def __init__(self, values):
+        self._values = list(values)
+
+    def read(self):
+        if not self._values:
+            return False, None
+        return True, np.full((8, 8, 3), self._values.pop(0), dtype=np.uint8)
+
+
+class FailsOnValue:
+    """Detects one box per frame and raises on frames filled with ``bad``."""
+
+    def __init__(self, bad):
+        self.bad = bad
+
+    def __call__(self, frame):
+        value = int(frame[0, 0, 0])
+        if value == self.bad:
+            raise RuntimeError("inference failed")
+        return Detections(np.array([[0, 0, value, value]], np.float32), np.ones(1, np.float32), np.zeros(1, np.int64))
+
+
+def test_failed_inference_keeps_previous_detections():
+    seen = []
+    metrics = PipelineMetrics()
+    stream = CameraStream(
+        Frames([1, 2, 3]), metrics=metrics,
+        process=lambda result: seen.append((result.inferred, result.detections.xyxy[:, 2].tolist())),
+    )
+    pipeline = MultiCameraPipeline(FailsOnValue(bad=2), [stream])
+    asyncio.run(pipeline.run())
+
+    assert seen == [(True, [1.0]), (False, [1.0]), (True, [3.0])]
+    assert pipeline.stop_reason == "end of stream"
+    assert pipeline.inference_errors == 1
+    assert stream.stats()["inference_errors"] == 1
+    assert metrics.inference_errors.value == 1
+    assert metrics.inferences.value == 2
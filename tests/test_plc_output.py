@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from plc_output import NEW_DATA_TAG, PlcHandshakeWorker
+
+
+class FakePlc:
+    """pylogix-shaped ``Write`` that fails every write to ``bad_tag``."""
+
+    def __init__(self, bad_tag=None, batch_status="Success"):
+        self.bad_tag = bad_tag
+        self.batch_status = batch_status
+        self.tags = {}
+
+    def Write(self, tag, value=None):
+        if isinstance(tag, list):
+            return [self._one(t, v, self.batch_status) for t, v in tag]
+        return self._one(tag, value, "Success")
+
+    def _one(self, tag, value, status):
+        if tag == self.bad_tag:
+            status = "Path destination unknown"
+        if status == "Success":
+            self.tags[tag] = value
+        return SimpleNamespace(TagName=tag, Value=value, Status=status)
+
+
+def run_one(plc, batch_writes):
+    worker = PlcHandshakeWorker(plc, pulse_s=0.0, batch_writes=batch_writes)
+    worker.submit("apple", 3, 2.5)
+    worker.close()
+    return worker
+
+
+def test_failed_new_data_write_is_not_completed():
+    for batch_writes in (True, False):
+        worker = run_one(FakePlc(bad_tag=NEW_DATA_TAG), batch_writes)
+        assert worker.completed == 0
+        assert worker.failed == 1
+        assert worker.stats()["failed"] == 1
+
+
+def test_successful_handshake_pulses_new_data():
+    plc = FakePlc()
+    worker = run_one(plc, batch_writes=True)
+    assert worker.completed == 1
+    assert worker.failed == 0
+    assert plc.tags[NEW_DATA_TAG] is False
+
+
+def test_only_unsupported_service_disables_batching():
+    worker = run_one(FakePlc(batch_status="Service not supported"), batch_writes=True)
+    assert not worker.batch_writes
+    assert worker.completed == 1
+
+    # A transient batch failure is retried tag by tag but keeps batching on
+    worker = run_one(FakePlc(batch_status="Connection lost"), batch_writes=True)
+    assert worker.batch_writes
+    assert worker.completed == 1
@@ -0,0 +1,89 @@
+"""Tile grid coverage and greedy merging of duplicates across tile seams."""
+
+import numpy as np
+import pytest
+
+from detections import Detections
+from inference_backend import InferenceBackend
+from tiling import TiledBackend, merge_detections, tile_grid
+
+
+def dets(rows, conf, cls=None):
+    xyxy = np.array(rows, dtype=np.float32).reshape(-1, 4)
+    cls = np.zeros(len(xyxy), np.int64) if cls is None else np.array(cls, np.int64)
+    return Detections(xyxy, np.array(conf, np.float32), cls)
+
+
+class BrightBlob(InferenceBackend):
+    """Fake detector: one box around the bright pixels, scored by how much of it is visible."""
+
+    name = "blob"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.names = {0: "item"}
+
+    def predict(self, frame):
+        ys, xs = np.nonzero(frame[..., 0] > 127)
+        if not len(xs):
+            return Detections.empty()
+        box = [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]
+        return dets([box], [min(0.99, 0.3 + len(xs) / 40000)])
+
+
+@pytest.mark.parametrize("height, width", [(720, 1280), (1080, 1920), (480, 640), (300, 200)])
+def test_grid_covers_the_frame_with_overlap(height, width):
+    grid = tile_grid(height, width, tile=640, overlap=0.2)
+    covered = np.zeros((height, width), bool)
+    for x1, y1, x2, y2 in grid.tolist():
+        assert 0 <= x1 < x2 <= width and 0 <= y1 < y2 <= height
+        assert x2 - x1 <= 640 and y2 - y1 <= 640
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+    starts = np.unique(grid[:, 0])
+    if len(starts) > 1:
+        assert (np.diff(starts) <= 640 * 0.8).all()
+
+
+def test_partial_box_at_a_seam_merges_into_the_full_box():
+    full = [560, 200, 700, 320]
+    left = [560, 200, 640, 320]   # the same item cut by the right edge of a tile
+    right = [640, 200, 700, 320]
+    merged = merge_detections(dets([left, full, right], [0.6, 0.9, 0.5]))
+    assert merged.xyxy.tolist() == [full]
+
+
+def test_iou_misses_the_cut_duplicate_that_ios_catches():
+    full, left = [560, 200, 700, 320], [560, 200, 600, 320]
+    assert len(merge_detections(dets([full, left], [0.9, 0.6]), metric="iou")) == 2
+    assert len(merge_detections(dets([full, left], [0.9, 0.6]), metric="ios")) == 1
+
+
+def test_neighbours_and_other_classes_survive():
+    a, b = [500, 200, 600, 300], [605, 200, 705, 300]
+    assert len(merge_detections(dets([a, b], [0.9, 0.8]))) == 2
+    assert len(merge_detections(dets([a, a], [0.9, 0.8], cls=[0, 1]))) == 2
+
+
+def test_merged_box_does_not_chain_into_its_neighbour():
+    # B merges into A; C only touches B, so it stays a separate item.
+    a, b, c = [0, 0, 100, 100], [50, 0, 150, 100], [120, 0, 220, 100]
+    merged = merge_detections(dets([a, b, c], [0.9, 0.8, 0.7]), threshold=0.15, metric="iou")
+    assert merged.xyxy.tolist() == [[0, 0, 150, 100], c]
+
+
+def test_cut_box_that_outscores_the_full_box_grows_to_the_full_item():
+    full, left = [560, 200, 700, 320], [560, 200, 640, 320]
+    merged = merge_detections(dets([full, left], [0.6, 0.9]))
+    assert merged.xyxy.tolist() == [full]
+    assert merged.conf.tolist() == pytest.approx([0.9])
+
+
+@pytest.mark.parametrize("full_frame", [True, False])
+def test_tiled_backend_reports_one_box_for_an_item_on_a_seam(full_frame):
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    frame[200:320, 560:700] = 255  # crosses the x=640 edge of the first tile
+    backend = TiledBackend(BrightBlob(), tile=640, overlap=0.2, full_frame=full_frame)
+    (result,) = backend.predict_batch([frame])
+    assert result.xyxy.tolist() == [[560, 200, 700, 320]]
+    assert backend.stats()["tiles_per_frame"] == len(backend.grid(frame.shape)) + full_frame
@@ -0,0 +1,90 @@
+"""Tracker: exactly one new-track event per physical item."""
+
+import numpy as np
+
+from detections import Detections
+from tracker import Tracker
+
+
+def boxes(*rows, cls=0):
+    xyxy = np.array(rows, dtype=np.float32).reshape(-1, 4)
+    return Detections(xyxy, np.full(len(xyxy), 0.9, np.float32), np.full(len(xyxy), cls, np.int64))
+
+
+def item(x, y=100.0, size=50.0):
+    return [x, y, x + size, y + size]
+
+
+def test_one_event_per_item_moving_across_the_frame():
+    tracker = Tracker(min_hits=2)
+    events = []
+    for i in range(20):
+        events += tracker.step(boxes(item(10 + 5 * i))).new_ids.tolist()
+    assert events == [1]
+    assert tracker.total_confirmed == 1
+
+
+def test_event_fires_on_the_confirming_hit_only():
+    tracker = Tracker(min_hits=3)
+    news = [tracker.step(boxes(item(10))).new.tolist() for _ in range(5)]
+    assert news == [[], [], [True], [False], [False]]
+
+
+def test_two_items_get_two_events():
+    tracker = Tracker(min_hits=1)
+    first = tracker.step(boxes(item(10), item(300)))
+    second = tracker.step(boxes(item(15), item(305)))
+    assert sorted(first.new_ids.tolist()) == [1, 2]
+    assert not second.new.any()
+    assert sorted(second.ids.tolist()) == [1, 2]
+
+
+def test_other_class_at_the_same_place_is_a_new_track():
+    tracker = Tracker(min_hits=1)
+    tracker.step(boxes(item(10), cls=0))
+    frame = tracker.step(boxes(item(10), cls=1))
+    assert frame.new_ids.tolist() == [2]
+
+
+def test_prediction_only_steps_never_report_new_tracks():
+    tracker = Tracker(min_hits=2)
+    events = 0
+    seen = set()
+    for i in range(30):
+        if i % 3 == 0:
+            frame = tracker.step(boxes(item(10 + 4 * i)))
+        else:
+            frame = tracker.step()
+            assert not frame.new.any()
+        events += int(frame.new.sum())
+        seen.update(frame.ids.tolist())
+    assert events == 1
+    assert seen == {1}
+
+
+def test_prediction_only_steps_do_not_age_tracks():
+    tracker = Tracker(min_hits=1, max_age=1)
+    tracker.step(boxes(item(10)))
+    for _ in range(10):
+        tracker.step()
+    assert len(tracker) == 1
+
+
+def test_short_gap_keeps_the_track():
+    tracker = Tracker(min_hits=1, max_age=2)
+    tracker.step(boxes(item(10)))
+    for _ in range(2):
+        tracker.step(boxes())
+    frame = tracker.step(boxes(item(10)))
+    assert frame.ids.tolist() == [1]
+    assert not frame.new.any()
+
+
+def test_expired_track_returns_as_a_new_item():
+    tracker = Tracker(min_hits=1, max_age=2)
+    assert tracker.step(boxes(item(10))).new_ids.tolist() == [1]
+    for _ in range(3):
+        tracker.step(boxes())
+    assert len(tracker) == 0
+    assert tracker.step(boxes(item(10))).new_ids.tolist() == [2]
+    assert tracker.total_confirmed == 2
@@ -0,0 +1,101 @@
+"""Binary UDP frame format and receiver-side loss accounting."""
+
+import socket
+
+import numpy as np
+import pytest
+
+from detections import Detections
+from udp_protocol import (
+    HEADER, MAGIC, RECORD_DTYPE, DetectionSender, SequenceTracker, decode_frame, encode_frame,
+)
+
+STAMP_US = 1_700_000_000_123_456
+
+
+def sample():
+    xyxy = np.array([[10.4, 20.6, 110.2, 220.9], [-5.0, 0.0, 30.0, 41.0]], dtype=np.float32)
+    return Detections(xyxy, np.array([0.91, 0.5], np.float32), np.array([3, 17], np.int64))
+
+
+def test_round_trip():
+    detections = sample()
+    payload = encode_frame(detections, seq=42, timestamp_us=STAMP_US, frame_shape=(480, 640, 3))
+    assert len(payload) == HEADER.size + 2 * RECORD_DTYPE.itemsize
+
+    frame = decode_frame(payload)
+    assert (frame.seq, frame.timestamp_us, frame.width, frame.height) == (42, STAMP_US, 640, 480)
+    records = frame.records
+    assert records["cls"].tolist() == [3, 17]
+    np.testing.assert_allclose(records["conf"], detections.conf)
+    boxes = np.stack([records[k] for k in ("x1", "y1", "x2", "y2")], axis=1)
+    assert boxes.tolist() == [[10, 21, 110, 221], [-5, 0, 30, 41]]
+    centres = np.stack([records["cx"], records["cy"]], axis=1)
+    assert centres.tolist() == np.rint(detections.centroids).astype(int).tolist()
+
+
+def test_empty_frame_is_header_only():
+    payload = encode_frame(Detections.empty(), seq=0, timestamp_us=STAMP_US, frame_shape=(480, 640))
+    assert len(payload) == HEADER.size
+    assert len(decode_frame(payload).records) == 0
+
+
+def test_sequence_number_wraps_at_32_bits():
+    payload = encode_frame(Detections.empty(), seq=2**32 + 5, timestamp_us=0, frame_shape=(1, 1))
+    assert decode_frame(payload).seq == 5
+
+
+def test_to_dicts_uses_names():
+    payload = encode_frame(sample(), seq=1, timestamp_us=0, frame_shape=(480, 640))
+    first = decode_frame(payload).to_dicts({3: "apple"})[0]
+    assert first["object"] == "apple"
+    assert first["bbox"] == [10, 21, 110, 221]
+
+
+@pytest.mark.parametrize(
+    "mangle, message",
+    [
+        (lambda p: p[:HEADER.size - 1], "too short"),
+        (lambda p: b"XXXX" + p[4:], "Bad magic"),
+        (lambda p: p[:4] + bytes([99]) + p[5:], "version"),
+        (lambda p: p[:-1], "header announces"),
+    ],
+)
+def test_malformed_datagrams_are_rejected(mangle, message):
+    payload = encode_frame(sample(), seq=1, timestamp_us=0, frame_shape=(480, 640))
+    assert payload.startswith(MAGIC)
+    with pytest.raises(ValueError, match=message):
+        decode_frame(mangle(payload))
+
+
+def test_sequence_tracker_counts_gaps_and_late_frames():
+    tracker = SequenceTracker()
+    assert [tracker.update(seq) for seq in (7, 8, 11, 12, 10, 13)] == [0, 0, 2, 0, 0, 0]
+    assert tracker.stats() == {"received": 6, "lost": 2, "late": 1}
+
+
+def test_sequence_tracker_across_wraparound():
+    tracker = SequenceTracker()
+    tracker.update(0xFFFFFFFE)
+    assert tracker.update(0xFFFFFFFF) == 0
+    assert tracker.update(1) == 1
+    assert tracker.update(0xFFFFFFFF) == 0
+    assert tracker.stats() == {"received": 4, "lost": 1, "late": 1}
+
+
+def test_sender_to_receiver_over_loopback():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2.0)
+    sender = DetectionSender("127.0.0.1", receiver.getsockname()[1], {3: "apple", 17: "egg"})
+    try:
+        for detections in (sample(), Detections.empty(), sample()):
+            assert sender.send(detections, (480, 640, 3), timestamp=1.5) == 1
+        tracker = SequenceTracker()
+        frames = [decode_frame(receiver.recv(65535)) for _ in range(3)]
+    finally:
+        sender.close()
+        receiver.close()
+    assert [tracker.update(f.seq) for f in frames] == [0, 0, 0]
+    assert [len(f.records) for f in frames] == [2, 0, 2]
+    assert frames[0].timestamp_us == 1_500_000
@@ -0,0 +1,201 @@
+"""Tiled (SAHI-style) inference for small items in high-resolution frames.
+
+At 1080p, YOLO's 640-pixel letterbox shrinks every item to about a third of
+its size, so eggs and tomatoes drop below what the detector can see.
+:class:`TiledBackend` splits each frame into overlapping ``tile`` x ``tile``
+crops (:func:`tile_grid`) that reach the model at native resolution. With
+``full_frame`` it also adds the whole downscaled frame, which still catches
+items larger than a tile. Tiles and frame go through the wrapped backend as
+one batch (``predict_batch``), so the runtime sees a single large call instead
+of N small ones.
+
+Tile results are shifted back to frame coordinates and merged with
+:func:`merge_detections`, a class-aware greedy box merge (SAHI's NMM): the
+duplicates of an item collapse into the union of their boxes instead of the
+best-scoring one surviving alone. An item cut by a tile border shows up as a
+partial box inside the full one. Merging therefore uses intersection over the
+*smaller* box (``"ios"``) by default, which IoU would miss.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from detections import Detections
+from inference_backend import InferenceBackend
+
+MATCH_METRICS = ("iou", "ios")
+
+
+def tile_grid(height: int, width: int, tile: int = 640, overlap: float = 0.2) -> np.ndarray:
+    """``(N, 4)`` tile boxes ``x1, y1, x2, y2`` covering the frame with at least ``overlap``.
+
+    The last row and column are aligned to the frame edge instead of running
+    past it; frames smaller than ``tile`` give a single tile.
+    """
+    if not 0.0 <= overlap < 1.0:
+        raise ValueError("overlap must be in [0, 1)")
+    stride = max(1, int(tile * (1.0 - overlap)))
+
+    def starts(size: int) -> np.ndarray:
+        if size <= tile:
+            return np.zeros(1, dtype=np.int64)
+        count = -(-(size - tile) // stride) + 1  # ceil
+        return np.linspace(0, size - tile, count).round().astype(np.int64)
+
+    ys, xs = np.meshgrid(starts(height), starts(width), indexing="ij")
+    x1, y1 = xs.ravel(), ys.ravel()
+    return np.stack([x1, y1, np.minimum(x1 + tile, width), np.minimum(y1 + tile, height)], axis=1)
+
+
+def pairwise_overlap(boxes: np.ndarray, metric: str = "ios") -> np.ndarray:
+    """``(N, N)`` IoU or intersection-over-smaller matrix for ``xyxy`` boxes."""
+    x1, y1, x2, y2 = (boxes[:, i] for i in range(4))
+    w = (np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :])).clip(0)
+    h = (np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :])).clip(0)
+    inter = w * h
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    if metric == "iou":
+        denom = areas[:, None] + areas[None, :] - inter
+    elif metric == "ios":
+        denom = np.minimum(areas[:, None], areas[None, :])
+    else:
+        raise ValueError(f"Unknown match metric: {metric!r} (expected one of {MATCH_METRICS})")
+    return inter / (denom + 1e-9)
+
+
+def merge_detections(detections: Detections, threshold: float = 0.5, metric: str = "ios") -> Detections:
+    """Class-aware greedy merging of boxes that overlap by at least ``threshold``.
+
+    Boxes are visited by score. Each box not yet merged takes in every
+    remaining box of its class that it overlaps, grows to the union of them
+    and keeps the best score. A partial box at a tile seam therefore ends up
+    as the full item even when it outscores the full box. A box that was
+    merged away never takes in others, so separate items next to each other
+    are not chained together. The overlap matrix is computed once; the loop
+    only visits the boxes that are kept.
+    """
+    if len(detections) < 2:
+        return detections
+    order = np.argsort(-detections.conf, kind="stable")
+    ranked = detections[order]
+    matches = pairwise_overlap(ranked.xyxy, metric) >= threshold
+    matches &= ranked.cls[:, None] == ranked.cls[None, :]
+    xyxy = ranked.xyxy.copy()
+    free = np.ones(len(ranked), dtype=bool)
+    keep: List[int] = []
+    for i in range(len(ranked)):
+        if not free[i]:
+            continue
+        group = matches[i] & free
+        group[i] = True
+        free[group] = False
+        xyxy[i, :2] = ranked.xyxy[group, :2].min(axis=0)
+        xyxy[i, 2:] = ranked.xyxy[group, 2:].max(axis=0)
+        keep.append(i)
+    return Detections(xyxy[keep], ranked.conf[keep], ranked.cls[keep])
+
+
+class TiledBackend(InferenceBackend):
+    """Run ``model`` on overlapping tiles (plus the full frame) and merge the results."""
+
+    name = "tiled"
+
+    def __init__(
+        self,
+        model: InferenceBackend,
+        tile: int = 640,
+        overlap: float = 0.2,
+        full_frame: bool = True,
+        merge_threshold: float = 0.5,
+        match_metric: str = "ios",
+    ) -> None:
+        super().__init__(model.conf, model.iou, model.imgsz)
+        if match_metric not in MATCH_METRICS:
+            raise ValueError(f"Unknown match metric: {match_metric!r} (expected one of {MATCH_METRICS})")
+        self.model = model
+        self.tile = tile
+        self.overlap = overlap
+        self.full_frame = full_frame
+        self.merge_threshold = merge_threshold
+        self.match_metric = match_metric
+        self.names = model.names
+        self._grids: Dict[tuple, np.ndarray] = {}
+
+        self.frames = 0
+        self.tiles = 0
+
+    def restrict_classes(self, labels: Optional[Iterable[str]]) -> np.ndarray:
+        labels = None if labels is None else list(labels)
+        self.model.restrict_classes(labels)
+        return super().restrict_classes(labels)
+
+    def grid(self, shape: Sequence[int]) -> np.ndarray:
+        """Tile boxes for a frame of ``shape``; cached per frame size."""
+        key = tuple(shape[:2])
+        if key not in self._grids:
+            self._grids[key] = tile_grid(key[0], key[1], self.tile, self.overlap)
+        return self._grids[key]
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        return self.predict_batch([frame])[0]
+
+    def predict_batch(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        """Tile every frame, run all tiles of all frames as one batch, merge per frame."""
+        crops: List[np.ndarray] = []
+        origins: List[np.ndarray] = []
+        owners: List[int] = []
+        for index, frame in enumerate(frames):
+            grid = self.grid(frame.shape)
+            if self.full_frame and len(grid) > 1:
+                crops.append(frame)
+                origins.append(np.zeros(2, dtype=np.float32))
+                owners.append(index)
+            for x1, y1, x2, y2 in grid.tolist():
+                crops.append(frame[y1:y2, x1:x2])
+                origins.append(np.array([x1, y1], dtype=np.float32))
+                owners.append(index)
+
+        results = self.model.predict_batch(crops)
+        start = time.perf_counter()
+        per_frame: List[List[Detections]] = [[] for _ in frames]
+        for detections, origin, owner in zip(results, origins, owners):
+            if len(detections):
+                shift = np.tile(origin, 2)
+                per_frame[owner].append(Detections(detections.xyxy + shift, detections.conf, detections.cls))
+        merged = [
+            merge_detections(_concat(parts), self.merge_threshold, self.match_metric) for parts in per_frame
+        ]
+        self.timings = dict(self.model.timings)
+        self.timings["postprocess"] = self.timings.get("postprocess", 0.0) + time.perf_counter() - start
+        self.frames += len(frames)
+        self.tiles += len(crops)
+        return merged
+
+    def warmup(self, runs: int = 2, shape: Optional[Sequence[int]] = None) -> float:
+        return self.model.warmup(runs, shape)
+
+    def close(self) -> None:
+        self.model.close()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "frames": self.frames,
+            "tiles": self.tiles,
+            "tiles_per_frame": self.tiles / self.frames if self.frames else 0.0,
+        }
+
+
+def _concat(parts: List[Detections]) -> Detections:
+    if not parts:
+        return Detections.empty()
+    if len(parts) == 1:
+        return parts[0]
+    return Detections(
+        np.concatenate([p.xyxy for p in parts]),
+        np.concatenate([p.conf for p in parts]),
+        np.concatenate([p.cls for p in parts]),
+    )
@@ -0,0 +1,198 @@
+"""Lightweight multi-object tracker with stable IDs.
+
+``food_detection.py`` must send one PLC handshake per *physical* item, not per
+label: the second apple on the conveyor is a new item. :class:`Tracker` gives
+every object an ID using class-gated IoU association against Kalman-predicted
+boxes (constant-velocity model on centre, width and height, SORT style). The
+track table is a set of NumPy arrays, so prediction and correction run for all
+tracks at once.
+
+Calling :meth:`Tracker.step` without detections only advances the Kalman
+prediction. This lets the detector run every Nth frame while the tracker
+interpolates the boxes in between.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from detections import Detections
+
+# Constant-velocity transition for state [cx, cy, w, h, vcx, vcy, vw, vh].
+_F = np.eye(8, dtype=np.float64)
+_F[:4, 4:] = np.eye(4)
+_STD_POS = 1.0 / 20   # process / measurement noise relative to box height
+_STD_VEL = 1.0 / 160
+
+
+def _xyxy_to_cxcywh(xyxy: np.ndarray) -> np.ndarray:
+    wh = xyxy[:, 2:] - xyxy[:, :2]
+    return np.concatenate((xyxy[:, :2] + wh / 2, wh), axis=1)
+
+
+def _cxcywh_to_xyxy(z: np.ndarray) -> np.ndarray:
+    half = z[:, 2:4] / 2
+    return np.concatenate((z[:, :2] - half, z[:, :2] + half), axis=1)
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (rb - lt).clip(0).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+@dataclass
+class TrackFrame:
+    """Confirmed tracks after one :meth:`Tracker.step`."""
+
+    ids: np.ndarray          # (K,) int64 track ids
+    detections: Detections   # (K,) boxes / conf / cls of those tracks
+    new: np.ndarray          # (K,) bool, track was confirmed on this step
+
+    @property
+    def new_ids(self) -> np.ndarray:
+        return self.ids[self.new]
+
+
+class Tracker:
+    """IoU + Kalman tracker with an array-backed track table."""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 10, min_hits: int = 2) -> None:
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age      # detector updates a track may miss before it is dropped
+        self.min_hits = min_hits    # matched detections needed before a track is reported
+
+        self.ids = np.zeros((0,), dtype=np.int64)
+        self.x = np.zeros((0, 8))            # Kalman state
+        self.P = np.zeros((0, 8, 8))         # Kalman covariance
+        self.cls = np.zeros((0,), dtype=np.int64)
+        self.conf = np.zeros((0,), dtype=np.float32)
+        self.hits = np.zeros((0,), dtype=np.int64)
+        self.misses = np.zeros((0,), dtype=np.int64)
+        self.confirmed = np.zeros((0,), dtype=bool)
+
+        self._next_id = 1
+        self.total_confirmed = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # -------------------------------------------------------------- Kalman
+    def _noise(self, heights: np.ndarray, std: float) -> np.ndarray:
+        """Diagonal ``(M, 4)`` variances scaled with the box height."""
+        return np.repeat(((std * np.maximum(heights, 1.0)) ** 2)[:, None], 4, axis=1)
+
+    def _predict(self) -> None:
+        if not len(self):
+            return
+        h = self.x[:, 3]
+        q = np.concatenate((self._noise(h, _STD_POS), self._noise(h, _STD_VEL)), axis=1)
+        self.x = self.x @ _F.T
+        self.x[:, 2:4] = np.maximum(self.x[:, 2:4], 1.0)
+        self.P = _F @ self.P @ _F.T
+        self.P[:, np.arange(8), np.arange(8)] += q
+
+    def _correct(self, rows: np.ndarray, z: np.ndarray) -> None:
+        P = self.P[rows]
+        S = P[:, :4, :4].copy()
+        S[:, np.arange(4), np.arange(4)] += self._noise(z[:, 3], _STD_POS)
+        K = P[:, :, :4] @ np.linalg.inv(S)                       # (K, 8, 4)
+        innovation = z - self.x[rows, :4]
+        self.x[rows] += (K @ innovation[:, :, None])[:, :, 0]
+        self.P[rows] = P - K @ P[:, :4, :]
+
+    # ---------------------------------------------------------- association
+    def _associate(self, detections: Detections):
+        """Greedy class-gated IoU matching; returns ``(track_rows, det_rows)``."""
+        if not len(self) or not len(detections):
+            return np.zeros((0,), np.int64), np.zeros((0,), np.int64)
+        iou = _iou(_cxcywh_to_xyxy(self.x[:, :4]), detections.xyxy.astype(np.float64))
+        iou *= self.cls[:, None] == detections.cls[None, :]
+        track_idx, det_idx = np.nonzero(iou >= self.iou_threshold)
+        order = iou[track_idx, det_idx].argsort()[::-1]
+
+        used_tracks, used_dets, matches = set(), set(), []
+        for t, d in zip(track_idx[order].tolist(), det_idx[order].tolist()):
+            if t in used_tracks or d in used_dets:
+                continue
+            used_tracks.add(t)
+            used_dets.add(d)
+            matches.append((t, d))
+        if not matches:
+            return np.zeros((0,), np.int64), np.zeros((0,), np.int64)
+        pairs = np.asarray(matches, dtype=np.int64)
+        return pairs[:, 0], pairs[:, 1]
+
+    # ----------------------------------------------------------------- API
+    def step(self, detections: Optional[Detections] = None) -> TrackFrame:
+        """Advance one frame; pass ``None`` on frames where the detector did not run."""
+        self._predict()
+        newly_confirmed = np.zeros(len(self), dtype=bool)
+
+        if detections is not None:
+            track_rows, det_rows = self._associate(detections)
+            if len(track_rows):
+                self._correct(track_rows, _xyxy_to_cxcywh(detections.xyxy[det_rows].astype(np.float64)))
+                self.conf[track_rows] = detections.conf[det_rows]
+                self.hits[track_rows] += 1
+
+            matched = np.zeros(len(self), dtype=bool)
+            matched[track_rows] = True
+            self.misses[~matched] += 1
+            self.misses[matched] = 0
+
+            unmatched = np.ones(len(detections), dtype=bool)
+            unmatched[det_rows] = False
+            self._spawn(detections[unmatched])
+            newly_confirmed = np.concatenate(
+                (newly_confirmed, np.zeros(int(unmatched.sum()), dtype=bool))
+            )
+
+            promote = ~self.confirmed & (self.hits >= self.min_hits)
+            self.confirmed |= promote
+            newly_confirmed |= promote
+            self.total_confirmed += int(promote.sum())
+
+            keep = self.misses <= self.max_age
+            self._keep(keep)
+            newly_confirmed = newly_confirmed[keep]
+
+        visible = self.confirmed & (self.misses == 0)
+        boxes = _cxcywh_to_xyxy(self.x[visible, :4])
+        return TrackFrame(
+            self.ids[visible],
+            Detections(boxes, self.conf[visible], self.cls[visible]),
+            newly_confirmed[visible],
+        )
+
+    def _spawn(self, detections: Detections) -> None:
+        n = len(detections)
+        if not n:
+            return
+        z = _xyxy_to_cxcywh(detections.xyxy.astype(np.float64))
+        x = np.concatenate((z, np.zeros((n, 4))), axis=1)
+        P = np.zeros((n, 8, 8))
+        diag = np.concatenate((self._noise(z[:, 3], 2 * _STD_POS), self._noise(z[:, 3], 10 * _STD_VEL)), axis=1)
+        P[:, np.arange(8), np.arange(8)] = diag
+
+        self.ids = np.concatenate((self.ids, np.arange(self._next_id, self._next_id + n)))
+        self._next_id += n
+        self.x = np.concatenate((self.x, x))
+        self.P = np.concatenate((self.P, P))
+        self.cls = np.concatenate((self.cls, detections.cls))
+        self.conf = np.concatenate((self.conf, detections.conf))
+        self.hits = np.concatenate((self.hits, np.ones(n, dtype=np.int64)))
+        self.misses = np.concatenate((self.misses, np.zeros(n, dtype=np.int64)))
+        self.confirmed = np.concatenate((self.confirmed, np.zeros(n, dtype=bool)))
+
+    def _keep(self, mask: np.ndarray) -> None:
+        if mask.all():
+            return
+        for name in ("ids", "x", "P", "cls", "conf", "hits", "misses", "confirmed"):
+            setattr(self, name, getattr(self, name)[mask])
@@ -0,0 +1,227 @@
+"""Binary per-frame UDP detection protocol for the robot link.
+
+``test1.py`` used to send one JSON datagram per box. Here every frame becomes a
+single little-endian datagram: a fixed 24-byte header followed by one 18-byte
+record per detection.
+
+Header (``HEADER``, ``<4sBBHIQHH``):
+
+====== ======= ==================================================
+Offset Type    Field
+====== ======= ==================================================
+0      4s      magic ``b"VDET"``
+4      uint8   protocol version (``1``)
+5      uint8   flags (reserved, ``0``)
+6      uint16  number of detection records
+8      uint32  frame sequence number (wraps at 2**32)
+12     uint64  capture time, microseconds since the Unix epoch
+20     uint16  frame width in pixels
+22     uint16  frame height in pixels
+====== ======= ==================================================
+
+Record (``RECORD_DTYPE``): ``cls`` uint16, ``conf`` float32, then ``cx``,
+``cy``, ``x1``, ``y1``, ``x2``, ``y2`` as int16 pixel coordinates.
+
+A datagram is sent for every frame, including frames with no detections. The
+receiver can therefore spot lost packets as gaps in the sequence numbers
+(:class:`SequenceTracker`). ``mode="json"`` keeps the old one-JSON-per-box
+payload for receivers that have not been updated.
+
+Reference receiver:
+    python udp_protocol.py listen --port 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from detections import Detections
+
+MAGIC = b"VDET"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIQHH")
+RECORD_DTYPE = np.dtype(
+    [("cls", "<u2"), ("conf", "<f4"), ("cx", "<i2"), ("cy", "<i2"),
+     ("x1", "<i2"), ("y1", "<i2"), ("x2", "<i2"), ("y2", "<i2")]
+)
+MAX_DATAGRAM = 65507  # largest UDP payload over IPv4
+MAX_RECORDS = (MAX_DATAGRAM - HEADER.size) // RECORD_DTYPE.itemsize
+PROTOCOL_MODES = ("binary", "json")
+
+
+@dataclass
+class DecodedFrame:
+    """One received frame: header fields plus a structured record array."""
+
+    seq: int
+    timestamp_us: int
+    width: int
+    height: int
+    records: np.ndarray  # RECORD_DTYPE
+
+    def to_dicts(self, names: Optional[Dict[int, str]] = None) -> List[Dict[str, object]]:
+        """Records as dicts; ``object`` holds the label when ``names`` is given."""
+        out = []
+        for r in self.records.tolist():
+            cls, conf, cx, cy, x1, y1, x2, y2 = r
+            out.append({
+                "object": names.get(cls, str(cls)) if names else cls,
+                "confidence": conf, "cx": cx, "cy": cy, "bbox": [x1, y1, x2, y2],
+            })
+        return out
+
+
+def encode_frame(detections: Detections, seq: int, timestamp_us: int, frame_shape: Tuple[int, ...]) -> bytes:
+    """Pack one frame's detections into a single datagram."""
+    n = min(len(detections), MAX_RECORDS)
+    records = np.empty(n, dtype=RECORD_DTYPE)
+    if n:
+        boxes = np.rint(detections.xyxy[:n]).clip(-32768, 32767).astype(np.int16)
+        centres = np.rint(detections.centroids[:n]).clip(-32768, 32767).astype(np.int16)
+        records["cls"] = detections.cls[:n]
+        records["conf"] = detections.conf[:n]
+        records["cx"], records["cy"] = centres[:, 0], centres[:, 1]
+        records["x1"], records["y1"], records["x2"], records["y2"] = boxes.T
+    height, width = frame_shape[:2]
+    header = HEADER.pack(MAGIC, VERSION, 0, n, seq & 0xFFFFFFFF, timestamp_us, width, height)
+    return header + records.tobytes()
+
+
+def decode_frame(payload: bytes) -> DecodedFrame:
+    """Reference decoder; raises ``ValueError`` on anything malformed."""
+    if len(payload) < HEADER.size:
+        raise ValueError(f"Datagram too short: {len(payload)} bytes")
+    magic, version, _, count, seq, timestamp_us, width, height = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError(f"Bad magic {magic!r}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+    expected = HEADER.size + count * RECORD_DTYPE.itemsize
+    if len(payload) != expected:
+        raise ValueError(f"Datagram is {len(payload)} bytes, header announces {expected}")
+    records = np.frombuffer(payload, RECORD_DTYPE, count, offset=HEADER.size)
+    return DecodedFrame(seq, timestamp_us, width, height, records)
+
+
+def encode_json(detections: Detections, names: Dict[int, str]) -> List[bytes]:
+    """Legacy payloads: one ``{"object", "confidence", "cx", "cy"}`` datagram per box."""
+    return [
+        json.dumps({"object": names[cls], "confidence": conf, "cx": cx, "cy": cy}).encode()
+        for _, _, _, _, conf, cls, cx, cy in detections.rows()
+    ]
+
+
+class DetectionSender:
+    """Send each frame's detections to ``(host, port)`` in ``binary`` or ``json`` mode."""
+
+    def __init__(self, host: str, port: int, names: Dict[int, str], mode: str = "binary") -> None:
+        if mode not in PROTOCOL_MODES:
+            raise ValueError(f"Unknown UDP protocol mode: {mode!r} (expected one of {PROTOCOL_MODES})")
+        self.address = (host, port)
+        self.names = names
+        self.mode = mode
+        self.seq = 0
+        self.datagrams = 0
+        self.bytes_sent = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, detections: Detections, frame_shape: Tuple[int, ...], timestamp: Optional[float] = None) -> int:
+        """Send one frame; ``timestamp`` is the capture time (``time.time()``). Returns datagrams sent."""
+        if self.mode == "json":
+            payloads = encode_json(detections, self.names)
+        else:
+            stamp = time.time() if timestamp is None else timestamp
+            payloads = [encode_frame(detections, self.seq, int(stamp * 1e6), frame_shape)]
+        self.seq += 1
+        for payload in payloads:
+            self._sock.sendto(payload, self.address)
+            self.bytes_sent += len(payload)
+        self.datagrams += len(payloads)
+        return len(payloads)
+
+    def stats(self) -> Dict[str, object]:
+        return {"mode": self.mode, "frames": self.seq, "datagrams": self.datagrams, "bytes": self.bytes_sent}
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class SequenceTracker:
+    """Receiver-side loss and reordering counters from frame sequence numbers."""
+
+    def __init__(self) -> None:
+        self.expected: Optional[int] = None
+        self.received = 0
+        self.lost = 0
+        self.late = 0  # arrived after a newer frame; already counted as lost
+
+    def update(self, seq: int) -> int:
+        """Register ``seq``; returns how many frames were skipped before it."""
+        self.received += 1
+        if self.expected is None:
+            self.expected = (seq + 1) & 0xFFFFFFFF
+            return 0
+        gap = (seq - self.expected) & 0xFFFFFFFF
+        if gap >= 1 << 31:  # behind the expected number: reordered or duplicated
+            self.late += 1
+            return 0
+        self.lost += gap
+        self.expected = (seq + 1) & 0xFFFFFFFF
+        return gap
+
+    def stats(self) -> Dict[str, int]:
+        return {"received": self.received, "lost": self.lost, "late": self.late}
+
+
+def listen(port: int, host: str = "0.0.0.0", names: Optional[Dict[int, str]] = None) -> None:
+    """Print every received frame and the loss counters (Ctrl+C to stop)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    tracker = SequenceTracker()
+    print(f"Listening for detections on {host}:{port}")
+    try:
+        while True:
+            payload, sender = sock.recvfrom(MAX_DATAGRAM)
+            try:
+                frame = decode_frame(payload)
+            except ValueError:
+                print(f"{sender[0]}: {payload[:200]!r}")  # legacy JSON or foreign traffic
+                continue
+            gap = tracker.update(frame.seq)
+            if gap:
+                print(f"Lost {gap} frame(s) before #{frame.seq}")
+            age_ms = (time.time() * 1e6 - frame.timestamp_us) / 1e3
+            print(f"#{frame.seq} {frame.width}x{frame.height} age={age_ms:.1f} ms {frame.to_dicts(names)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        print(f"Sequence stats: {tracker.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reference receiver for the binary detection protocol.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rx = sub.add_parser("listen")
+    rx.add_argument("--host", default="0.0.0.0")
+    rx.add_argument("--port", type=int, default=5000)
+    rx.add_argument("--names", help="JSON file mapping class id to label")
+    args = parser.parse_args()
+
+    names = None
+    if args.names:
+        with open(args.names, "r") as f:
+            names = {int(k): v for k, v in json.load(f).items()}
+    listen(args.port, args.host, names)
+
+
+if __name__ == "__main__":
+    main()